@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+import os
+import sys
+import io
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synth_qe
+
+
+"""
+++------------------------------------------------------------------------------
++   Benchmark suite of the readers in src/
++
++   Each case synthesizes its input files with synth_qe, then runs the reader
++   in a fresh (spawned) interpreter with stdout silenced, so that the timing
++   and the peak memory of one case are not polluted by the others.
++
++   Usage:
++   python benchmarks/bench_readers.py --size small medium -o results.json
++   python benchmarks/bench_readers.py --case qe_out --repeat 5
++
++   Output is JSON with one record per (case, size):
++   {"case", "size", "params", "file_bytes", "seconds" (best of repeats),
++   "seconds_all", "mb_per_s", "tracemalloc_peak_mb", "peak_rss_mb"}
++   and a "meta" block (git commit, python, numpy, platform, date).
+++------------------------------------------------------------------------------
+"""
+
+SRC = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+)
+
+SIZES = {
+    "small": {"nat": 8, "nk": 10, "nstep": 1},
+    "medium": {"nat": 64, "nk": 100, "nstep": 5},
+    "large": {"nat": 256, "nk": 400, "nstep": 20},
+}
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
+
+def _make_qe_out(tmp, nat, nk, nstep, **kwargs):
+    path = os.path.join(tmp, "relax.out")
+    synth_qe.write_pw_output(path, nat=nat, nk=nk, nstep=nstep, **kwargs)
+    return [path]
+
+def _make_qe_bands(tmp, nat, nk, nstep, **kwargs):
+    path = os.path.join(tmp, "bands.out")
+    synth_qe.write_pw_output(path, nat=nat, nk=nk, nstep=1, **kwargs)
+    return [path]
+
+def _make_read_pdos(tmp, nat, nk, nstep, **kwargs):
+    path = os.path.join(tmp, "projwfc.out")
+    synth_qe.write_projwfc_output(path, nat=nat, nk=nk, nbnd=2*nat)
+    return [path]
+
+def _make_band_dat(tmp, nat, nk, nstep, **kwargs):
+    path_dat = os.path.join(tmp, "bands.dat")
+    path_out = os.path.join(tmp, "bands.x.out")
+    synth_qe.write_bands_files(path_dat, path_out, nks=nk*4, nbnd=2*nat)
+    return [path_dat, path_out]
+
+def _make_qe_in(tmp, nat, nk, nstep, **kwargs):
+    path = os.path.join(tmp, "relax.in")
+    synth_qe.write_pw_input(path, nat=nat*16)
+    return [path]
+
+def _make_xsf(tmp, nat, nk, nstep, **kwargs):
+    path = os.path.join(tmp, "struct.xsf")
+    synth_qe.write_xsf(path, nat=nat*16)
+    return [path]
+
+def _make_xyz(tmp, nat, nk, nstep, **kwargs):
+    path = os.path.join(tmp, "struct.xyz")
+    synth_qe.write_xyz(path, nat=nat*16)
+    return [path]
+
+
+def _run_qe_out(paths):
+    from read_qeout import qe_out
+    qe_out(paths[0])
+
+def _run_qe_bands(paths):
+    from read_qeout import qe_bands
+    qe_bands(paths[0]).read_eigenenergies()
+
+def _run_read_pdos(paths):
+    from read_qeout import read_pdos
+    read_pdos(paths[0]).read_projections()
+
+def _run_band_dat(paths):
+    from read_qeout import band_out_and_band_dat
+    band_out_and_band_dat(paths[0], paths[1])
+
+def _run_qe_in(paths):
+    from read_qein import qe_in
+    qe_in(paths[0])
+
+def _run_read_xsf_xyz(paths):
+    from read_xsf_xyz import read_xsf_xyz
+    read_xsf_xyz(paths[0])
+
+
+# case name: (file maker, reader)
+CASES = {
+    "qe_out": (_make_qe_out, _run_qe_out),
+    "qe_out_spin": (
+        lambda tmp, **p: _make_qe_out(tmp, nspin=2, **p), _run_qe_out
+    ),
+    "qe_out_soc": (lambda tmp, **p: _make_qe_out(tmp, soc=True, **p), _run_qe_out),
+    "qe_out_low": (
+        lambda tmp, **p: _make_qe_out(tmp, verbosity="low", **p), _run_qe_out
+    ),
+    "qe_bands": (_make_qe_bands, _run_qe_bands),
+    "read_pdos": (_make_read_pdos, _run_read_pdos),
+    "band_out_and_band_dat": (_make_band_dat, _run_band_dat),
+    "qe_in": (_make_qe_in, _run_qe_in),
+    "read_xsf": (_make_xsf, _run_read_xsf_xyz),
+    "read_xyz": (_make_xyz, _run_read_xsf_xyz),
+}
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
+
+def _measure(case, paths, queue):
+    """
+    ++--------------------------------------------------------------------------
+    +   Run one reader in the current (child) process and put
+    +   (seconds, tracemalloc peak in bytes, max RSS in bytes) in the queue
+    ++--------------------------------------------------------------------------
+    """
+    import resource
+    import tracemalloc
+    sys.path.insert(0, SRC)
+    run = CASES[case][1]
+    # exclude the import time of the modules from the measurement
+    import read_qeout, read_qein, read_xsf_xyz
+    try:
+        import scipy.sparse
+    except ImportError:
+        pass
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        run(paths)
+        seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        maxrss *= 1024 # ru_maxrss is in kB on linux and in bytes on macOS
+    queue.put((seconds, peak, maxrss))
+
+
+def bench_case(case, size, repeat=3, tmpdir=None):
+    """
+    ++--------------------------------------------------------------------------
+    +   Synthesize the files of one case and size and time the reader
+    +   repeat times, each in a freshly spawned interpreter
+    +
+    +   Return: a dict record (see module docstring)
+    ++--------------------------------------------------------------------------
+    """
+    make = CASES[case][0]
+    params = SIZES[size]
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(dir=tmpdir) as tmp:
+        paths = make(tmp, **params)
+        file_bytes = sum(os.path.getsize(p) for p in paths)
+        results = []
+        for _ in range(repeat):
+            queue = context.Queue()
+            process = context.Process(
+                target=_measure, args=(case, paths, queue)
+            )
+            process.start()
+            process.join()
+            # the readers may call sys.exit, which leaves the queue empty
+            if process.exitcode != 0 or queue.empty():
+                raise RuntimeError(
+                    "{} ({}) exited with code {} before reporting"
+                    .format(case, size, process.exitcode)
+                )
+            results.append(queue.get())
+    results = np.asarray(results, dtype=float)
+    seconds = float(np.min(results[:, 0]))
+    return {
+        "case": case,
+        "size": size,
+        "params": params,
+        "file_bytes": file_bytes,
+        "seconds": seconds,
+        "seconds_all": results[:, 0].tolist(),
+        "mb_per_s": file_bytes / 1e6 / seconds,
+        "tracemalloc_peak_mb": float(np.max(results[:, 1])) / 1e6,
+        "peak_rss_mb": float(np.max(results[:, 2])) / 1e6,
+    }
+
+
+def _meta():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=SRC, capture_output=True,
+            text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run(cases=None, sizes=("small",), repeat=3, tmpdir=None, verbosity=True):
+    """
+    ++--------------------------------------------------------------------------
+    +   Run all (case, size) combinations
+    +
+    +   Return: {"meta": {...}, "results": [record, ...]}
+    ++--------------------------------------------------------------------------
+    """
+    if cases is None:
+        cases = list(CASES)
+    results = []
+    for size in sizes:
+        for case in cases:
+            record = bench_case(case, size, repeat=repeat, tmpdir=tmpdir)
+            results.append(record)
+            if verbosity:
+                print(
+                    "{:24s} {:7s} {:9.2f} MB {:9.4f} s {:9.2f} MB/s "
+                    "{:9.1f} MB peak RSS".format(
+                        case, size, record["file_bytes"] / 1e6,
+                        record["seconds"], record["mb_per_s"],
+                        record["peak_rss_mb"]
+                    ), file=sys.stderr
+                )
+    return {"meta": _meta(), "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Quantum Espresso readers on synthetic files"
+    )
+    parser.add_argument(
+        "--case", type=str, nargs="+", default=None, choices=list(CASES),
+        help="cases to run (default: all)"
+    )
+    parser.add_argument(
+        "--size", type=str, nargs="+", default=["small"], choices=list(SIZES),
+        help="problem sizes to run"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="number of runs of each case"
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, default=None,
+        help="JSON file to write (default: stdout)"
+    )
+    args = parser.parse_args()
+    report = run(cases=args.case, sizes=args.size, repeat=args.repeat)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
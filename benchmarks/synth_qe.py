@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import numpy as np
+
+
+"""
+++------------------------------------------------------------------------------
++   Generator of synthetic Quantum Espresso files for benchmarking the readers
++
++   write_pw_output (pw.x scf/relax output, read by qe_out and qe_bands)
++   write_pw_input (pw.x input, read by qe_in)
++   write_bands_files (bands.x bands.dat and output, read by
++   band_out_and_band_dat)
++   write_projwfc_output (projwfc.x output, read by read_pdos)
++   write_xsf, write_xyz (read by read_xsf_xyz)
++
++   The numbers are random but the layout follows pw.x 6.x/7.x, so that the
++   files are parsed by the same code paths as real outputs.
+++------------------------------------------------------------------------------
+"""
+
+# physical constants
+Bohr = 5.29177210903e-11 # unit m
+Bohr2Ang = Bohr/1e-10
+Ry2eV = 13.605693122994 # Rydberg constant in eV
+
+SPECIES = [("Si", 28.0855, 4.0), ("C", 12.011, 4.0)]
+
+
+def _structure(nat, seed=0):
+    """
+    ++--------------------------------------------------------------------------
+    +   A cubic cell with a density of about 0.05 atom/angstrom^3 and random
+    +   atomic positions
+    ++--------------------------------------------------------------------------
+    """
+    rng = np.random.default_rng(seed)
+    a = (nat / 0.05) ** (1 / 3)
+    cell_parameters = np.eye(3) * a
+    atomic_pos_cryst = rng.uniform(0, 1, (nat, 3))
+    atoms = [SPECIES[i % len(SPECIES)][0] for i in range(nat)]
+    return(atoms, cell_parameters, atomic_pos_cryst)
+
+
+def _rows(values, per_row, fmt, indent="  "):
+    """
+    ++--------------------------------------------------------------------------
+    +   Format a 1D array into rows of per_row numbers
+    ++--------------------------------------------------------------------------
+    """
+    lines = []
+    for i in range(0, len(values), per_row):
+        lines.append(indent + "".join(fmt.format(x) for x in values[i:i+per_row]))
+    return lines
+
+
+def write_pw_output(
+    path, nat=8, nk=10, nbnd=None, nspin=1, soc=False, nstep=1, niter=6,
+    verbosity="high", seed=0
+):
+    """
+    ++--------------------------------------------------------------------------
+    +   Write a synthetic pw.x output
+    +
+    +   nat (number of atoms)
+    +   nk (number of k points)
+    +   nbnd (number of bands, default twice the occupied bands)
+    +   nspin (1 or 2)
+    +   soc (noncollinear with spin-orbit coupling)
+    +   nstep (number of ionic steps, relax if larger than 1)
+    +   niter (number of scf iterations in each ionic step)
+    +   verbosity ("high" or "low")
+    ++--------------------------------------------------------------------------
+    """
+    rng = np.random.default_rng(seed)
+    atoms, cell_parameters, atomic_pos_cryst = _structure(nat, seed)
+    ntyp = min(nat, len(SPECIES))
+    ne = sum(SPECIES[i % len(SPECIES)][2] for i in range(nat))
+    nocc = int(ne) if soc else int(ne // 2)
+    if nbnd is None:
+        nbnd = 2 * nocc
+    spinpol = nspin == 2
+    high = verbosity == "high"
+    alat = cell_parameters[0, 0] / Bohr2Ang
+    cryst_axes = cell_parameters / cell_parameters[0, 0]
+    R_axes = np.linalg.inv(cryst_axes).T
+    kpts_cryst = np.round(rng.uniform(-0.5, 0.5, (nk, 3)), 4)
+    kpts_cart = kpts_cryst @ R_axes
+
+    L = []
+    L.append("")
+    L.append("     Program PWSCF v.7.2 starts on  1Jan2024 at 10: 0: 0 ")
+    L.append("")
+    L.append("     Parallel version (MPI), running on     4 processors")
+    L.append("")
+    L.append("     MPI processes distributed on     1 nodes")
+    L.append("     K-points division:     npool     =       2")
+    L.append("     R & G space division:  proc/nbgrp/npool/nimage =       2")
+    L.append("")
+    if soc:
+        L.append("     Noncollinear calculation with spin-orbit")
+        L.append("")
+    L.append("     bravais-lattice index     =            0")
+    L.append("     lattice parameter (alat)  = {:12.4f}  a.u.".format(alat))
+    L.append("     unit-cell volume          = {:12.4f} (a.u.)^3".format(alat**3))
+    L.append("     number of atoms/cell      = {:12d}".format(nat))
+    L.append("     number of atomic types    = {:12d}".format(ntyp))
+    if spinpol:
+        L.append(
+            "     number of electrons       = {:12.2f} (up: {:6.2f}, down: {:6.2f})"
+            .format(ne, ne / 2 + 1, ne / 2 - 1)
+        )
+    else:
+        L.append("     number of electrons       = {:12.2f}".format(ne))
+    L.append("     number of Kohn-Sham states= {:12d}".format(nbnd))
+    L.append("     kinetic-energy cutoff     =      30.0000  Ry")
+    L.append("     charge density cutoff     =     120.0000  Ry")
+    L.append("     scf convergence threshold =      1.0E-08")
+    L.append("     mixing beta               =       0.7000")
+    L.append("     number of iterations used =            8  plain     mixing")
+    L.append("     Exchange-correlation= PBE")
+    L.append("                           (   1   4   3   4   0   0   0)")
+    L.append("")
+    L.append(
+        "     celldm(1)= {:11.6f}  celldm(2)=   0.000000  celldm(3)=   0.000000"
+        .format(alat)
+    )
+    L.append("     celldm(4)=   0.000000  celldm(5)=   0.000000  celldm(6)=   0.000000")
+    L.append("")
+    L.append("     crystal axes: (cart. coord. in units of alat)")
+    for i in range(3):
+        L.append(
+            "               a({}) = ( {:10.6f} {:10.6f} {:10.6f} )  "
+            .format(i+1, *cryst_axes[i])
+        )
+    L.append("")
+    L.append("     reciprocal axes: (cart. coord. in units 2 pi/alat)")
+    for i in range(3):
+        L.append(
+            "               b({}) = ( {:9.6f} {:9.6f} {:9.6f} )  "
+            .format(i+1, *R_axes[i])
+        )
+    L.append("")
+    L.append("     atomic species   valence    mass     pseudopotential")
+    for name, mass, valence in SPECIES[:ntyp]:
+        L.append(
+            "        {:2s}            {:5.2f}    {:8.5f}     {:2s}( 1.00)"
+            .format(name, valence, mass, name)
+        )
+    L.append("")
+    L.append("     No symmetry found")
+    L.append("")
+
+    atomic_pos_alat = atomic_pos_cryst @ cryst_axes
+    L.append("   Cartesian axes")
+    L.append("")
+    L.append("     site n.     atom                  positions (alat units)")
+    for i in range(nat):
+        L.append(
+            "     {:5d}           {:2s}  tau({:4d}) = ( {:11.7f} {:11.7f} {:11.7f}  )"
+            .format(i+1, atoms[i], i+1, *atomic_pos_alat[i])
+        )
+    L.append("")
+    if high:
+        L.append("   Crystallographic axes")
+        L.append("")
+        L.append("     site n.     atom                  positions (cryst. coord.)")
+        for i in range(nat):
+            L.append(
+                "     {:5d}           {:2s}  tau({:4d}) = (  {:9.7f}  {:9.7f}  {:9.7f}  )"
+                .format(i+1, atoms[i], i+1, *atomic_pos_cryst[i])
+            )
+        L.append("")
+    L.append("     number of k points= {:5d}".format(nk))
+    L.append("                       cart. coord. in units 2pi/alat")
+    for i in range(nk):
+        L.append(
+            "        k({:5d}) = ({:12.7f}{:12.7f}{:12.7f}), wk = {:10.7f}"
+            .format(i+1, *kpts_cart[i], 2.0 / nk)
+        )
+    L.append("")
+    if high:
+        L.append("                       cryst. coord.")
+        for i in range(nk):
+            L.append(
+                "        k({:5d}) = ({:12.7f}{:12.7f}{:12.7f}), wk = {:10.7f}"
+                .format(i+1, *kpts_cryst[i], 2.0 / nk)
+            )
+        L.append("")
+    L.append(
+        "     Dense  grid:    22659 G-vectors     FFT dimensions: (  45,  45,  45)"
+    )
+    L.append("")
+
+    etot = -15.8 * nat / 2
+    cpu = 0.0
+    for step in range(nstep):
+        L.append("     Self-consistent Calculation")
+        L.append("")
+        for it in range(niter):
+            cpu += 0.3
+            energy = etot + 0.1 * np.exp(-it) + 0.001 * rng.uniform()
+            L.append(
+                "     iteration #{:3d}     ecut=    30.00 Ry     beta= 0.70"
+                .format(it+1)
+            )
+            L.append("     Davidson diagonalization with overlap")
+            L.append("     ethr =  1.00E-02,  avg # of iterations =  2.0")
+            L.append("")
+            L.append(
+                "     total cpu time spent up to now is {:10.1f} secs".format(cpu)
+            )
+            L.append("")
+            if it < niter - 1:
+                L.append(
+                    "     total energy              = {:17.8f} Ry".format(energy)
+                )
+                L.append(
+                    "     estimated scf accuracy    < {:17.8f} Ry"
+                    .format(0.06 * np.exp(-2 * it))
+                )
+            if spinpol or soc:
+                if it < niter - 1:
+                    L.append("")
+                _magnetization_lines(L, nat, soc, rng)
+            L.append("")
+        L.append("     End of self-consistent calculation")
+        L.append("")
+        _eigenvalue_lines(L, nk, nbnd, nocc, spinpol, kpts_cart, high, rng)
+        L.append("     highest occupied, lowest unoccupied level (ev):     6.2465    6.8323")
+        L.append("")
+        L.append("!    total energy              = {:17.8f} Ry".format(etot))
+        L.append("     estimated scf accuracy    <          4.6E-09 Ry")
+        L.append("")
+        L.append("     convergence has been achieved in {:3d} iterations".format(niter))
+        L.append("")
+        forces = rng.normal(0, 0.01 / (step + 1), (nat, 3))
+        L.append("     Forces acting on atoms (cartesian axes, Ry/au):")
+        L.append("")
+        for i in range(nat):
+            L.append(
+                "     atom {:4d} type {:2d}   force = {:14.8f}{:14.8f}{:14.8f}"
+                .format(i+1, i % ntyp + 1, *forces[i])
+            )
+        L.append("")
+        L.append(
+            "     Total force = {:12.6f}     Total SCF correction =     0.000000"
+            .format(np.linalg.norm(forces))
+        )
+        L.append("")
+        L.append("")
+        L.append("     Computing stress (Cartesian axis) and pressure")
+        L.append("")
+        stress = rng.normal(0, 1e-5, (3, 3))
+        stress = (stress + stress.T) / 2
+        kbar = stress * 147105.08
+        L.append(
+            "          total   stress  (Ry/bohr**3)                   (kbar)     P= {:12.2f}"
+            .format(np.trace(kbar) / 3)
+        )
+        for i in range(3):
+            L.append(
+                "  {:12.8f} {:12.8f} {:12.8f}  {:14.2f} {:11.2f} {:11.2f}"
+                .format(*stress[i], *kbar[i])
+            )
+        L.append("")
+        if nstep > 1:
+            atomic_pos_cryst = atomic_pos_cryst + rng.normal(0, 1e-3, (nat, 3))
+            etot -= 0.001
+            L.append("     BFGS Geometry Optimization")
+            L.append("")
+            if step == nstep - 1:
+                L.append("     End of BFGS Geometry Optimization")
+                L.append("")
+                L.append("     Final energy   = {:18.10f} Ry".format(etot))
+                L.append("")
+                L.append("Begin final coordinates")
+                L.append("")
+            L.append("ATOMIC_POSITIONS (crystal)")
+            for i in range(nat):
+                L.append(
+                    "{:2s}       {:14.10f}      {:14.10f}      {:14.10f}"
+                    .format(atoms[i], *atomic_pos_cryst[i])
+                )
+            if step == nstep - 1:
+                L.append("End final coordinates")
+            L.append("")
+            L.append("")
+    _timing_lines(L, nstep, niter)
+
+    with open(path, "w") as f:
+        f.write("\n".join(L) + "\n")
+
+
+def _magnetization_lines(L, nat, soc, rng):
+    if soc:
+        L.append(
+            "     total magnetization       =     0.00     0.00     2.00 Bohr mag/cell"
+        )
+        L.append("     absolute magnetization    =     2.05 Bohr mag/cell")
+        L.append("")
+        for i in range(nat):
+            magnet = rng.normal(0, 0.1, 3)
+            L.append(
+                " atom {:4d} relative position :     0.0000    0.0000    0.0000"
+                .format(i+1)
+            )
+            L.append("     charge :    {:10.6f}".format(4.0 + rng.uniform()))
+            L.append(
+                "     magnetization :    {:10.6f}  {:10.6f}  {:10.6f}".format(*magnet)
+            )
+            L.append("     magnetization/charge:     0.000000    0.000000    0.000000")
+            L.append(
+                "     polar coord.: r, theta, phi [deg] :   {:10.6f}   0.000000   0.000000"
+                .format(np.linalg.norm(magnet))
+            )
+            L.append("")
+    else:
+        L.append("     total magnetization       =     2.00 Bohr mag/cell")
+        L.append("     absolute magnetization    =     2.05 Bohr mag/cell")
+        L.append("")
+        L.append("     Magnetic moment per site:")
+        for i in range(nat):
+            L.append(
+                "     atom: {:4d}    charge: {:9.4f}    magn: {:9.4f}    constr:    0.0000"
+                .format(i+1, 4.0 + rng.uniform(), rng.normal(0, 0.1))
+            )
+
+
+def _eigenvalue_lines(L, nk, nbnd, nocc, spinpol, kpts_cart, high, rng):
+    for spin in (["SPIN UP", "SPIN DOWN"] if spinpol else [None]):
+        if spin is not None:
+            L.append(" ------ {} ------------".format(spin))
+            L.append("")
+            L.append("")
+        for k in range(nk):
+            eigenE = np.sort(rng.uniform(-6, 12, nbnd))
+            eigenE[:nocc] = np.sort(rng.uniform(-6, 6, nocc))
+            eigenE[nocc:] = np.sort(rng.uniform(7, 12, nbnd - nocc))
+            L.append(
+                "          k ={:7.4f}{:7.4f}{:7.4f} (  1837 PWs)   bands (ev):"
+                .format(*kpts_cart[k])
+            )
+            L.append("")
+            L.extend(_rows(eigenE, 8, "{:9.4f}"))
+            if high:
+                L.append("")
+                L.append("     occupation numbers ")
+                occ = np.zeros(nbnd)
+                occ[:nocc] = 1
+                L.extend(_rows(occ, 8, "{:9.4f}"))
+            L.append("")
+
+
+def _timing_lines(L, nstep, niter):
+    n = nstep * niter
+    L.append("     init_run     :      0.25s CPU      0.27s WALL (       1 calls)")
+    L.append(
+        "     electrons    : {:9.2f}s CPU {:9.2f}s WALL ({:8d} calls)"
+        .format(0.3 * n, 0.31 * n, nstep)
+    )
+    L.append("")
+    L.append("     Called by electrons:")
+    L.append(
+        "     c_bands      : {:9.2f}s CPU {:9.2f}s WALL ({:8d} calls)"
+        .format(0.2 * n, 0.21 * n, n)
+    )
+    L.append(
+        "     sum_band     : {:9.2f}s CPU {:9.2f}s WALL ({:8d} calls)"
+        .format(0.05 * n, 0.05 * n, n)
+    )
+    L.append("")
+    L.append("     General routines")
+    L.append(
+        "     calbec       : {:9.2f}s CPU {:9.2f}s WALL ({:8d} calls)"
+        .format(0.01 * n, 0.01 * n, 10 * n)
+    )
+    L.append(
+        "     fft          : {:9.2f}s CPU {:9.2f}s WALL ({:8d} calls)"
+        .format(0.02 * n, 0.02 * n, 4 * n)
+    )
+    L.append("")
+    L.append(
+        "     PWSCF        : {:9.2f}s CPU {:9.2f}s WALL"
+        .format(0.3 * n + 0.5, 0.31 * n + 0.5)
+    )
+    L.append("")
+    L.append("   This run was terminated on:  10: 1:40   1Jan2024            ")
+    L.append("")
+    L.append("=------------------------------------------------------------------------------=")
+    L.append("   JOB DONE.")
+    L.append("=------------------------------------------------------------------------------=")
+
+
+def write_pw_input(path, nat=8, nk=4, seed=0):
+    """
+    ++--------------------------------------------------------------------------
+    +   Write a synthetic pw.x input with ibrav = 0
+    ++--------------------------------------------------------------------------
+    """
+    atoms, cell_parameters, atomic_pos_cryst = _structure(nat, seed)
+    ntyp = min(nat, len(SPECIES))
+    L = []
+    L.append("&CONTROL")
+    L.append("  calculation = 'relax'")
+    L.append("  prefix = 'synth'")
+    L.append("/")
+    L.append("&SYSTEM")
+    L.append("  ibrav = 0")
+    L.append("  nat = {}".format(nat))
+    L.append("  ntyp = {}".format(ntyp))
+    L.append("  ecutwfc = 30.0")
+    L.append("/")
+    L.append("&ELECTRONS")
+    L.append("  conv_thr = 1.0d-8")
+    L.append("/")
+    L.append("&IONS")
+    L.append("/")
+    L.append("ATOMIC_SPECIES")
+    for name, mass, valence in SPECIES[:ntyp]:
+        L.append("{} {} {}.upf".format(name, mass, name))
+    L.append("CELL_PARAMETERS angstrom")
+    for i in range(3):
+        L.append("  {:.10f}  {:.10f}  {:.10f}".format(*cell_parameters[i]))
+    L.append("ATOMIC_POSITIONS crystal")
+    for i in range(nat):
+        L.append("{:2s}  {:.10f}  {:.10f}  {:.10f}".format(atoms[i], *atomic_pos_cryst[i]))
+    L.append("K_POINTS automatic")
+    L.append("{0} {0} {0} 0 0 0".format(nk))
+    with open(path, "w") as f:
+        f.write("\n".join(L) + "\n")
+
+
+def write_bands_files(path_dat, path_out, nks=100, nbnd=16, seed=0):
+    """
+    ++--------------------------------------------------------------------------
+    +   Write synthetic bands.dat and bands.x output along the path G-X-M-G
+    ++--------------------------------------------------------------------------
+    """
+    rng = np.random.default_rng(seed)
+    hsymmpts = np.array([[0, 0, 0], [0.5, 0, 0], [0.5, 0.5, 0], [0, 0, 0]])
+    division = np.full(3, (nks - 1) // 3)
+    division[-1] = nks - 1 - np.sum(division[:-1])
+    kpts = [
+        hsymmpts[i] + (hsymmpts[i+1] - hsymmpts[i]) * j / division[i]
+        for i in range(3) for j in range(division[i])
+    ]
+    kpts.append(hsymmpts[-1])
+    kpts = np.asarray(kpts)
+    L = [" &plot nbnd= {:4d}, nks= {:5d} /".format(nbnd, nks)]
+    for k in range(nks):
+        L.append("           {:.6f}  {:.6f}  {:.6f}".format(*kpts[k]))
+        L.extend(_rows(np.sort(rng.uniform(-6, 12, nbnd)), 10, "{:8.3f}", indent=""))
+    with open(path_dat, "w") as f:
+        f.write("\n".join(L) + "\n")
+
+    xcoords = np.concatenate(
+        ([0], np.cumsum(np.linalg.norm(np.diff(hsymmpts, axis=0), axis=1)))
+    )
+    L = ["", "     Program BANDS v.7.2 starts on  1Jan2024 at 10: 0: 0 ", ""]
+    for i in range(hsymmpts.shape[0]):
+        L.append(
+            "     high-symmetry point:  {:.4f} {:.4f} {:.4f}   x coordinate   {:.4f}"
+            .format(*hsymmpts[i], xcoords[i])
+        )
+    L.append("     Plottable bands (eV) written to file bands.dat.gnu")
+    with open(path_out, "w") as f:
+        f.write("\n".join(L) + "\n")
+
+
+def write_projwfc_output(path, nat=8, nk=10, nbnd=16, nproj=5, seed=0):
+    """
+    ++--------------------------------------------------------------------------
+    +   Write a synthetic projwfc.x output with s and p states on each atom
+    +   and nproj nonzero projections per band
+    ++--------------------------------------------------------------------------
+    """
+    rng = np.random.default_rng(seed)
+    atoms = _structure(nat, seed)[0]
+    L = ["", "     Calling projwave .... ", "", "     Atomic states used for projection",
+         "     (read from pseudopotential files):", ""]
+    nstates = 0
+    for i in range(nat):
+        for wfc, l in ((1, 0), (2, 1)):
+            for m in range(1, 2 * l + 2):
+                nstates += 1
+                L.append(
+                    "     state #{:5d}: atom {:4d} ({:3s}), wfc {:2d} (l={} m={:2d})"
+                    .format(nstates, i+1, atoms[i], wfc, l, m)
+                )
+    L.append("")
+    for k in range(nk):
+        L.append(" k =   {:.10f}  0.0000000000  0.0000000000".format(k / nk))
+        for b in range(nbnd):
+            index = rng.choice(nstates, min(nproj, nstates), replace=False)
+            weights = np.sort(rng.uniform(0, 1 / nproj, index.shape[0]))[::-1]
+            L.append("==== e({:4d}) = {:11.5f} eV ==== ".format(b+1, -5 + 0.5 * b))
+            terms = [
+                "{:.3f}*[#{:4d}]+".format(w, s + 1) for w, s in zip(weights, index)
+            ]
+            L.append("     psi = " + "".join(terms[:5]))
+            for j in range(5, len(terms), 5):
+                L.append("           +" + "".join(terms[j:j+5]))
+            L.append("    |psi|^2 = {:.3f}".format(np.sum(weights)))
+            L.append("")
+    L.append("Lowdin Charges: ")
+    L.append("")
+    for i in range(nat):
+        L.append(
+            "     Atom # {:3d}: total charge =   {:.4f}, s =  1.0000, p =  3.0000, "
+            .format(i+1, 4.0 + rng.uniform(-0.1, 0.1))
+        )
+    L.append("     Spilling Parameter:   0.0040")
+    with open(path, "w") as f:
+        f.write("\n".join(L) + "\n")
+
+
+def write_xsf(path, nat=8, seed=0):
+    atoms, cell_parameters, atomic_pos_cryst = _structure(nat, seed)
+    atomic_pos_cart = atomic_pos_cryst @ cell_parameters
+    L = ["CRYSTAL", "PRIMVEC"]
+    for i in range(3):
+        L.append("{:.15f}  {:.15f}  {:.15f}".format(*cell_parameters[i]))
+    L.append("PRIMCOORD")
+    L.append("{}  1".format(nat))
+    for i in range(nat):
+        L.append("{}    {:.15f}  {:.15f}  {:.15f}".format(atoms[i], *atomic_pos_cart[i]))
+    with open(path, "w") as f:
+        f.write("\n".join(L) + "\n")
+
+
+def write_xyz(path, nat=8, seed=0):
+    atoms, cell_parameters, atomic_pos_cryst = _structure(nat, seed)
+    atomic_pos_cart = atomic_pos_cryst @ cell_parameters
+    L = [str(nat), ""]
+    for i in range(nat):
+        L.append("{}    {:.15f}  {:.15f}  {:.15f}".format(atoms[i], *atomic_pos_cart[i]))
+    with open(path, "w") as f:
+        f.write("\n".join(L) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic pw.x output"
+    )
+    parser.add_argument("output", type=str, help="path to the output file")
+    parser.add_argument("--nat", type=int, default=8, help="number of atoms")
+    parser.add_argument("--nk", type=int, default=10, help="number of k points")
+    parser.add_argument("--nbnd", type=int, default=None, help="number of bands")
+    parser.add_argument("--nspin", type=int, default=1, choices=[1, 2])
+    parser.add_argument("--soc", action="store_true", help="spin-orbit coupling")
+    parser.add_argument("--nstep", type=int, default=1, help="number of ionic steps")
+    parser.add_argument(
+        "--verbosity", type=str, default="high", choices=["high", "low"]
+    )
+    args = parser.parse_args()
+    write_pw_output(
+        args.output, nat=args.nat, nk=args.nk, nbnd=args.nbnd,
+        nspin=args.nspin, soc=args.soc, nstep=args.nstep,
+        verbosity=args.verbosity
+    )
@@ -3,7 +3,11 @@ import numpy as np
 import sys
 import os
 import matplotlib.pyplot as plt
-sys.path.insert(0, "/home/lkj/work/github/plot")
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+# plot_tools comes from the separate "plot" repository
+sys.path.insert(0, os.environ.get("PLOT_TOOLS_PATH", os.getcwd()))
 from constraint_atoms import cstr_atoms
 from plot_tools import view_3d
 from read_qeout import qe_out
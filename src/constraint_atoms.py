@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import numpy as np
 import os
+from scipy.spatial import cKDTree
+from concurrent.futures import ProcessPoolExecutor
 from write_files import write_files
+from species import encode, decode, code
 
 
 class cstr_atoms(object):
@@ -14,7 +17,9 @@ class cstr_atoms(object):
     +   atomic_pos_cryst (atomic positions)
     +
     +   Attributes:
-    +   self.atoms (atomic species associated with each atomic position)
+    +   self.species (table of the atomic species, see species.py)
+    +   self.species_codes (code of the species of each atom, uint8)
+    +   self.atoms (read-only, species of each atom decoded from the codes)
     +   self.nat (number of atoms)
     +   self.cell_parameters (cell parameters in cartesian coordinates, angstrom)
     +   self.atomic_pos_cryst (atomic positions in fractional crystal coordinates)
@@ -32,9 +37,13 @@ class cstr_atoms(object):
     +   self.cubes_atomic_pos_cryst (a cube is an image of the supercell, containing 
     +   atomic positions in cystal coordinates)
     +   self.cubes_mass (corresponding atomic mass in cubes)
-    +   self.cubes_atoms (atomic species in cubes)
+    +   self.cubes_species_codes (codes of the atomic species in cubes, uint8,
+    +   see self.species)
+    +   self.cubes_atoms (atomic species in cubes, decoded from the codes on
+    +   access)
     +
-    +   return(all_atomic_pos_cart, all_mass)
+    +   return(all_species_codes, all_atomic_pos_cryst, all_atomic_pos_cart,
+    +   all_mass) (decode(self.species, all_species_codes) gives the species)
     ++--------------------------------------------------------------------------
     +   3. Method supercell(self, x_rep, y_rep, z_rep)
     +   Input: repetition times of the original supercell in each of x, y and z 
@@ -53,7 +62,9 @@ class cstr_atoms(object):
     +
     +   Attributes:
     +   self.is_free (boolean values, determine if atoms are free to move)
-    +   self.fake_atoms (an array of atoms of which are He beyond the sphere)
+    +   self.fake_species (self.species with He appended if missing)
+    +   self.fake_species_codes (codes of the atoms, He beyond the sphere)
+    +   self.fake_atoms (read-only, decoded from self.fake_species_codes)
     +
     +   No return
     ++--------------------------------------------------------------------------
@@ -76,21 +87,71 @@ class cstr_atoms(object):
     +
     +   return mass
     ++--------------------------------------------------------------------------
+    +   7. Method trim_cell(self, center=[0, 0, 0], radius=0, 
+    +   H_bond_length=1.07, common_bond_length=1.6)
+    +   Input:
+    +   center (center of the cluster)
+    +   radius (radius of the cluster)
+    +   H_bond_length (bond length of the passivating H)
+    +   common_bond_length (largest bond length between neighbors)
+    +
+    +   Attributes:
+    +   self.trim_cell_atoms (atomic species of the cluster)
+    +   self.trim_cell_atomic_pos_cart (atomic positions of the cluster)
+    +   self.trim_cell_atomic_pos_cryst (atomic positions in crystal coordinates)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   8. Method bonds(self, common_bond_length=1.6)
+    +   Input: common_bond_length (largest bond length between neighbors)
+    +
+    +   return(bond_first, bond_second) (indices of the bonded atoms of the
+    +   27 images)
+    ++--------------------------------------------------------------------------
+    +   9. Method trim_cells(self, specs, common_bond_length=1.6, 
+    +   processes=None)
+    +   Input:
+    +   specs (list of (center, radius, H_bond_length))
+    +   processes (number of worker processes)
+    +
+    +   return [(trim_cell_atoms, trim_cell_atomic_pos_cart), ...]
+    ++--------------------------------------------------------------------------
     """
     def __init__(self, atoms=None, cell_parameters=None, atomic_pos_cryst=None):
-        self.atoms = np.copy(atoms)
         self.cell_parameters = np.copy(cell_parameters)
         self.atomic_pos_cryst = np.copy(atomic_pos_cryst)
         self.atomic_pos_cart = np.matmul(atomic_pos_cryst, cell_parameters)
         self.nat = np.copy(atomic_pos_cryst.shape[0])
 
-        self.atomic_mass = np.zeros(self.nat)
-        for i in range(self.nat):
-            self.atomic_mass[i] = np.copy(self.dict_atomic_mass(atoms[i]))
+        # species codes, the masses are looked up once per species
+        self.species, self.species_codes = encode(atoms)
+        self.atomic_mass = np.array(
+            [self.dict_atomic_mass(s) for s in self.species], dtype=float
+        )[self.species_codes]
         
         self.magic_cube()
         self.supercell()
 
+    @property
+    def atoms(self):
+        """
+        ++----------------------------------------------------------------------
+        +   Atomic species of each atom (U4), decoded from self.species_codes
+        +   when asked for
+        ++----------------------------------------------------------------------
+        """
+        return decode(self.species, self.species_codes)
+
+    @property
+    def fake_atoms(self):
+        """
+        ++----------------------------------------------------------------------
+        +   Atomic species with He beyond the sphere (U4), decoded from
+        +   self.fake_species_codes when asked for
+        ++----------------------------------------------------------------------
+        """
+        return decode(self.fake_species, self.fake_species_codes)
+
     def magic_cube(self):
         """
         ++----------------------------------------------------------------------
@@ -137,7 +198,7 @@ class cstr_atoms(object):
         self.cubes_atomic_pos_cart = np.zeros((3, 3, 3, self.nat, 3))
         self.cubes_atomic_pos_cryst = np.zeros((3, 3, 3, self.nat, 3))
         self.cubes_mass = np.zeros((3, 3, 3, self.nat))
-        self.cubes_atoms = np.zeros((3, 3, 3, self.nat), dtype="U4")
+        self.cubes_species_codes = np.zeros((3, 3, 3, self.nat), dtype=np.uint8)
 
         self.inv_cell_parameters = np.linalg.inv(self.cell_parameters)
 
@@ -154,7 +215,7 @@ class cstr_atoms(object):
                         self.cubes_atomic_pos_cart[i, j, k, :, :], self.inv_cell_parameters
                     )
                     self.cubes_mass[i, j, k, :] = np.copy(self.atomic_mass)
-                    self.cubes_atoms[i, j, k, :] = np.copy(self.atoms)
+                    self.cubes_species_codes[i, j, k, :] = self.species_codes
         
         # reshape the array to be 2D to make it convenient to plot
         all_atomic_pos_cart = self.cubes_atomic_pos_cart.reshape(27*self.nat, 3)
@@ -162,8 +223,21 @@ class cstr_atoms(object):
             27*self.nat, 3
         )
         all_mass = self.cubes_mass.reshape(27*self.nat)
-        all_atoms = self.cubes_atoms.reshape(27*self.nat)
-        return(all_atoms, all_atomic_pos_cryst, all_atomic_pos_cart, all_mass)
+        all_species_codes = self.cubes_species_codes.reshape(27*self.nat)
+        return(
+            all_species_codes, all_atomic_pos_cryst, all_atomic_pos_cart,
+            all_mass
+        )
+
+    @property
+    def cubes_atoms(self):
+        """
+        ++----------------------------------------------------------------------
+        +   Atomic species in cubes (U4), decoded from self.cubes_species_codes
+        +   only when asked for; kept for the code using the former attribute
+        ++----------------------------------------------------------------------
+        """
+        return decode(self.species, self.cubes_species_codes)
 
     def supercell(self, x_rep: int=2, y_rep: int=2, z_rep: int=2) -> None:
         """
@@ -205,8 +279,11 @@ class cstr_atoms(object):
         # initialization
         is_in_sphere = np.full((3, 3, 3, self.nat), True) # value true
         self.is_free = np.full(self.nat, False) # value true
-        # fake array of atoms with all atoms to be He
-        self.fake_atoms = np.full(self.nat, "He")
+        # fake atoms with all atoms to be He, as codes of the species
+        self.fake_species = encode(["He"], self.species)[0]
+        self.fake_species_codes = np.full(
+            self.nat, code(self.fake_species, "He"), dtype=np.uint8
+        )
 
         # atoms in the block (i, j, k)
         for i in range(3):
@@ -225,7 +302,7 @@ class cstr_atoms(object):
                             # allow atom l to move
                             self.is_free[l] = True
                             # replace He in the sphere with original atoms
-                            self.fake_atoms[l] = np.copy(self.atoms[l])
+                            self.fake_species_codes[l] = self.species_codes[l]
                         else:
                             # constain atoms and
                             # decrease the weight of constraint atoms
@@ -311,82 +388,142 @@ class cstr_atoms(object):
         # common bond length for justifying the nearest neighbor atoms
         # the default common_bond_length = 1.6 # Angstrom for NV center
 
-        # initialization
-        is_in_sphere = np.full(self.nat*27, True) # value true
-        is_in_sphere_and_at_boundary = np.full(self.nat*27, True) # value true
-        is_outsite_sphere_and_at_boundary = np.full(self.nat*27, True) # value true
-        supercell_atomic_pos_cart = self.cubes_atomic_pos_cart.reshape(self.nat*27, 3)
-        supercell_atoms = self.cubes_atoms.reshape(self.nat*27)
+        all_atomic_pos_cart = self.cubes_atomic_pos_cart.reshape(self.nat*27, 3)
         print(
             "The range of atomic position in cartesian coordinate: [{}, {}]".format(
                 np.amin(self.cubes_atomic_pos_cart), np.amax(self.cubes_atomic_pos_cart)
             )
         )
-        
+        print("Finding atoms in the sphere and passivating the boundary")
+        set_atoms, set_atomic_pos_cart = _trim_sphere(
+            center, radius, H_bond_length, common_bond_length,
+            self.species, self.cubes_species_codes.reshape(self.nat*27),
+            all_atomic_pos_cart,
+            *self.bonds(common_bond_length)
+        )
+
+        self.trim_cell_atoms = set_atoms
+        self.trim_cell_atomic_pos_cart = set_atomic_pos_cart
+        self.trim_cell_atomic_pos_cryst = np.matmul(set_atomic_pos_cart, self.inv_cell_parameters)
+
+    def bonds(self, common_bond_length=1.6):
+        """
+        ++----------------------------------------------------------------------
+        +   Pairs of atoms of the 27 images closer than common_bond_length,
+        +   in both directions and sorted by the first then the second index,
+        +   found once with a KD-tree and kept for the next calls
+        ++----------------------------------------------------------------------
+        """
+        if self.__dict__.get("_bonds_length") != common_bond_length:
+            all_atomic_pos_cart = self.cubes_atomic_pos_cart.reshape(self.nat*27, 3)
+            tree = cKDTree(all_atomic_pos_cart)
+            pairs = tree.query_pairs(common_bond_length, output_type="ndarray")
+            dist = np.linalg.norm(
+                all_atomic_pos_cart[pairs[:, 0]] - all_atomic_pos_cart[pairs[:, 1]],
+                axis=1
+            )
+            pairs = pairs[dist < common_bond_length]
+            first = np.concatenate((pairs[:, 0], pairs[:, 1]))
+            second = np.concatenate((pairs[:, 1], pairs[:, 0]))
+            order = np.lexsort((second, first))
+            self._bonds = (first[order], second[order])
+            self._bonds_length = common_bond_length
+        return self._bonds
+
+    def trim_cells(self, specs, common_bond_length=1.6, processes=None):
+        """
+        ++----------------------------------------------------------------------
+        +   trim_cell for many spheres at once, e.g. for the convergence of
+        +   clusters with their size
+        +   specs (list of (center, radius, H_bond_length))
+        +   processes (number of worker processes, None to trim in this one)
+        +
+        +   The images and the bonds are found once for all the spheres. The
+        +   clusters are the same, in the same order, as those of trim_cell.
+        +
+        +   return [(trim_cell_atoms, trim_cell_atomic_pos_cart), ...]
+        ++----------------------------------------------------------------------
+        """
+        shared = (
+            self.species, self.cubes_species_codes.reshape(self.nat*27),
+            self.cubes_atomic_pos_cart.reshape(self.nat*27, 3),
+        ) + tuple(self.bonds(common_bond_length))
+        jobs = [
+            (center, radius, H_bond_length, common_bond_length)
+            for center, radius, H_bond_length in specs
+        ]
+        if processes is None:
+            return [_trim_sphere(*job, *shared) for job in jobs]
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_trim_worker,
+            initargs=shared
+        ) as executor:
+            return list(executor.map(_trim_worker, jobs))
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
 
-        # initialize the set for saving the atoms in the cell that is trimed
-        set_atomic_pos_cart = []
-        set_atoms = []
-
-        # displacement of the atoms in block ijk to the defined center
-        displ = supercell_atomic_pos_cart - center
-        # distance to the center
-        dist = np.linalg.norm(displ, axis=1)
-        # assign true if distance is smaller than the radius
-        print("Finding atoms in the sphere")
-        is_in_sphere = (dist < radius)
-        # assign true if the difference between distance and radius is smaller than 0 
-        # and larger than a usual bond length
-        print("Finding atoms in the sphere and at boundary")
-        is_in_sphere_and_at_boundary = (
-            ((dist - radius) <= 0.0) & ((dist - radius) > -common_bond_length)
+def _trim_sphere(
+    center, radius, H_bond_length, common_bond_length,
+    species, all_codes, all_atomic_pos_cart, bond_first, bond_second
+):
+    """
+    ++--------------------------------------------------------------------------
+    +   Atoms of the sphere followed by the H passivating each bond from an
+    +   atom in the sphere at the boundary to an atom outside the sphere at
+    +   the boundary, ordered as in cstr_atoms.trim_cell
+    +   The species of the images are given by their codes (all_codes) in
+    +   the table species, only those of the cluster are made strings.
+    ++--------------------------------------------------------------------------
+    """
+    # distance to the center
+    dist = np.linalg.norm(all_atomic_pos_cart - center, axis=1)
+    is_in_sphere = (dist < radius)
+    is_in_sphere_and_at_boundary = (
+        ((dist - radius) <= 0.0) & ((dist - radius) > -common_bond_length)
+    )
+    is_outsite_sphere_and_at_boundary = (
+        ((dist - radius) > 0.0) & ((dist - radius) < common_bond_length)
+    )
+    is_passivated = (
+        is_in_sphere_and_at_boundary[bond_first]
+        & is_outsite_sphere_and_at_boundary[bond_second]
+    )
+    inner = bond_first[is_passivated]
+    outer = bond_second[is_passivated]
+    # unit vectors from the atoms in the sphere to their neighbors outside
+    displ = all_atomic_pos_cart[outer] - all_atomic_pos_cart[inner]
+    unit_vec = displ / np.linalg.norm(displ, axis=1)[:, None]
+    atoms = np.concatenate(
+        (
+            decode(species, all_codes[is_in_sphere]),
+            np.full(len(inner), "H")
         )
-        
-        # assign true if the difference between distance and radius is larger than 0 
-        # and smaller than a usual bond length
-        print("Finding atoms outsite of the sphere and at boundary")
-        is_outsite_sphere_and_at_boundary = (
-            ((dist - radius) > 0.0) & ((dist - radius) < common_bond_length)
+    )
+    atomic_pos_cart = np.concatenate(
+        (
+            all_atomic_pos_cart[is_in_sphere],
+            all_atomic_pos_cart[inner] + unit_vec * H_bond_length
         )
+    )
+    return(atoms, atomic_pos_cart)
 
-        
-        for l in range(self.nat*27):
-            # check if the l-th atom is in the sphere. If so, add the atom to the set of atoms
-            if is_in_sphere[l] == True:
-                set_atoms.append(supercell_atoms[l])
-                set_atomic_pos_cart.append(supercell_atomic_pos_cart[l])
-
-        for l in range(self.nat*27):
-            if is_in_sphere_and_at_boundary[l]:
-                # if the l-th atom is in the sphere and at the boundary, then
-                for m in range(self.nat*27):
-                    # check if the m-th atom is outsite the sphere and at the boundary
-                    if (
-                        is_in_sphere_and_at_boundary[l] == True 
-                        and 
-                        is_outsite_sphere_and_at_boundary[m] == True
-                    ):
-                        # if so, check if l-th atom and m-th atom are the nearest neighbors
-                        displ_between_two_atoms = (
-                            supercell_atomic_pos_cart[l] - supercell_atomic_pos_cart[m]
-                        )
-                        dist_between_two_atoms = np.linalg.norm(displ_between_two_atoms)
-                        # get unit vector that points from an atom in the sphere to the nearest atom
-                        # outside the sphere
-                        unit_vec = -displ_between_two_atoms/dist_between_two_atoms
-                        if dist_between_two_atoms < common_bond_length:
-                            # if so, get the position of the passivation H atom by changing the atomis positions of the atom 
-                            # outsite the sphere and at the boundary along the direction into which the original bond points
-                            set_atomic_pos_cart.append(
-                                supercell_atomic_pos_cart[l] + unit_vec * H_bond_length
-                            )
-                            # add the passivation H atom
-                            set_atoms.append("H")
-
-        self.trim_cell_atoms = np.asarray(set_atoms)
-        self.trim_cell_atomic_pos_cart = np.asarray(set_atomic_pos_cart)
-        self.trim_cell_atomic_pos_cryst = np.matmul(set_atomic_pos_cart, self.inv_cell_parameters)
-    
+
+# data shared by the worker processes of cstr_atoms.trim_cells
+_trim_shared = None
+
+def _init_trim_worker(*shared):
+    global _trim_shared
+    _trim_shared = shared
+
+def _trim_worker(job):
+    return _trim_sphere(*job, *_trim_shared)
 
 
 
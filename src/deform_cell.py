@@ -5,6 +5,7 @@ import os
 from scipy.optimize import curve_fit
 from read_qeout import qe_out
 from read_qein import qe_in
+from rotation_matrix import euler_matrices
 
 class strain_and_deform_cell(object):
     """
@@ -36,6 +37,37 @@ class strain_and_deform_cell(object):
     +
     +   return(atomic_pos_cart)
     =---------------------------------------------------------------------------
+    +   4. Method deform(self, wrinkles=None, bumps=None, cart=False)
+    +   Input:
+    +   wrinkles (amp, std, peak_x, peak_y, theta of each wrinkle)
+    +   bumps (amp, std, peak_x, peak_y of each bump)
+    +   cart (return the atomic positions in angstrom?)
+    +
+    +   Attributes: none
+    +
+    +   return(atomic_pos_cryst) (one structure per set of parameters)
+    =---------------------------------------------------------------------------
+    +   5. Method strained_cells(self, strain, direction=None, cart=False)
+    +   Input:
+    +   strain (sweep of strains, see strain_tensors)
+    +   direction (direction of the strain magnitudes, see strain_tensors)
+    +   cart (also return the atomic positions in angstrom?)
+    +
+    +   Attributes: none
+    +
+    +   return(cells) or return(cells, atomic_pos_cart)
+    =---------------------------------------------------------------------------
+    +   6. Method write_cells(self, cells, atoms, directory=".", 
+    +   prefix="strain", fmt="xsf", template=None)
+    +   Input:
+    +   cells (stack of cell parameters, e.g. from strained_cells)
+    +   atoms (atomic species associated with each atomic position)
+    +   fmt ("xsf" or "qe" for pw.x inputs from the template input)
+    +
+    +   Attributes: none
+    +
+    +   return(paths)
+    =---------------------------------------------------------------------------
     """
     def __init__(self, cell_parameters=None, atomic_pos_cryst=None):
         self._cell_parameters = cell_parameters
@@ -66,40 +98,8 @@ class strain_and_deform_cell(object):
         +   Step 3. gamma: rotation along z axis
         =-----------------------------------------------------------------------
         """
-        # convert to radian from degree
-        alpha = alpha / 180.0 * np.pi 
-        beta = beta / 180.0 * np.pi 
-        gamma = gamma / 180.0 * np.pi 
-        # rotation matrix along x
-        rot_x = np.matrix(
-            [
-                [1, 0, 0], 
-                [0, np.cos(alpha), -np.sin(alpha)],
-                [0, np.sin(alpha), np.cos(alpha)]
-            ]
-        )
-        # rotation matrix along y
-        rot_y = np.matrix(
-            [
-                [np.cos(beta), 0, np.sin(beta)], 
-                [0, 1, 0],
-                [-np.sin(alpha), 0, np.cos(alpha)]
-            ]
-        )
-        # rotation matrix along z
-        rot_z = np.matrix(
-            [
-                [np.cos(gamma), -np.sin(gamma), 0], 
-                [np.sin(gamma), np.cos(gamma), 0],
-                [0, 0, 1]
-            ]
-        )
-        # first rotate along x, then y, finally z
-        rotation_mat = np.matmul(rot_z, np.matmul(rot_y, rot_x))
-
-        self.cell_parameters = np.matmul(
-            self._cell_parameters, np.transpose(rotation_mat)
-        )
+        rotation_mat = rotation_matrices(alpha, beta, gamma)
+        self.cell_parameters = deform_cells(self._cell_parameters, rotation_mat)[0]
 
     
     def homogeneous_strain(self, strain=0):
@@ -118,16 +118,9 @@ class strain_and_deform_cell(object):
         +   Here the rotation is only allowed in perpendicular to 2D plane.
         =-----------------------------------------------------------------------
         """
-        strain_mat = np.matrix(
-            [
-                [1 + strain, 0, 0], 
-                [0, 1 + strain, 0], 
-                [0, 0, 1]
-            ]
-        )
-        self.cell_parameters = np.matmul(
-            self._cell_parameters, np.transpose(strain_mat)
-        )
+        self.cell_parameters = self.strained_cells(
+            [strain], direction=np.diag([1, 1, 0])
+        )[0]
 
 
     def uniaxial_strain(self, strain=0, theta=0):
@@ -149,29 +142,77 @@ class strain_and_deform_cell(object):
         +   Therefore, the cell parameters after applying strain to the symmetry 
         +   axis is C_1 = C(R^{-1}SR)^T.
         +   Here the rotation is only allowed in perpendicular to 2D plane.
+        +
+        +   R^{-1}SR - 1 = strain * nn^T with n = R^Tx = (cos(theta), 
+        +   -sin(theta), 0), i.e. a uniaxial strain along n.
         =-----------------------------------------------------------------------
         """
         theta = theta / 180.0 * np.pi # convert to radian from degree
-        strain_mat = np.matrix(
-            [
-                [1 + strain, 0, 0], 
-                [0, 1, 0], 
-                [0, 0, 1]
-            ]
-        )
-        rotation_mat = np.matrix(
-            [
-                [np.cos(theta), -np.sin(theta), 0], 
-                [np.sin(theta), np.cos(theta), 0],
-                [0, 0, 1]
-            ]
+        self.cell_parameters = self.strained_cells(
+            [strain], direction=[np.cos(theta), -np.sin(theta), 0]
+        )[0]
+
+    def strained_cells(self, strain, direction=None, cart=False):
+        """
+        =-----------------------------------------------------------------------
+        +   Strain the original cell by each strain of a sweep at once, see
+        +   strain_tensors for the accepted strains and directions
+        +
+        +   The cell parameters are C(1 + e)^T for each strain e and the 
+        +   atomic positions in crystal coordinates are unchanged.
+        +
+        +   return(cells) (nstrain x 3 x 3)
+        +   return(cells, atomic_pos_cart) (nstrain x nat x 3) if cart
+        =-----------------------------------------------------------------------
+        """
+        deform_mats = np.eye(3) + strain_tensors(strain, direction)
+        return deform_cells(
+            self._cell_parameters, deform_mats,
+            self._atomic_pos_cryst if cart else None
         )
-        inv_rotation_mat = np.linalg.inv(rotation_mat)
-        strain_rot_mat = np.matmul(strain_mat, rotation_mat)
-        strain_rot_mat = np.matmul(inv_rotation_mat, strain_rot_mat)
-        self.cell_parameters = np.matmul(
-            self._cell_parameters, np.transpose(strain_rot_mat)
+
+    def write_cells(
+        self, cells, atoms, directory=".", prefix="strain", fmt="xsf",
+        template=None
+    ):
+        """
+        =-----------------------------------------------------------------------
+        +   Write one file per cell of a stack of cells (nstrain x 3 x 3) 
+        +   with the atomic positions in crystal coordinates of this object
+        +   fmt = "xsf": prefix_0000.xsf, ... to visualize with VESTA
+        +   fmt = "qe": prefix_0000.in, ... complete pw.x inputs from the
+        +   template input (see write_qein)
+        +
+        +   return(list of the paths written)
+        =-----------------------------------------------------------------------
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        if fmt == "qe":
+            from write_qein import write_qein
+            writer = write_qein(template)
+            for i, cell in enumerate(cells):
+                path = os.path.join(directory, "{}_{:04d}.in".format(prefix, i))
+                writer.write_input(
+                    path, cell_parameters=cell,
+                    atomic_pos_cryst=self._atomic_pos_cryst, atoms=atoms
+                )
+                paths.append(path)
+            return(paths)
+        atomic_pos_cart = np.einsum(
+            "aj,njk->nak", self._atomic_pos_cryst, np.asarray(cells)
         )
+        row_format = "{}    %.15f  %.15f  %.15f\n"
+        pos_format = "".join(row_format.format(atom) for atom in atoms)
+        for i, cell in enumerate(cells):
+            path = os.path.join(directory, "{}_{:04d}.xsf".format(prefix, i))
+            with open(path, "w") as f:
+                f.write("CRYSTAL\nPRIMVEC\n")
+                f.write(("%.15f  %.15f  %.15f\n" * 3) % tuple(np.ravel(cell)))
+                f.write("PRIMCOORD\n{}  1\n".format(len(atoms)))
+                f.write(pos_format % tuple(atomic_pos_cart[i].ravel()))
+            paths.append(path)
+        return(paths)
 
     def gaussian(self, amp, std, peak, x):
         x = np.asarray(x)
@@ -209,49 +250,54 @@ class strain_and_deform_cell(object):
         +   matrix as R.
         +   Rotate matrix A by RA^T, then transform  the supercell, finally
         +   rotate back the transformed supercell R^{-1}RA^T.
+        +   i.e. the wrinkle is along (cos(theta), -sin(theta)) at a distance
+        +   peak_y from the origin. The original atomic positions are 
+        +   transformed, so the calls do not add up, see deform.
         =-----------------------------------------------------------------------
         """
-        theta = theta / 180.0 * np.pi # convert to radian from degree
-        rotation_mat = np.matrix(
-            [
-                [np.cos(theta), -np.sin(theta), 0], 
-                [np.sin(theta), np.cos(theta), 0],
-                [0, 0, 1]
-            ]
-        )
-        inv_rotation_mat = np.linalg.inv(rotation_mat)
-        atomic_pos_cart = self._atomic_pos_cart
-        atomic_pos_cart = np.matmul(atomic_pos_cart, np.transpose(rotation_mat))
-        atomic_pos_cart[:, 2] += self.gaussian(
-            amp, std, peak[1], atomic_pos_cart[:, 1]
-        )
-        atomic_pos_cart = np.matmul(
-            atomic_pos_cart, np.transpose(inv_rotation_mat)
-        )
-        self.atomic_pos_cryst = np.matmul(
-            atomic_pos_cart, self._inv_cell_parameters
+        theta_rad = theta / 180.0 * np.pi # convert to radian from degree
+        peak = peak[1] * np.array([np.sin(theta_rad), np.cos(theta_rad)])
+        self.atomic_pos_cryst = self.deform(
+            wrinkles=[[amp, std, peak[0], peak[1], theta]]
         )
         return self.atomic_pos_cryst
     
     def gaussian_bump(self, amp=1.0, std=1.0, peak=[0, 0]):
         """
         =-----------------------------------------------------------------------
-        +   Transform the 2D supercell by creating a gaussian-shaped wrinkle
-        +   along x-axis
-        +   z += gaussian(amp, std, peak_y, y)
+        +   Transform the 2D supercell by creating a gaussian-shaped bump
+        +   z += gaussian(amp, std, peak_x, x) * gaussian(amp, std, peak_y, y)
+        +   / amp
+        +   The original atomic positions are transformed, so the calls do 
+        +   not add up, see deform.
         =-----------------------------------------------------------------------
         """
-        atomic_pos_cart = self._atomic_pos_cart
-        atomic_pos_cart[:, 2] += (
-            self.gaussian(amp, std, peak[0], atomic_pos_cart[:, 0]) 
-            * self.gaussian(amp, std, peak[1], atomic_pos_cart[:, 1])
-            / amp
-        )
-        self.atomic_pos_cryst = np.matmul(
-            atomic_pos_cart, self._inv_cell_parameters
+        self.atomic_pos_cryst = self.deform(
+            bumps=[[amp, std, peak[0], peak[1]]]
         )
         return(self.atomic_pos_cryst)
 
+    def deform(self, wrinkles=None, bumps=None, cart=False):
+        """
+        =-----------------------------------------------------------------------
+        +   Displace the original atoms along z by the sum of any number of
+        +   gaussian wrinkles and bumps, see gaussian_field
+        +   With leading dimensions of wrinkles and bumps (a sweep of 
+        +   parameters), a stack of structures is returned.
+        +
+        +   return(atomic_pos_cryst) (... x nat x 3)
+        +   or return(atomic_pos_cart) if cart
+        =-----------------------------------------------------------------------
+        """
+        dz = gaussian_field(self._atomic_pos_cart[:, :2], wrinkles, bumps)
+        atomic_pos_cart = np.repeat(
+            self._atomic_pos_cart[None], int(np.prod(dz.shape[:-1])), axis=0
+        ).reshape(dz.shape + (3,))
+        atomic_pos_cart[..., 2] += dz
+        if cart:
+            return(atomic_pos_cart)
+        return(np.matmul(atomic_pos_cart, self._inv_cell_parameters))
+
     # def parameterize_plane(
     #     self, xy: np.ndarray, 
     #     amp: float, std: float, peak: tuple,
@@ -278,6 +324,173 @@ class strain_and_deform_cell(object):
     # def actual_curvature(self, )
     
 
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
+
+def voigt_to_tensor(voigt):
+    """
+    =---------------------------------------------------------------------------
+    +   Strain tensors (n x 3 x 3) of strains in Voigt notation (n x 6),
+    +   [xx, yy, zz, yz, xz, xy] with the engineering shear strains
+    +   (e_4 = 2e_yz, e_5 = 2e_xz, e_6 = 2e_xy)
+    =---------------------------------------------------------------------------
+    """
+    voigt = np.asarray(voigt, dtype=float)
+    tensors = np.empty(voigt.shape[:-1] + (3, 3))
+    tensors[..., [0, 1, 2], [0, 1, 2]] = voigt[..., :3]
+    tensors[..., 1, 2] = tensors[..., 2, 1] = voigt[..., 3] / 2
+    tensors[..., 0, 2] = tensors[..., 2, 0] = voigt[..., 4] / 2
+    tensors[..., 0, 1] = tensors[..., 1, 0] = voigt[..., 5] / 2
+    return(tensors)
+
+
+def voigt_strain_set(magnitudes, components=(0, 1, 2, 3, 4, 5)):
+    """
+    =---------------------------------------------------------------------------
+    +   Strains in Voigt notation for elastic constants: each component of 
+    +   components strained by each magnitude, the others being 0
+    +   The rows are ordered by component, then by magnitude.
+    +
+    +   return(voigt) (len(components)*len(magnitudes) x 6)
+    =---------------------------------------------------------------------------
+    """
+    magnitudes = np.asarray(magnitudes, dtype=float)
+    components = np.asarray(components)
+    voigt = np.zeros((len(components), len(magnitudes), 6))
+    voigt[np.arange(len(components)), :, components] = magnitudes
+    return(voigt.reshape(-1, 6))
+
+
+def strain_tensors(strain, direction=None):
+    """
+    =---------------------------------------------------------------------------
+    +   Strain tensors (nstrain x 3 x 3) of a sweep of strains
+    +   strain:
+    +   nstrain numbers (magnitudes, see direction)
+    +   nstrain x 3 (strains along x, y, z)
+    +   nstrain x 6 (Voigt notation, see voigt_to_tensor)
+    +   nstrain x 3 x 3 (strain tensors)
+    +   direction (only for magnitudes):
+    +   None (isotropic strain)
+    +   3 numbers (uniaxial strain along this direction, normalized)
+    +   3 x 3 (strain tensor of unit magnitude, e.g. diag(1, 1, 0) for a 
+    +   biaxial strain in the xy plane)
+    =---------------------------------------------------------------------------
+    """
+    strain = np.asarray(strain, dtype=float)
+    if strain.ndim == 1:
+        if direction is None:
+            unit = np.eye(3)
+        else:
+            direction = np.asarray(direction, dtype=float)
+            if direction.shape == (3,):
+                direction = direction / np.linalg.norm(direction)
+                unit = np.outer(direction, direction)
+            else:
+                unit = direction.reshape(3, 3)
+        return(strain[:, None, None] * unit)
+    if strain.shape[1:] == (3,):
+        return(np.einsum("ni,ij->nij", strain, np.eye(3)))
+    if strain.shape[1:] == (6,):
+        return(voigt_to_tensor(strain))
+    if strain.shape[1:] == (3, 3):
+        return(strain)
+    raise ValueError(
+        "Strains of shape {} are not supported, use (n), (n, 3), (n, 6) or "
+        "(n, 3, 3)".format(strain.shape)
+    )
+
+
+def rotation_matrices(alpha=0, beta=0, gamma=0):
+    """
+    =---------------------------------------------------------------------------
+    +   Rotation matrices R = R_z(gamma)R_y(beta)R_x(alpha) (n x 3 x 3) of 
+    +   angles in degree (numbers or arrays of the same length n)
+    =---------------------------------------------------------------------------
+    """
+    # rotation_matrix.euler_matrices takes the angle about z first
+    return(euler_matrices(gamma, beta, alpha))
+
+
+def deform_cells(cell_parameters, deform_mats, atomic_pos_cryst=None):
+    """
+    =---------------------------------------------------------------------------
+    +   Cells C_n = C(F_n)^T of the deformation (or rotation) matrices F_n
+    +   (n x 3 x 3) in one einsum, and the atomic positions in angstrom
+    +   A_n = AC_n if atomic_pos_cryst is given
+    +
+    +   return(cells) or return(cells, atomic_pos_cart)
+    =---------------------------------------------------------------------------
+    """
+    cells = np.einsum("ij,nkj->nik", cell_parameters, deform_mats)
+    if atomic_pos_cryst is None:
+        return(cells)
+    atomic_pos_cart = np.einsum("aj,njk->nak", atomic_pos_cryst, cells)
+    return(cells, atomic_pos_cart)
+
+
+def gaussian_field(xy, wrinkles=None, bumps=None, chunk_size=2**22):
+    """
+    =---------------------------------------------------------------------------
+    +   Displacement along z (... x nat) at the in-plane positions xy (nat x 2)
+    +   of a sum of gaussian wrinkles and bumps, broadcast over the features,
+    +   the atoms and the sweep
+    +   wrinkles (... x nwrinkle x 5): amp, std, peak_x, peak_y, theta, 
+    +   a ridge through (peak_x, peak_y) along (cos(theta), -sin(theta)),
+    +   theta in degree
+    +   amp * exp(-1/2 * d^2 / std^2), d the distance to the ridge
+    +   bumps (... x nbump x 4): amp, std, peak_x, peak_y
+    +   amp * exp(-1/2 * r^2 / std^2), r the distance to the peak
+    +   The leading dimensions (e.g. a sweep of parameters) of wrinkles and 
+    +   bumps are broadcast together.
+    +   chunk_size (largest number of elements of the temporaries
+    +   (... x nfeature x nat), the atoms are taken by chunks to keep it)
+    =---------------------------------------------------------------------------
+    """
+    xy = np.asarray(xy, dtype=float)
+    features = []
+    if wrinkles is not None:
+        wrinkles = np.asarray(wrinkles, dtype=float)
+        features.append(wrinkles)
+    if bumps is not None:
+        bumps = np.asarray(bumps, dtype=float)
+        features.append(bumps)
+    # elements of the temporaries for each atom
+    size = max([f.size // f.shape[-1] for f in features] + [1])
+    step = max(chunk_size // size, 1)
+    return(
+        np.concatenate(
+            [
+                _gaussian_sum(xy[i:i+step], wrinkles, bumps)
+                for i in range(0, max(xy.shape[0], 1), step)
+            ], axis=-1
+        )
+    )
+
+
+def _gaussian_sum(xy, wrinkles, bumps):
+    # all features at once, (... x nfeature x nat) summed over the features
+    x, y = xy[:, 0], xy[:, 1]
+    dz = np.zeros(xy.shape[0])
+    if wrinkles is not None:
+        amp, std, peak_x, peak_y, theta = np.moveaxis(
+            wrinkles[..., None], -2, 0
+        )
+        theta = theta / 180.0 * np.pi
+        distance = (x - peak_x) * np.sin(theta) + (y - peak_y) * np.cos(theta)
+        dz = dz + np.sum(amp * np.exp(-0.5 / std**2 * distance**2), axis=-2)
+    if bumps is not None:
+        amp, std, peak_x, peak_y = np.moveaxis(bumps[..., None], -2, 0)
+        distance2 = (x - peak_x)**2 + (y - peak_y)**2
+        dz = dz + np.sum(amp * np.exp(-0.5 / std**2 * distance2), axis=-2)
+    return(dz)
+
+
 if __name__ == "__main__":
     cwd = os.getcwd()
     if sys.argv[1].endswith("out"):
@@ -286,7 +499,7 @@ if __name__ == "__main__":
             cell_parameters=qe.cell_parameters, 
             atomic_pos_cryst=qe.atomic_pos_cryst
         )
-        sdc.rotate(theta=float(sys.argv[2]))
+        sdc.rotate(gamma=float(sys.argv[2]))
         cellpara = sdc.cell_parameters
     elif sys.argv[1].endswith("in"):
         qe = qe_in(os.path.join(cwd, sys.argv[1]))
@@ -294,7 +507,7 @@ if __name__ == "__main__":
             cell_parameters=qe.cell_parameters, 
             atomic_pos_cryst=qe.atomic_pos_cryst
         )
-        sdc.rotate(theta=float(sys.argv[2]))
+        sdc.rotate(gamma=float(sys.argv[2]))
         cellpara = sdc.cell_parameters
     print(cellpara)
 
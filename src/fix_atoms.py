@@ -3,9 +3,9 @@ import numpy as np
 import sys
 import os
 import argparse
+import itertools
 from read_qein import qe_in
 from read_qeout import qe_out
-from constraint_atoms import cstr_atoms
 
 
 
@@ -20,11 +20,12 @@ def write_xsf(
     +   type(input): <class 'numpy.ndarray'>
     +   cell_parameters (cell parameters in cartesian coordinates, angstrom)
     +   atoms (atomic species associated with each atomic position)
-    +   atoms_atomic_pos_if_pos (atomic positions with constrain in x, y or z)
+    +   atoms_atomic_pos_if_pos (atomic positions with constrain in x, y or z,
+    +   or a list of these rows already formatted, e.g. by fix_atoms_batch)
     =---------------------------------------------------------------------------
     """
     # write a file that for QE input
-    nat = atoms_atomic_pos_if_pos.shape[0]
+    nat = len(atoms_atomic_pos_if_pos)
     path = os.path.join(os.getcwd(), outfile)
     outfile = open(path, "w")
     outfile = open(path, "a")
@@ -32,7 +33,10 @@ def write_xsf(
     outfile.write("CELL_PARAMETERS angstrom\n")
     np.savetxt(outfile, cell_parameters, "%.10f")
     outfile.write("ATOMIC_POSITIONS crystal\n")
-    np.savetxt(outfile, atoms_atomic_pos_if_pos, "%s")
+    if isinstance(atoms_atomic_pos_if_pos, list):
+        outfile.writelines(atoms_atomic_pos_if_pos)
+    else:
+        np.savetxt(outfile, atoms_atomic_pos_if_pos, "%s")
     outfile.close()
 
 
@@ -45,13 +49,19 @@ def write_xsf_for_vis(cell_parameters, atoms, atomic_pos, outfile="vis.xsf"):
     +   type(input): <class 'numpy.ndarray'>
     +   cell_parameters (cell parameters in cartesian coordinates, angstrom)
     +   atoms (atomic species associated with each atomic position)
-    +   atomic_pos (atomic positions)
+    +   atomic_pos (atomic positions in crystal coordinates, or a list of the
+    +   cartesian positions already formatted, e.g. by fix_atoms_batch)
     =---------------------------------------------------------------------------
     """
     # write a file that can be open by vesta
-    ap_cart_coord = np.matmul(atomic_pos, cell_parameters)
-    atoms_ap_cart_coord = np.column_stack((atoms, ap_cart_coord))
-    nat = atoms.shape[0]
+    if isinstance(atomic_pos, list):
+        atoms_ap_cart_coord = [
+            "{}{}".format(atom, row) for atom, row in zip(atoms, atomic_pos)
+        ]
+    else:
+        ap_cart_coord = np.matmul(atomic_pos, cell_parameters)
+        atoms_ap_cart_coord = np.column_stack((atoms, ap_cart_coord))
+    nat = len(atoms)
     path = os.path.join(os.getcwd(), outfile)
     outfile = open(path, "w")
     outfile = open(path, "a")
@@ -60,13 +70,109 @@ def write_xsf_for_vis(cell_parameters, atoms, atomic_pos, outfile="vis.xsf"):
     np.savetxt(outfile, cell_parameters, "%.10f")
     outfile.write("PRIMCOORD\n")
     outfile.write(str(nat) + "  1\n")
-    np.savetxt(outfile, atoms_ap_cart_coord, "%s")
+    if isinstance(atoms_ap_cart_coord, list):
+        outfile.writelines(atoms_ap_cart_coord)
+    else:
+        np.savetxt(outfile, atoms_ap_cart_coord, "%s")
     outfile.close()
 
 
+def free_atoms(cell_parameters, atomic_pos_cryst, centers, radii):
+    """
+    =---------------------------------------------------------------------------
+    +   Atoms free to move for each (center, radius), i.e. with any of their
+    +   27 periodic images in the sphere, as cstr_atoms.sphere
+    +
+    +   type(input): <class 'numpy.ndarray'>
+    +   cell_parameters (cell parameters in cartesian coordinates, angstrom)
+    +   atomic_pos_cryst (atomic positions in crystal coordinates)
+    +   centers (nspec x 3, angstrom)
+    +   radii (nspec, angstrom)
+    +
+    +   The distances to the images are computed once per distinct center.
+    +
+    +   return(is_free) (nspec x nat)
+    =---------------------------------------------------------------------------
+    """
+    cell_parameters = np.asarray(cell_parameters, dtype=float)
+    centers, radii = np.broadcast_arrays(
+        np.atleast_2d(np.asarray(centers, dtype=float)),
+        np.atleast_1d(np.asarray(radii, dtype=float))[:, None]
+    )
+    radii = radii[:, 0]
+    shifts = np.matmul(
+        np.array(list(itertools.product((-1, 0, 1), repeat=3))), cell_parameters
+    )
+    # atomic positions of the 27 images, 27 x nat x 3
+    images = np.matmul(atomic_pos_cryst, cell_parameters)[None] + shifts[:, None]
+    unique_centers, index = np.unique(centers, axis=0, return_inverse=True)
+    min_dist = np.empty((len(unique_centers), images.shape[1]))
+    for k, center in enumerate(unique_centers):
+        min_dist[k] = np.amin(np.linalg.norm(images - center, axis=2), axis=0)
+    return(min_dist[index.ravel()] < radii[:, None])
+
+
+def fix_atoms_batch(
+    atoms, cell_parameters, atomic_pos_cryst, specs, outdir=".",
+    numbered=True, verbosity=True
+):
+    """
+    =---------------------------------------------------------------------------
+    +   Constrain the atoms out of each sphere of specs and write, for spec k,
+    +   cstr_atoms_k.xsf (ATOMIC_POSITIONS with if_pos, as write_xsf) and
+    +   vis_k.xsf (fixed atoms shown as He, as write_xsf_for_vis) in outdir,
+    +   or cstr_atoms.xsf and vis.xsf if not numbered
+    +
+    +   specs (list of (center, radius), angstrom)
+    +
+    +   return(is_free) (nspec x nat)
+    =---------------------------------------------------------------------------
+    """
+    atoms = np.asarray(atoms)
+    cell_parameters = np.asarray(cell_parameters, dtype=float)
+    os.makedirs(outdir, exist_ok=True)
+    centers = [center for center, radius in specs]
+    radii = [radius for center, radius in specs]
+    is_free = free_atoms(cell_parameters, atomic_pos_cryst, centers, radii)
+
+    # the text of the positions is the same for all specs, format it once,
+    # only if_pos and the species shown change
+    pos_lines = [
+        "{} {:.10f} {:.10f} {:.10f}".format(atom, *pos)
+        for atom, pos in zip(
+            atoms.tolist(), np.asarray(atomic_pos_cryst).tolist()
+        )
+    ]
+    cart_lines = [
+        " {:.10f} {:.10f} {:.10f}\n".format(*pos)
+        for pos in np.matmul(atomic_pos_cryst, cell_parameters).tolist()
+    ]
+    for k, free in enumerate(is_free):
+        tag = "_{:03d}".format(k) if numbered else ""
+        write_xsf(
+            cell_parameters,
+            [
+                line + ("  1 1 1\n" if atom_free else "  0 0 0\n")
+                for line, atom_free in zip(pos_lines, free.tolist())
+            ],
+            outfile=os.path.join(outdir, "cstr_atoms{}.xsf".format(tag))
+        )
+        write_xsf_for_vis(
+            cell_parameters, np.where(free, atoms, "He"), cart_lines,
+            outfile=os.path.join(outdir, "vis{}.xsf".format(tag))
+        )
+        if verbosity:
+            print(
+                "{:4d}  center = {} A  r = {} A  {} free atoms".format(
+                    k, list(centers[k]), radii[k], np.count_nonzero(free)
+                )
+            )
+    return(is_free)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-    description="Rotate cell"
+    description="Fix the atoms out of a sphere around the defect center"
     )
     parser.add_argument(
         "center_x", type=float, nargs="?", default=0.0, 
@@ -84,45 +190,56 @@ if __name__ == "__main__":
         "radius", type=float, nargs="?", default=0.0, 
         help="radius of target scope (angstrom)"
     )
+    parser.add_argument(
+        "-i", "--input", type=str, default=None,
+        help="QE input or output (default: relax/scf .in/.out in this directory)"
+    )
+    parser.add_argument(
+        "--radii", type=float, nargs="+", default=None,
+        help="batch of radii around the center (angstrom)"
+    )
+    parser.add_argument(
+        "--specs", type=str, default=None,
+        help="batch file, one 'center_x center_y center_z radius' per line"
+    )
+    parser.add_argument(
+        "-o", "--outdir", type=str, default=".",
+        help="directory of the written files"
+    )
     args = parser.parse_args()
-    center_x = args.center_x
-    center_y = args.center_y
-    center_z = args.center_z
-    center = [center_x, center_y, center_z]
-    r = args.radius
+    center = [args.center_x, args.center_y, args.center_z]
     
     cwd = os.getcwd()
-    for f in os.listdir(cwd):
-        # print(f)
-        if f.startswith("relax.out") or f.startswith("scf.out"):
-            print("Read the geometry from qe ouput")
-            qe = qe_out(os.path.join(cwd, f))
-        elif f.startswith("relax.in") or f.startswith("scf.in"):
-            print("Read geometry from qe input")
-            qe = qe_in(os.path.join(cwd, f))
+    if args.input is not None:
+        if args.input.endswith(".out"):
+            qe = qe_out(os.path.join(cwd, args.input))
         else:
-            continue
+            qe = qe_in(os.path.join(cwd, args.input))
+    else:
+        for f in os.listdir(cwd):
+            # print(f)
+            if f.startswith("relax.out") or f.startswith("scf.out"):
+                print("Read the geometry from qe ouput")
+                qe = qe_out(os.path.join(cwd, f))
+            elif f.startswith("relax.in") or f.startswith("scf.in"):
+                print("Read geometry from qe input")
+                qe = qe_in(os.path.join(cwd, f))
+            else:
+                continue
 
+    if args.specs is not None:
+        table = np.atleast_2d(np.loadtxt(args.specs))
+        specs = [(row[:3], row[3]) for row in table]
+    elif args.radii is not None:
+        specs = [(center, r) for r in args.radii]
+    else:
+        specs = [(center, args.radius)]
 
-    # center = np.mean(po.ap_cart_coord[-3:, :], axis=0)
-    ca = cstr_atoms(
-        atoms=qe.atoms, 
-        cell_parameters=qe.cell_parameters, 
-        atomic_pos_cryst=qe.atomic_pos_cryst
-    )
-    ca.magic_cube()
-    ca.sphere(center=center, radius=r)
-    ca.cstr_atoms()
-
-    write_xsf(
-        cell_parameters=ca.cell_parameters, 
-        atoms_atomic_pos_if_pos=ca.atomic_pos_cryst_if_pos
+    fix_atoms_batch(
+        atoms=qe.atoms,
+        cell_parameters=qe.cell_parameters,
+        atomic_pos_cryst=qe.atomic_pos_cryst,
+        specs=specs,
+        outdir=args.outdir,
+        numbered=(args.specs is not None or args.radii is not None)
     )
-
-    write_xsf_for_vis(
-        cell_parameters=ca.cell_parameters, 
-        atoms=ca.fake_atoms, 
-        atomic_pos=ca.atomic_pos_cryst
-    )
-
-
@@ -3,13 +3,172 @@ import numpy as np
 import os
 import sys
 import matplotlib.pyplot as plt
-import scipy.constants as spc
 from read_qein import qe_in
-from read_qeout import qe_bands
+from read_qeout import qe_bands, read_avg, read_fermi, vacuum_level
 plt.style.use("/home/lkj/work/github/styles/bandstructure")
 
 
-def bands_vs_kpath(path_input=None, path_output=None):
+# cache of parsed k paths and bands, keyed by the paths of input and output
+_kpath_cache = {}
+
+
+def _file_stamp(path):
+    """
+    ++--------------------------------------------------------------------------
+    +   Identify the version of a file by its modification time and size
+    ++--------------------------------------------------------------------------
+    """
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def kpath_distances(kpts, division=None, labels=None, jump_tol=5.0):
+    """
+    ++--------------------------------------------------------------------------
+    +   Input:
+    +   kpts (k points along the path in cartesian coordinates, (nk x 3))
+    +   division (division of the k path in the input, optional)
+    +   labels (labels of the high symmetry k points, optional)
+    +   jump_tol (a step longer than jump_tol times the median step is a jump)
+    +
+    +   The distance along the k path is the cumulative sum of the norms of
+    +   the steps between neighboring k points. A step is a discontinuity of
+    +   the path (e.g. X|U) if the high symmetry k point has a division of 0
+    +   or 1 in the input, or if its label contains "|". Without divisions
+    +   consistent with the number of k points, a step is a discontinuity if
+    +   it is much longer than the median step. Discontinuities do not add to
+    +   the distance.
+    +
+    +   return(xcoords, segments)
+    +   xcoords (coordinates of k path in x axis)
+    +   segments (start and stop indexes of continuous segments, (nseg x 2))
+    ++--------------------------------------------------------------------------
+    """
+    kpts = np.asarray(kpts, dtype=float)
+    nk = kpts.shape[0]
+    steps = np.linalg.norm(np.diff(kpts, axis=0), axis=1)
+    is_jump = np.zeros(steps.shape[0], dtype=bool)
+
+    if division is not None and np.sum(division[:-1]) + 1 == nk:
+        # the divisions locate the high symmetry k points, only their breaks
+        # are discontinuities, however uneven the densities of the segments
+        division = np.asarray(division, dtype=int)
+        index_hsymmpts = np.concatenate(([0], np.cumsum(division[:-1])))
+        # a division of 1 goes straight to the next high symmetry k point
+        is_break = division[:-1] <= 1
+        if labels is not None:
+            is_break |= np.array(["|" in label for label in labels[:-1]])
+        index_breaks = index_hsymmpts[:-1][is_break]
+        is_jump[index_breaks[index_breaks < nk - 1]] = True
+    elif steps.shape[0] > 0 and np.any(steps > 0):
+        # no usable divisions, guess the jumps from the steps
+        median_step = np.median(steps[steps > 0])
+        is_jump |= steps > jump_tol * median_step
+
+    steps[is_jump] = 0
+    xcoords = np.concatenate(([0.0], np.cumsum(steps)))
+    edges = np.concatenate(([0], np.nonzero(is_jump)[0] + 1, [nk]))
+    segments = np.column_stack((edges[:-1], edges[1:]))
+    return(xcoords, segments)
+
+
+def index_of_hsymmpts(kpts_cryst, hsymmpts_cryst, division, decimals=4):
+    """
+    ++--------------------------------------------------------------------------
+    +   Find the indexes of the high symmetry k points in the k path
+    +
+    +   The indexes are obtained from division if it matches the number of k
+    +   points, otherwise the high symmetry k points are searched in order
+    +   among the k points of the output.
+    ++--------------------------------------------------------------------------
+    """
+    nk = kpts_cryst.shape[0]
+    division = np.asarray(division, dtype=int)
+    if np.sum(division[:-1]) + 1 == nk:
+        return np.concatenate(([0], np.cumsum(division[:-1])))
+
+    kpts = np.round(kpts_cryst, decimals)
+    hsymmpts = np.round(hsymmpts_cryst, decimals)
+    # is_match[i, j] is true if high symmetry point i is the k point j
+    is_match = np.all(hsymmpts[:, None, :] == kpts[None, :, :], axis=2)
+    indexes = np.zeros(hsymmpts.shape[0], dtype=int)
+    start = 0
+    for i in range(hsymmpts.shape[0]):
+        found = np.nonzero(is_match[i, start:])[0]
+        if found.shape[0] == 0:
+            raise ValueError(
+                "High symmetry k point {} is not found in the output"
+                .format(hsymmpts_cryst[i])
+            )
+        indexes[i] = start + found[0]
+        start = indexes[i]
+    return indexes
+
+
+def read_bands_kpath(path_input=None, path_output=None, disk_cache=False):
+    """
+    ++--------------------------------------------------------------------------
+    +   Input: path to Quantum Espresso pw.x input and output files
+    +   specifically, nscf_for_bands.in and nscf_for_bands.out
+    +   disk_cache (also save the result next to the output as *.kpath.npz)
+    +
+    +   The k path and eigenvalues are cached with the modification time and
+    +   size of both files, so that replots do not read the files again.
+    +
+    +   return a dictionary with
+    +   xcoords (coordinates of k path in x axis)
+    +   xcoords_of_hsymmpts (coordinates of special k points in x axis)
+    +   index_hsymmpts (indexes of special k points in the k path)
+    +   segments (start and stop indexes of continuous segments of k path)
+    +   eigenE (eigenvalues, (nk x nbnd) or (nk*2 x nbnd) if spin polarized)
+    +   nk (number of k points)
+    +   spinpol (boolean value)
+    ++--------------------------------------------------------------------------
+    """
+    key = (os.path.abspath(path_input), os.path.abspath(path_output))
+    stamp = _file_stamp(path_input) + _file_stamp(path_output)
+    if key in _kpath_cache and _kpath_cache[key][0] == stamp:
+        return _kpath_cache[key][1]
+
+    path_npz = path_output + ".kpath.npz"
+    if disk_cache and os.path.exists(path_npz):
+        npz = np.load(path_npz)
+        if tuple(npz["stamp"]) == stamp:
+            result = {name: npz[name] for name in npz.files if name != "stamp"}
+            result["nk"] = int(result["nk"])
+            result["spinpol"] = bool(result["spinpol"])
+            _kpath_cache[key] = (stamp, result)
+            return result
+
+    # read the input file to obtain high symmetry k points
+    bandsin = qe_in(path_input)
+    # read the output file to obtain k point path and bands
+    bandsout = qe_bands(path_output)
+    bandsout.read_eigenenergies()
+
+    index_hsymmpts = index_of_hsymmpts(
+        bandsout.kpts_cryst_coord, bandsin.hsymmpts_cryst, bandsin.division
+    )
+    xcoords, segments = kpath_distances(
+        bandsout.kpts_cart_coord, division=bandsin.division,
+        labels=bandsin.hsymmpts_labels
+    )
+    result = {
+        "xcoords": xcoords,
+        "xcoords_of_hsymmpts": xcoords[index_hsymmpts],
+        "index_hsymmpts": index_hsymmpts,
+        "segments": segments,
+        "eigenE": bandsout.eigenE,
+        "nk": bandsout.nk,
+        "spinpol": bandsout.spinpol,
+    }
+    _kpath_cache[key] = (stamp, result)
+    if disk_cache:
+        np.savez(path_npz, stamp=np.asarray(stamp), **result)
+    return result
+
+
+def bands_vs_kpath(path_input=None, path_output=None, disk_cache=False):
     """
     ++--------------------------------------------------------------------------
     +   Input: path to Quantum Espresso pw.x input and output files
@@ -30,48 +189,46 @@ def bands_vs_kpath(path_input=None, path_output=None):
     +   4. E_dn (spin down eigenvalues in all bands and at all k points)
     +   5. bandsout.spinpol (boolean value, True)
     ++--------------------------------------------------------------------------
+    +   The continuous segments of the k path are in
+    +   read_bands_kpath(path_input, path_output)["segments"]
+    ++--------------------------------------------------------------------------
     """
-    # read the input file to obtain high symmetry k points
-    bandsin = qe_in(path_input)
-    bandsin.read_kpts()
-    # read the output file to obtain k point path and bands
-    bandsout = qe_bands(path_output)
-    bandsout.read_eigenenergies()
+    kpath = read_bands_kpath(path_input, path_output, disk_cache=disk_cache)
+    xcoords = kpath["xcoords"]
+    xcoords_of_hsymmpts = kpath["xcoords_of_hsymmpts"]
+    nk = kpath["nk"]
 
-    # obtain all the k ponits and path from output
-    kpoints = bandsout.kpts_cart_coord
-    xcoords = np.zeros(bandsout.nk)
-    xcoords_of_hsymmpts = np.zeros(bandsin.num_hsymmpts)
-    for i in range(bandsout.nk):
-        if i+1 < bandsout.nk:
-            # linear algebra norm
-            xcoords[i+1] = np.linalg.norm(kpoints[i+1]-kpoints[i], ord=2) + \
-                xcoords[i]
-    
-    # obtain the high symmetry k points in the k path
-    division = bandsin.division
-    for i in range(bandsin.num_hsymmpts):
-        xcoords_of_hsymmpts[i] = xcoords[np.sum(division[:i])]
-    
     # return k point path, high symmetry k points and bands
-    if not bandsout.spinpol:
+    if not kpath["spinpol"]:
         # convert the shape of eigenvalues to (nbnd, nk) from (nk, nbnd)
-        E = np.transpose(bandsout.eigenE)
-        return(xcoords, xcoords_of_hsymmpts, E, bandsout.spinpol)
+        E = np.transpose(kpath["eigenE"])
+        return(xcoords, xcoords_of_hsymmpts, E, kpath["spinpol"])
     else:
-        E_up = np.transpose(bandsout.eigenE[:bandsout.nk, :])
-        E_dn = np.transpose(bandsout.eigenE[bandsout.nk:, :])
-        return(xcoords, xcoords_of_hsymmpts, E_up, E_dn, bandsout.spinpol)
+        E_up = np.transpose(kpath["eigenE"][:nk, :])
+        E_dn = np.transpose(kpath["eigenE"][nk:, :])
+        return(xcoords, xcoords_of_hsymmpts, E_up, E_dn, kpath["spinpol"])
 
 
 if __name__ == "__main__":
     path = "/home/lkj/work/copper_sulfur/0_scf_wsoc_pbe/job_bands"
     pathin = os.path.join(path, "nscf_for_bands.in")
     pathout = os.path.join(path, "nscf_for_bands.out")
-    # electrostatic potential (vacuum energy)
-    vac = 0*spc.physical_constants["Hartree energy in eV"][0]/2
-    # Fermi level
-    fermi = 12.2493
+    # scf output with the Fermi level and average.x output of the
+    # electrostatic potential of a slab, if there is one
+    pathscf = os.path.join(path, "scf.out")
+    pathavg = os.path.join(path, "avg.out")
+    # Fermi level (the highest occupied level without smearing)
+    fermi, homo = read_fermi(pathscf)[:2]
+    if np.isnan(fermi):
+        fermi = homo
+    # the bands are plotted relative to the vacuum level of a slab, or else
+    # to the Fermi level
+    eref = fermi
+    if os.path.isfile(pathavg):
+        z, planar, macroscopic = read_avg(pathavg)
+        eref = vacuum_level(
+            z, planar if macroscopic is None else macroscopic
+        )[0][0]
     x = bands_vs_kpath(path_input=pathin, path_output=pathout)
 
     fig, ax = plt.subplots(nrows=1, ncols=1, constrained_layout=True)
@@ -79,30 +236,31 @@ if __name__ == "__main__":
         for i in range(x[2].shape[0]):
             if i == 0:
                 ax.plot(
-                    x[0], x[2][i]-vac-fermi, color="tab:red", label="Spin Up"
+                    x[0], x[2][i]-eref, color="tab:red", label="Spin Up"
                 )
                 ax.plot(
-                    x[0], x[3][i]-vac-fermi, color="tab:blue", label="Spin Down"
+                    x[0], x[3][i]-eref, color="tab:blue", label="Spin Down"
                 )
             else:
-                ax.plot(x[0], x[2][i]-vac-fermi, color="tab:red")
-                ax.plot(x[0], x[3][i]-vac-fermi, color="tab:blue")
+                ax.plot(x[0], x[2][i]-eref, color="tab:red")
+                ax.plot(x[0], x[3][i]-eref, color="tab:blue")
         ax.legend()
     else: # spin unpolarized or soc
         for i in range(x[2].shape[0]):
-            if (x[2][i]-vac-fermi  <= 0).any():
-                ax.plot(x[0], x[2][i]-vac-fermi, color="tab:green")
+            if (x[2][i]-fermi <= 0).any():
+                ax.plot(x[0], x[2][i]-eref, color="tab:green")
             else:
-                ax.plot(x[0], x[2][i]-vac-fermi, color="tab:red")
+                ax.plot(x[0], x[2][i]-eref, color="tab:red")
 
     for i in range(len(x[1])):
         # add vertical lines for high symmetry k points
         ax.axvline(x[1][i], color="k", linewidth=0.8)
 
-    ax.axhline(0, linestyle="--", color="k", linewidth=0.8)
+    # Fermi level
+    ax.axhline(fermi-eref, linestyle="--", color="k", linewidth=0.8)
     ax.set_xlim(np.amin(x[0]), np.amax(x[0]))
-    # set the lower and upper limits of the plot
-    ax.set_ylim(-1.5, 2)
+    # set the lower and upper limits of the plot around the Fermi level
+    ax.set_ylim(fermi-eref-1.5, fermi-eref+2)
     # replace the numbers of high symmetry points with labels
     ax.set_xticks(x[1])
     # ax.set_xticklabels(
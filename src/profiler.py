@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import time
+import functools
+import contextlib
+
+
+"""
+++------------------------------------------------------------------------------
++   Opt-in instrumentation of the readers in read_qeout, read_qein and
++   read_xsf_xyz
++
++   Enabled by the keyword profile=True of the readers or by the environment
++   variable QE_POST_PROFILE (any value except "" and "0"). With
++   profile="log" or QE_POST_PROFILE=log a summary is also printed.
++
++   For each stage (a reader method or a part of a constructor) the stats are
++   {"calls", "wall" (s), "lines", "regex_calls", "bytes_converted",
++   "bytes_read"}
++   lines: lines of the file iterated or indexed (or stored by a read stage)
++   regex_calls: calls of re.search, re.findall, ... and of the compiled
++   patterns, made through counting(prof, re) or counting(prof, pattern)
++   bytes_converted: characters handed to those regex calls and to the bulk
++   conversions of text to numbers counted with count(bytes_converted=...)
++   bytes_read: size of the files read
++   Nested stages are inclusive. The parsers count through wrappers of their
++   own profiler and no module is patched, so readers may run in threads.
++   When disabled, a profiled method costs one attribute lookup and
++   counting() returns re or the pattern itself.
+++------------------------------------------------------------------------------
+"""
+
+# attributes of the readers which hold the lines of a file
+_LINE_ATTRS = ("lines", "dat_lines", "out_lines")
+_RE_FUNCTIONS = (
+    "search", "match", "fullmatch", "findall", "finditer", "split", "sub",
+    "subn"
+)
+
+
+class profiler(object):
+    """
+    ++--------------------------------------------------------------------------
+    +   Input: profile (True, False, "log" or None to follow QE_POST_PROFILE)
+    ++--------------------------------------------------------------------------
+    +   1. Constructor
+    +   Attributes:
+    +   self.enabled (is profiling on?)
+    +   self.log (print a summary?)
+    +   self.stats (dict of the stats of each stage)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   2. Method stage(self, name, obj=None)
+    +   context manager timing the code in the block as the stage name,
+    +   counting the lines of obj
+    +
+    +   return context manager
+    ++--------------------------------------------------------------------------
+    +   3. Method count(self, lines=0, bytes_read=0, regex_calls=0,
+    +   bytes_converted=0)
+    +   add counts which cannot be observed, e.g. lines of a streamed file or
+    +   text converted by np.fromstring
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   4. Method report(self, title="", file=None)
+    +   print the stats as a table
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    """
+    def __init__(self, profile=None):
+        env = os.environ.get("QE_POST_PROFILE", "")
+        if profile is None:
+            profile = env not in ("", "0")
+        self.enabled = bool(profile)
+        self.log = self.enabled and (profile == "log" or env.lower() == "log")
+        self.stats = {}
+        # running totals, each stage saves the difference
+        self.lines = 0
+        self.regex_calls = 0
+        self.bytes_converted = 0
+        self.bytes_read = 0
+
+    def stage(self, name, obj=None):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._stage(name, obj)
+
+    @contextlib.contextmanager
+    def _stage(self, name, obj):
+        wrapped = []
+        if obj is not None:
+            for attr in _LINE_ATTRS:
+                lines = obj.__dict__.get(attr)
+                if isinstance(lines, list):
+                    wrapper = _counted_lines(lines, self)
+                    setattr(obj, attr, wrapper)
+                    wrapped.append((attr, lines, wrapper))
+        start_counts = (
+            self.lines, self.regex_calls, self.bytes_converted, self.bytes_read
+        )
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            wall = time.perf_counter() - start
+            for attr, lines, wrapper in wrapped:
+                # the stage may have replaced the lines, keep the new ones
+                if obj.__dict__.get(attr) is wrapper:
+                    setattr(obj, attr, lines)
+            stats = self.stats.setdefault(
+                name, {
+                    "calls": 0, "wall": 0.0, "lines": 0, "regex_calls": 0,
+                    "bytes_converted": 0, "bytes_read": 0
+                }
+            )
+            stats["calls"] += 1
+            stats["wall"] += wall
+            stats["lines"] += self.lines - start_counts[0]
+            stats["regex_calls"] += self.regex_calls - start_counts[1]
+            stats["bytes_converted"] += self.bytes_converted - start_counts[2]
+            stats["bytes_read"] += self.bytes_read - start_counts[3]
+
+    def count(self, lines=0, bytes_read=0, regex_calls=0, bytes_converted=0):
+        if self.enabled:
+            self.lines += lines
+            self.bytes_read += bytes_read
+            self.regex_calls += regex_calls
+            self.bytes_converted += bytes_converted
+
+    def report(self, title="", file=None):
+        if file is None:
+            file = sys.stdout
+        print("----------------Profile {}----------------".format(title), file=file)
+        print(
+            "{:24s}{:>7s}{:>11s}{:>11s}{:>13s}{:>17s}{:>13s}".format(
+                "stage", "calls", "wall (s)", "lines", "regex calls",
+                "bytes converted", "bytes read"
+            ), file=file
+        )
+        for name, stats in self.stats.items():
+            print(
+                "{:24s}{:7d}{:11.4f}{:11d}{:13d}{:17d}{:13d}".format(
+                    name, stats["calls"], stats["wall"], stats["lines"],
+                    stats["regex_calls"], stats["bytes_converted"],
+                    stats["bytes_read"]
+                ), file=file
+            )
+
+
+def profiled(method):
+    """
+    ++--------------------------------------------------------------------------
+    +   Decorator of reader methods, the method is a stage of self._profiler
+    +   counting the lines of self
+    ++--------------------------------------------------------------------------
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        prof = self.__dict__.get("_profiler")
+        if prof is None or not prof.enabled:
+            return method(self, *args, **kwargs)
+        with prof.stage(method.__name__, self):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def counting(prof, obj):
+    """
+    ++--------------------------------------------------------------------------
+    +   obj (the module re or a compiled pattern) counting its calls in the
+    +   profiler prof, e.g. in a parser
+    +   regex = counting(prof, re)
+    +   number = counting(prof, _pattern_number)
+    +   obj itself if prof is None or disabled
+    ++--------------------------------------------------------------------------
+    """
+    if prof is None or not prof.enabled:
+        return obj
+    if obj is re:
+        return _counted_re(prof)
+    return _counted_pattern(obj, prof)
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
+
+class _counted_lines(object):
+    """
+    view of a list of lines counting the lines iterated or indexed
+    """
+    __slots__ = ("_lines", "_profiler")
+
+    def __init__(self, lines, prof):
+        self._lines = lines
+        self._profiler = prof
+
+    def __iter__(self):
+        prof = self._profiler
+        for line in self._lines:
+            prof.lines += 1
+            yield line
+
+    def __getitem__(self, index):
+        item = self._lines[index]
+        self._profiler.lines += len(item) if isinstance(index, slice) else 1
+        return item
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __getattr__(self, name):
+        return getattr(self._lines, name)
+
+
+def _counted(func, prof, string_index):
+    @functools.wraps(func)
+    def counted(*args, **kwargs):
+        prof.regex_calls += 1
+        if len(args) > string_index:
+            prof.bytes_converted += len(args[string_index])
+        elif "string" in kwargs:
+            prof.bytes_converted += len(kwargs["string"])
+        return func(*args, **kwargs)
+    return counted
+
+
+class _counted_re(object):
+    """
+    stand-in of the module re counting the regex calls in one profiler
+    """
+    __slots__ = ("_profiler",)
+
+    def __init__(self, prof):
+        self._profiler = prof
+
+    def __getattr__(self, name):
+        attr = getattr(re, name)
+        if name in _RE_FUNCTIONS:
+            return _counted(
+                attr, self._profiler, 2 if name in ("sub", "subn") else 1
+            )
+        if name == "compile":
+            prof = self._profiler
+            return lambda *args, **kwargs: _counted_pattern(
+                attr(*args, **kwargs), prof
+            )
+        return attr
+
+
+class _counted_pattern(object):
+    """
+    compiled pattern counting its calls in one profiler
+    """
+    __slots__ = ("_pattern", "_profiler")
+
+    def __init__(self, pattern, prof):
+        self._pattern = pattern
+        self._profiler = prof
+
+    def __getattr__(self, name):
+        attr = getattr(self._pattern, name)
+        if name in _RE_FUNCTIONS:
+            return _counted(
+                attr, self._profiler, 1 if name in ("sub", "subn") else 0
+            )
+        return attr
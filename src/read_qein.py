@@ -3,51 +3,104 @@ import sys
 import numpy as np
 import os
 import re
+from profiler import profiler, profiled, counting
+from species import encode, decode
 
 
 
+# physical constants
+Bohr = 5.29177210903e-11 # unit m
+Bohr2Ang = Bohr/1e-10
+
+# names of the cards of pw.x input
+CARDS = (
+    "ATOMIC_SPECIES", "ATOMIC_POSITIONS", "K_POINTS", "ADDITIONAL_K_POINTS",
+    "CELL_PARAMETERS", "CONSTRAINTS", "OCCUPATIONS", "ATOMIC_VELOCITIES",
+    "ATOMIC_FORCES", "SOLVENTS", "HUBBARD"
+)
+# key = value in a namelist, e.g. "nat = 2, celldm(1)=10.2, prefix='Si'"
+_pattern_assignment = re.compile(
+    r"([A-Za-z_]\w*(?:\(\s*\d+(?:\s*,\s*\d+)*\s*\))?)\s*=\s*"
+    r"('[^']*'|\"[^\"]*\"|[^,\s]+)"
+)
+# "&system ibrav = 0 /" gives ("system", "ibrav = 0 /")
+_pattern_namelist = re.compile(r"&(\w*)\s*(.*)")
+# "ATOMIC_POSITIONS {crystal}" gives ("ATOMIC_POSITIONS", " {crystal}"), with
+# or without spaces or tabs before the option
+_pattern_card = re.compile(r"([A-Za-z_]*)(.*)")
+_pattern_int = re.compile(r"[+-]?\d+$")
+_pattern_float = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([EeDd][+-]?\d+)?$")
+
+
 class qe_in(object):
     """
     ++--------------------------------------------------------------------------
     +   Input: path to Quantum Espresso pw.x input file
+    +   profile (True, "log" or None to follow QE_POST_PROFILE, see profiler.py)
     ++--------------------------------------------------------------------------
     +   1. Constructor
     +   Attributes
-    +   self.fname (specific directory to file)
-    +   self.dir (directory which containsfile)
-    +   self.qe_in (file that is read)
     +   self.lines (lines in the file)
     +   self.nat (number of atoms)
     +   self.ntyp (number of atomic types)
+    +   self.ibrav (Bravais-lattice index)
+    +   self.profile_stats (time, lines, regex calls and bytes of each method)
+    ++--------------------------------------------------------------------------
+    +   2. Method read_input(self)
+    +   self.namelists (dictionary of namelists, e.g. "system", each a
+    +   dictionary of lowercase keys, e.g. "celldm(1)", and converted values)
+    +   self.cards (dictionary of cards, e.g. "ATOMIC_POSITIONS", each a
+    +   dictionary with "option" and "lines")
+    +
+    +   No return
     ++--------------------------------------------------------------------------
-    +   2. Method read_cell_parameters(self)
+    +   3. Method read_cell_parameters(self)
+    +   self.celldm (celldm(1) to celldm(6), celldm(1) in bohr)
     +   self.cell_parameters (cell parameters in cartesian coordinates, angstrom)
-    +   self.ibrav (Bravais-lattice index, now only includes 0, 4, 8)
+    +   self.inv_cell_parameters (inverse of self.cell_parameters)
     +
     +   No return
     ++--------------------------------------------------------------------------
-    +   3. Method read_atomic_pos(self)
-    +   self.atoms (atomic name associated with each atomic position)
+    +   4. Method read_atomic_pos(self)
+    +   self.species (table of the atomic species, see species.py)
+    +   self.species_codes (code of the species of each atom, uint8)
+    +   self.atoms (read-only, species of each atom decoded from the codes)
     +   self.atomic_pos_cryst (atomic positions in fractional crystal coordinates)
     +   self.atomic_pos_cart (atomic positions in cartesian coordinates, angstrom)
+    +   self.if_pos (0 for the fixed components of the atomic positions, else 1)
+    +   self.atomic_mass (atomic mass associated with each atom, AMU)
+    +   self.atomic_species (atomic species with mass in ATOMIC_SPECIES)
+    +   self.pseudopotentials (pseudopotential file of each atomic species)
     +
     +   No return
     ++--------------------------------------------------------------------------
-    +   3. Method read_kpts(self)
-    +   self.kpts (k points sampling in automatic mode)
+    +   5. Method read_kpts(self)
+    +   self.kpts_option (automatic, gamma, tpiba, crystal, tpiba_b, crystal_b...)
+    +   self.kpts (k points sampling in automatic mode, mesh and shift)
+    +   self.kpts_list (k points and weights of a list of k points)
     +   self.num_hsymmpts (number of high symmetric k points)
-    +   self.hsymmpts_cryst (high symmetric k points in crystal coordinate)
+    +   self.hsymmpts_cryst (high symmetric k points in crystal coordinate,
+    +   converted from tpiba_b too)
+    +   self.hsymmpts_tpiba (high symmetric k points in 2pi/alat, tpiba_b)
     +   self.division (division in a k path)
+    +   self.hsymmpts_labels (comments after the high symmetric k points)
     +
     +   No return
     ++--------------------------------------------------------------------------
-    +   4. Method dict_atomic_mass(self, element=None)
+    +   6. Method read_occupations_hubbard(self)
+    +   self.occupations (occupations of the OCCUPATIONS card)
+    +   self.hubbard_option (projector of the HUBBARD card)
+    +   self.hubbard (list of (parameter, label, values) in the HUBBARD card)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   7. Method dict_atomic_mass(self, element=None)
     +   self.dict_Atomic_mass (the dictionary of atomic mass of all common elements)
     +
     +   return mass
     ++--------------------------------------------------------------------------
     """
-    def __init__(self, path):
+    def __init__(self, path, profile=None):
         is_qe_input = False
         if os.path.exists(path):
             if path.endswith(".in"):
@@ -59,117 +112,129 @@ class qe_in(object):
         if not is_qe_input:
             raise IOError("Fail to open {}".format("QE input file"))
 
-        self.lines = qe_input.readlines()
-        for i, line in enumerate(self.lines):
-            if "ibrav" in line:
-                self.ibrav = int(re.findall(r"[+-]?\d+", line)[0])
-            if "nat" in line:
-                self.nat = int(re.findall(r"[+-]?\d+", line)[0])
-            elif "ntyp" in line:
-                self.ntyp = int(re.findall(r"[+-]?\d+", line)[0])
+        self._profiler = profiler(profile)
+        self.profile_stats = self._profiler.stats
+        with self._profiler.stage("read_file"):
+            self.lines = qe_input.readlines()
+            self._profiler.count(
+                lines=len(self.lines), bytes_read=os.path.getsize(qe_input.name)
+            )
 
         # call dynamic methods
+        self.read_input()
+        system = self.namelists.get("system", {})
+        self.ibrav = system.get("ibrav")
+        self.nat = system.get("nat")
+        self.ntyp = system.get("ntyp")
         self.read_cell_parameters()
         self.read_atomic_pos()
         self.read_kpts()
+        self.read_occupations_hubbard()
+        if self._profiler.log:
+            self._profiler.report(path)
 
-    def read_cell_parameters(self):
-        self.cell_parameters = np.zeros((3, 3))
+    @profiled
+    def read_input(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method splits the input into namelists and cards in one pass
+        +
+        +   &SYSTEM
+        +     ibrav = 0, nat = 2 ! comment
+        +   /
+        +   ATOMIC_POSITIONS {crystal}
+        +   Si 0.00 0.00 0.00
+        +
+        +   The keys of the namelists are lowercase, the values are converted
+        +   to bool, int, float or str. The lines of a card are kept without
+        +   empty lines and comment lines and converted by the methods below.
+        ++----------------------------------------------------------------------
+        """
+        regex = counting(self._profiler, re)
+        pattern_namelist = counting(self._profiler, _pattern_namelist)
+        pattern_assignment = counting(self._profiler, _pattern_assignment)
+        pattern_card = counting(self._profiler, _pattern_card)
+        self.namelists = {}
+        self.cards = {}
+        namelist = None
+        card = None
+        for line in self.lines:
+            text = _strip_comment(line).strip()
+            if not text:
+                continue
+            if namelist is None and text.startswith("&"):
+                name, text = pattern_namelist.match(text).groups()
+                namelist = self.namelists.setdefault(name.lower(), {})
+                card = None
+                # assignments and "/" on the same line, e.g. "&ions /"
+                if not text:
+                    continue
+            if namelist is not None:
+                if text == "/" or text.lower() == "&end":
+                    namelist = None
+                    continue
+                closed = text.endswith("/")
+                if closed:
+                    text = text[:-1]
+                for key, value in pattern_assignment.findall(text):
+                    key = regex.sub(r"\s+", "", key.lower())
+                    namelist[key] = _namelist_value(value)
+                if closed:
+                    namelist = None
+            elif pattern_card.match(text).group(1).upper() in CARDS:
+                name, option = pattern_card.match(text).groups()
+                card = self.cards[name.upper()] = {
+                    "option": option.strip(" \t{}()").lower(), "lines": []
+                }
+            elif card is not None:
+                card["lines"].append(line.strip())
 
-        # physical constants
-        Bohr = 5.29177210903e-11 # unit m
-        Bohr2Ang = Bohr/1e-10
+    @profiled
+    def read_cell_parameters(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method generates the cell parameters for any ibrav from
+        +   celldm or A, B, C, cosAB, cosAC, cosBC, or reads CELL_PARAMETERS
+        +   if ibrav = 0
+        ++----------------------------------------------------------------------
+        """
+        system = self.namelists.get("system", {})
+        if "a" in system:
+            self.celldm = abc_to_celldm(
+                self.ibrav, system["a"], system.get("b", 0.0),
+                system.get("c", 0.0), system.get("cosab", 0.0),
+                system.get("cosac", 0.0), system.get("cosbc", 0.0)
+            )
+        else:
+            self.celldm = np.array(
+                [system.get("celldm({})".format(i), 0.0) for i in range(1, 7)]
+            )
 
         if self.ibrav == 0: # crystal system is any
-            for i, line in enumerate(self.lines):
-                if "CELL_PARAMETERS" in line:
-                    for j in range(3):
-                        self.cell_parameters[j, :] = re.findall(
-                            r"[+-]?\d+\.\d*", self.lines[i+1+j]
-                        )
-                else:
-                    pass
-        elif self.ibrav == 1: # crystal system is cubic
-            for i, line in enumerate(self.lines):
-                if "celldm(1)" in line:
-                    celldm1 = float(re.findall(r"\d+\.\d*|\d+", line)[1])
-                    a = celldm1 * Bohr2Ang
-                elif (
-                    re.match("a", line.strip()) 
-                    and not re.search(r"[b-zB-Z]", line.strip())
-                ):
-                    a = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
-
-            self.cell_parameters[0, 0] = a
-            self.cell_parameters[1, 1] = a
-            self.cell_parameters[2, 2] = a
-        elif self.ibrav == 4: # crystal system is hexagonal or trigonal
-            # the part of code assumes that celldm(1) shows up before celldm(3)
-            # and assume that a shows up before c
-            for i, line in enumerate(self.lines):
-                if "celldm(1)" in line:
-                    celldm1 = float(re.findall(r"\d+\.\d*|\d+", line)[1])
-                    a = celldm1 * Bohr2Ang
-                elif "celldm(3)" in line:
-                    celldm3 = float(re.findall(r"\d+\.\d*|\d+", line)[1])
-                    c = a * celldm3
-                elif (
-                    re.match("a", line.strip()) 
-                    and not re.search(r"[b-zB-Z]", line.strip())
-                ):
-                    a = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
-                elif (
-                    re.match("c", line.strip()) 
-                    and not re.search(r"[a-bA-Bd-zD-Z]", line.strip())
-                ):
-                    c = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
-
-            self.cell_parameters[0, 0] = a
-            self.cell_parameters[1, 0] = -a * np.sin(np.pi/6)
-            self.cell_parameters[1, 1] = a * np.cos(np.pi/6)
-            self.cell_parameters[2, 2] = c
-
-        elif self.ibrav == 8: # crystal system is orthorhombic
-            # the part of code assumes that celldm(1) appears before celldm(2) 
-            # and celldm(3) in different lines,
-            # and assume that a shows up before b and c in different lines
-            for i, line in enumerate(self.lines):
-                if "celldm(1)" in line:
-                    celldm1 = float(re.findall(r"\d+\.\d*|\d+", line)[1])
-                    a = celldm1 * Bohr2Ang
-                elif "celldm(2)" in line:
-                    celldm2 = float(re.findall(r"\d+\.\d*|\d+", line)[1])
-                    b = a * celldm2
-                elif "celldm(3)" in line:
-                    celldm3 = float(re.findall(r"\d+\.\d*|\d+", line)[1])
-                    c = a * celldm3
-                elif (
-                    re.match("a", line.strip()) 
-                    and not re.search(r"[b-zB-Z]", line.strip())
-                ):
-                    a = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
-                elif (
-                    re.match("b", line.strip()) 
-                    and not re.search(r"[aAc-zC-Z]", line.strip())
-                ):
-                    b = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
-                elif (
-                    re.match("c", line.strip()) 
-                    and not re.search(r"[a-bA-Bd-zD-Z]", line.strip())
-                ):
-                    c = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
-
-            self.cell_parameters[0, 0] = a
-            self.cell_parameters[1, 1] = b
-            self.cell_parameters[2, 2] = c
-            
+            card = self.cards["CELL_PARAMETERS"]
+            cell = _to_float_array(
+                [l.split()[:3] for l in card["lines"][:3]], self._profiler
+            )
+            if card["option"] == "angstrom":
+                self.cell_parameters = cell
+            elif card["option"] == "alat" or (
+                card["option"] == "" and self.celldm[0] != 0
+            ):
+                self.cell_parameters = cell * self.celldm[0] * Bohr2Ang
+            else: # bohr, the default without celldm(1)
+                self.cell_parameters = cell * Bohr2Ang
+        else:
+            self.cell_parameters = ibrav_to_cell(self.ibrav, self.celldm)
+
         self.inv_cell_parameters = np.linalg.inv(self.cell_parameters)
 
 
+    @profiled
     def read_atomic_pos(self):
         """
         ++----------------------------------------------------------------------
-        +   This method reads the input atomic positions
+        +   This method reads the input atomic positions in any unit (alat,
+        +   bohr, angstrom or crystal) and the components to be fixed
         +   ____                           ____
         +   |                                 |
         +   :        atomic positions         :
@@ -177,60 +242,146 @@ class qe_in(object):
         +
         ++----------------------------------------------------------------------
         """
-        self.atoms = np.zeros(self.nat, dtype="U4")
-        self.atomic_pos_cryst = np.zeros((self.nat, 3))
-        self.atomic_pos_cart = np.zeros((self.nat, 3))
-        is_cryst_coord = True
-        
-        for i, line in enumerate(self.lines):
-            if "ATOMIC_POSITIONS" in line and "crystal" in line:
-                for j in range(self.nat):
-                    self.atoms[j] = self.lines[i+1+j].strip().split()[0]
-                    self.atomic_pos_cryst[j, :] = re.findall(
-                        r"[+-]?\d+\.\d*", self.lines[i+1+j]
-                    )
-            elif "ATOMIC_POSITIONS" in line and "angstrom" in line:
-                is_cryst_coord = False
-                for j in range(self.nat):
-                    self.atoms[j] = self.lines[i+1+j].strip().split()[0]
-                    self.atomic_pos_cart[j, :] = re.findall(
-                        r"[+-]?\d+\.\d*", self.lines[i+1+j]
-                    )
-        if is_cryst_coord:
+        self.atomic_species = {}
+        self.pseudopotentials = {}
+        for line in self.cards.get("ATOMIC_SPECIES", {"lines": []})["lines"]:
+            temp = _strip_comment(line, "!#").split()
+            self.atomic_species[temp[0]] = float(
+                _to_float_array(temp[1], self._profiler)
+            )
+            self.pseudopotentials[temp[0]] = temp[2]
+
+        card = self.cards["ATOMIC_POSITIONS"]
+        temp = [
+            _strip_comment(line, "!#").split()
+            for line in card["lines"][:self.nat]
+        ]
+        # species codes, the masses are looked up once per species
+        self.species, self.species_codes = encode([t[0] for t in temp])
+        self.atomic_mass = np.array(
+            [self.dict_atomic_mass(s) for s in self.species], dtype=float
+        )[self.species_codes]
+        atomic_pos = _to_float_array([t[1:4] for t in temp], self._profiler)
+        self.if_pos = np.ones((self.nat, 3), dtype=int)
+        for i, t in enumerate(temp):
+            if len(t) >= 7:
+                self.if_pos[i] = np.asarray(t[4:7], dtype=int)
+
+        option = card["option"]
+        if option == "crystal":
+            self.atomic_pos_cryst = atomic_pos
             self.atomic_pos_cart = np.matmul(
                 self.atomic_pos_cryst, self.cell_parameters
             )
         else:
-            inv_cell_parameters = np.linalg.inv(self.cell_parameters)
+            if option == "angstrom":
+                self.atomic_pos_cart = atomic_pos
+            elif option == "bohr":
+                self.atomic_pos_cart = atomic_pos * Bohr2Ang
+            elif option in ("alat", ""):
+                # alat is the length of the first lattice vector
+                alat = np.linalg.norm(self.cell_parameters[0])
+                if self.celldm[0] != 0:
+                    alat = self.celldm[0] * Bohr2Ang
+                self.atomic_pos_cart = atomic_pos * alat
+            else:
+                raise ValueError(
+                    "ATOMIC_POSITIONS {} is not supported".format(option)
+                )
             self.atomic_pos_cryst = np.matmul(
-                self.atomic_pos_cart, inv_cell_parameters
+                self.atomic_pos_cart, self.inv_cell_parameters
             )
 
-        self.atomic_mass = np.zeros(self.nat)
-        for i in range(self.nat):
-            self.atomic_mass[i] = self.dict_atomic_mass(self.atoms[i])
+    @property
+    def atoms(self):
+        """
+        ++----------------------------------------------------------------------
+        +   Atomic species of each atom (U4), decoded from self.species_codes
+        +   when asked for
+        ++----------------------------------------------------------------------
+        """
+        return decode(self.species, self.species_codes)
 
-    
+    @profiled
     def read_kpts(self):
         """
         ++----------------------------------------------------------------------
         +   This method reads the k points sampling
         ++----------------------------------------------------------------------
         """
-        for i, line in enumerate(self.lines):
-            if "K_POINTS" and "automatic" in line:
-                self.kpts = np.asarray(self.lines[i+1].strip().split(), int)
-            elif "K_POINTS" and "crystal_b" in line:
-                self.num_hsymmpts = int(self.lines[i+1].strip().split()[0])
-                self.hsymmpts_cryst = np.zeros((self.num_hsymmpts, 3))
-                self.division = np.zeros(self.num_hsymmpts, int)
-                for j in range(self.num_hsymmpts):
-                    self.hsymmpts_cryst[j] = re.findall(
-                        r"[+-]?\d+\.\d*|[+-]?\d+", self.lines[i+2+j]
-                    )[0:3]
-                    self.division[j] = re.findall(
-                        r"[+-]?\d+\.\d*|[+-]?\d+", self.lines[i+2+j]
-                    )[3]
+        regex = counting(self._profiler, re)
+        card = self.cards.get("K_POINTS", {"option": "tpiba", "lines": []})
+        self.kpts_option = card["option"] if card["option"] else "tpiba"
+        if self.kpts_option == "automatic":
+            self.kpts = np.asarray(card["lines"][0].split()[:6], int)
+        elif self.kpts_option == "gamma":
+            self.kpts = np.array([1, 1, 1, 0, 0, 0])
+        elif self.kpts_option.endswith("_b"):
+            self.num_hsymmpts = int(card["lines"][0].split()[0])
+            self.hsymmpts_labels = []
+            temp = []
+            for line in card["lines"][1:self.num_hsymmpts+1]:
+                # labels such as "! X|U" may follow the k point
+                parts = regex.split(r"[!#]", line, maxsplit=1)
+                temp.append(parts[0].split()[:4])
+                if len(parts) > 1:
+                    self.hsymmpts_labels.append(parts[1].strip())
+                else:
+                    self.hsymmpts_labels.append("")
+            temp = _to_float_array(temp, self._profiler)
+            self.division = temp[:, 3].astype(int)
+            if self.kpts_option == "crystal_b":
+                self.hsymmpts_cryst = temp[:, :3]
+            else:
+                self.hsymmpts_tpiba = temp[:, :3]
+                # k_cryst_i = k . a_i / alat with k in units of 2pi/alat
+                alat = np.linalg.norm(self.cell_parameters[0])
+                if self.celldm[0] != 0:
+                    alat = self.celldm[0] * Bohr2Ang
+                self.hsymmpts_cryst = np.matmul(
+                    self.hsymmpts_tpiba, self.cell_parameters.T
+                ) / alat
+        else: # tpiba, crystal, tpiba_c
+            nks = int(card["lines"][0].split()[0])
+            self.kpts_list = _to_float_array(
+                [
+                    _strip_comment(line, "!#").split()[:4]
+                    for line in card["lines"][1:nks+1]
+                ], self._profiler
+            )
+
+
+    @profiled
+    def read_occupations_hubbard(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads the cards OCCUPATIONS and HUBBARD if they exist
+        +
+        +   HUBBARD {ortho-atomic}
+        +   U Fe-3d 5.0
+        +   V Fe-3d O-2p 1 2 0.3
+        ++----------------------------------------------------------------------
+        """
+        pattern_float = counting(self._profiler, _pattern_float)
+        if "OCCUPATIONS" in self.cards:
+            self.occupations = _to_float_array(
+                " ".join(
+                    _strip_comment(line, "!#")
+                    for line in self.cards["OCCUPATIONS"]["lines"]
+                ).split(), self._profiler
+            )
+        if "HUBBARD" in self.cards:
+            self.hubbard_option = self.cards["HUBBARD"]["option"]
+            self.hubbard = []
+            for line in self.cards["HUBBARD"]["lines"]:
+                temp = _strip_comment(line, "!#").split()
+                labels = tuple(
+                    t for t in temp[1:] if not pattern_float.match(t)
+                )
+                values = _to_float_array(
+                    temp[1+len(labels):], self._profiler
+                )
+                self.hubbard.append((temp[0], labels, values))
 
     def dict_atomic_mass(self, element=None):
         """
@@ -267,6 +418,178 @@ class qe_in(object):
         return mass
 
 
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
+
+def _strip_comment(line, chars="!"):
+    """
+    ++--------------------------------------------------------------------------
+    +   Remove the comment starting with one of chars, outside of quotes
+    ++--------------------------------------------------------------------------
+    """
+    if not any(c in line for c in chars):
+        return line
+    quote = None
+    for i, c in enumerate(line):
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c in chars:
+            return line[:i]
+    return line
+
+
+def _namelist_value(text):
+    """
+    ++--------------------------------------------------------------------------
+    +   Convert a value in a namelist to bool, int, float or str
+    ++--------------------------------------------------------------------------
+    """
+    if text[0] in "'\"":
+        return text[1:-1]
+    lower = text.lower()
+    if lower in (".true.", ".t.", "t", "true"):
+        return True
+    if lower in (".false.", ".f.", "f", "false"):
+        return False
+    if _pattern_int.match(text):
+        return int(text)
+    if _pattern_float.match(text):
+        return float(lower.replace("d", "e"))
+    return text
+
+
+def _to_float_array(values, prof=None):
+    """
+    ++--------------------------------------------------------------------------
+    +   Convert (nested lists of) strings to a float array at once, the
+    +   Fortran exponents like 1.0d-3 are accepted
+    +   prof (profiler counting the characters converted)
+    ++--------------------------------------------------------------------------
+    """
+    values = np.asarray(values, dtype=str)
+    if prof is not None and prof.enabled:
+        prof.count(bytes_converted=int(np.char.str_len(values).sum()))
+    if values.size == 0:
+        return values.astype(float)
+    return np.char.replace(np.char.lower(values), "d", "e").astype(float)
+
+
+def abc_to_celldm(ibrav, A, B=0.0, C=0.0, cosAB=0.0, cosAC=0.0, cosBC=0.0):
+    """
+    ++--------------------------------------------------------------------------
+    +   Convert A, B, C (angstrom) and cosAB, cosAC, cosBC to celldm(1) to
+    +   celldm(6) as pw.x does (abc2celldm)
+    +
+    +   return celldm (celldm(1) in bohr)
+    ++--------------------------------------------------------------------------
+    """
+    celldm = np.zeros(6)
+    celldm[0] = A / Bohr2Ang
+    celldm[1] = B / A
+    celldm[2] = C / A
+    if ibrav in (0, 14):
+        celldm[3:] = cosBC, cosAC, cosAB
+    elif ibrav in (-12, -13):
+        celldm[4] = cosAC
+    else:
+        celldm[3] = cosAB
+    return celldm
+
+
+def ibrav_to_cell(ibrav, celldm):
+    """
+    ++--------------------------------------------------------------------------
+    +   Generate the lattice vectors of a Bravais lattice as pw.x does
+    +   (latgen) for all ibrav except 0
+    +
+    +   ibrav (Bravais-lattice index, 1, 2, 3, -3, 4, 5, -5, 6, 7, 8, 9, -9,
+    +   91, 10, 11, 12, -12, 13, -13, 14)
+    +   celldm (celldm(1) to celldm(6), celldm(1) in bohr)
+    +
+    +   return cell_parameters (lattice vectors in rows, angstrom)
+    ++--------------------------------------------------------------------------
+    """
+    a = celldm[0] * Bohr2Ang
+    b = celldm[1] * a
+    c = celldm[2] * a
+    if ibrav == 1: # cubic P (sc)
+        cell = [[a, 0, 0], [0, a, 0], [0, 0, a]]
+    elif ibrav == 2: # cubic F (fcc)
+        cell = np.array([[-1, 0, 1], [0, 1, 1], [-1, 1, 0]]) * a / 2
+    elif ibrav == 3: # cubic I (bcc)
+        cell = np.array([[1, 1, 1], [-1, 1, 1], [-1, -1, 1]]) * a / 2
+    elif ibrav == -3: # cubic I (bcc), more symmetric axis
+        cell = np.array([[-1, 1, 1], [1, -1, 1], [1, 1, -1]]) * a / 2
+    elif ibrav == 4: # hexagonal and trigonal P
+        cell = [[a, 0, 0], [-a / 2, a * np.sqrt(3) / 2, 0], [0, 0, c]]
+    elif ibrav in (5, -5): # trigonal R, 3fold axis c or <111>
+        cosg = celldm[3]
+        tx = np.sqrt((1 - cosg) / 2)
+        ty = np.sqrt((1 - cosg) / 6)
+        tz = np.sqrt((1 + 2 * cosg) / 3)
+        if ibrav == 5:
+            cell = np.array([[tx, -ty, tz], [0, 2 * ty, tz], [-tx, -ty, tz]]) * a
+        else:
+            u = tz - 2 * np.sqrt(2) * ty
+            v = tz + np.sqrt(2) * ty
+            cell = np.array([[u, v, v], [v, u, v], [v, v, u]]) * a / np.sqrt(3)
+    elif ibrav == 6: # tetragonal P (st)
+        cell = [[a, 0, 0], [0, a, 0], [0, 0, c]]
+    elif ibrav == 7: # tetragonal I (bct)
+        cell = [[a / 2, -a / 2, c / 2], [a / 2, a / 2, c / 2], [-a / 2, -a / 2, c / 2]]
+    elif ibrav == 8: # orthorhombic P
+        cell = [[a, 0, 0], [0, b, 0], [0, 0, c]]
+    elif ibrav == 9: # orthorhombic base-centered (bco)
+        cell = [[a / 2, b / 2, 0], [-a / 2, b / 2, 0], [0, 0, c]]
+    elif ibrav == -9: # as 9, alternate description
+        cell = [[a / 2, -b / 2, 0], [a / 2, b / 2, 0], [0, 0, c]]
+    elif ibrav == 91: # orthorhombic one-face base-centered A-type
+        cell = [[a, 0, 0], [0, b / 2, -c / 2], [0, b / 2, c / 2]]
+    elif ibrav == 10: # orthorhombic face-centered
+        cell = [[a / 2, 0, c / 2], [a / 2, b / 2, 0], [0, b / 2, c / 2]]
+    elif ibrav == 11: # orthorhombic body-centered
+        cell = [
+            [a / 2, b / 2, c / 2], [-a / 2, b / 2, c / 2], [-a / 2, -b / 2, c / 2]
+        ]
+    elif ibrav in (12, 13): # monoclinic P or base-centered, unique axis c
+        cosg = celldm[3]
+        sing = np.sqrt(1 - cosg**2)
+        if ibrav == 12:
+            cell = [[a, 0, 0], [b * cosg, b * sing, 0], [0, 0, c]]
+        else:
+            cell = [[a / 2, 0, -c / 2], [b * cosg, b * sing, 0], [a / 2, 0, c / 2]]
+    elif ibrav in (-12, -13): # monoclinic P or base-centered, unique axis b
+        cosb = celldm[4]
+        sinb = np.sqrt(1 - cosb**2)
+        if ibrav == -12:
+            cell = [[a, 0, 0], [0, b, 0], [c * cosb, 0, c * sinb]]
+        else:
+            cell = [[a / 2, b / 2, 0], [-a / 2, b / 2, 0], [c * cosb, 0, c * sinb]]
+    elif ibrav == 14: # triclinic
+        cosa, cosb, cosg = celldm[3:6]
+        sing = np.sqrt(1 - cosg**2)
+        cell = [
+            [a, 0, 0],
+            [b * cosg, b * sing, 0],
+            [
+                c * cosb, c * (cosa - cosb * cosg) / sing,
+                c * np.sqrt(
+                    1 + 2 * cosa * cosb * cosg - cosa**2 - cosb**2 - cosg**2
+                ) / sing
+            ]
+        ]
+    else:
+        raise ValueError("ibrav = {} is not supported".format(ibrav))
+    return np.asarray(cell, dtype=float)
+
 
 if __name__ == "__main__":
     cwd = os.getcwd()
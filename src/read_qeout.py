@@ -5,11 +5,15 @@ import os
 import re
 import argparse
 import matplotlib.pyplot as plt
+from profiler import profiler, profiled, counting
+from read_volumetric import macroscopic_average
+from species import encode, decode
 
 class qe_out(object):
     """
     ++--------------------------------------------------------------------------
     +   Input: path to Quantum Espresso pw.x output file
+    +   profile (True, "log" or None to follow QE_POST_PROFILE, see profiler.py)
     ++--------------------------------------------------------------------------
     +   1. Constructor
     +   Attributes:
@@ -37,6 +41,7 @@ class qe_out(object):
     +   self.exist_occ (does occupations exist? need verbosity=high)
     +   self.soc (is spin-orbit coupling?)
     +   self.scf_cycle (number of scf cycles)
+    +   self.profile_stats (time, lines, regex calls and bytes of each method)
     +
     +   No return
     ++--------------------------------------------------------------------------
@@ -71,7 +76,8 @@ class qe_out(object):
     ++--------------------------------------------------------------------------
     +   6. Method read_magnet(self)
     +   Attributes:
-    +   self.magnet (magnetic moment per site, unit ?)
+    +   self.magnet (magnetic moment per site, Bohr mag)
+    +   self.polar_coord (r, theta, phi [deg] of self.magnet if noncollinear)
     +
     +   No return
     ++--------------------------------------------------------------------------
@@ -83,8 +89,12 @@ class qe_out(object):
     ++--------------------------------------------------------------------------
     +   8. Method read_atomic_pos(self)
     +   Attributes:
-    +   self.atomsfull (full atomic name associated with each atomic position)
-    +   self.atoms (atomic species associated with each atomic position)
+    +   self.labels (table of the atomic labels, e.g. "Fe1", see species.py)
+    +   self.label_codes (code of the label of each atom, uint8)
+    +   self.species (table of the atomic species, see species.py)
+    +   self.species_codes (code of the species of each atom, uint8)
+    +   self.atomsfull (read-only, label of each atom decoded from the codes)
+    +   self.atoms (read-only, species of each atom decoded from the codes)
     +   self.atomic_pos_cryst (atomic positions in fractional crystal coordinates)
     +   self.atomic_pos_cart (atomic positions in cartesian coordinates, angstrom)
     +   self.atomic_mass (atomic mass associated with each atom, AMU)
@@ -100,8 +110,49 @@ class qe_out(object):
     +
     +   No return
     ++--------------------------------------------------------------------------
+    +   10. Method read_timing(self)
+    +   Attributes:
+    +   self.timing (cpu and wall time and calls of each routine, s)
+    +   self.parallel_info (MPI processes, threads, pools and nodes)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   11. Method read_scf_history(self)
+    +   Attributes:
+    +   self.scf_history (energy, accuracy, magnetization and cpu time of
+    +   every scf iteration)
+    +   self.scf_offsets (start of each scf cycle in self.scf_history)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   12. Method read_charge_magnet_history(self)
+    +   Attributes:
+    +   self.charge_history (charge per site of each scf cycle, unit e-)
+    +   self.magnet_history (magnetic moment per site of each scf cycle,
+    +   Bohr mag)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   13. Method read_forces_history(self)
+    +   Attributes:
+    +   self.forces_history (forces acting on atoms of each scf cycle, Ry/au)
+    +   self.total_force (total force of each scf cycle, Ry/au)
+    +   self.max_force (largest force component of each scf cycle, Ry/au)
+    +   self.stress (stress tensor of each scf cycle, kbar)
+    +   self.pressure (pressure of each scf cycle, kbar)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   14. Method read_fermi(self)
+    +   Attributes:
+    +   self.fermi (Fermi energy, eV, nan without smearing)
+    +   self.homo (highest occupied level, eV, nan with smearing)
+    +   self.lumo (lowest unoccupied level, eV, nan if not printed)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
     """
-    def __init__(self, path, verbosity=True):
+    def __init__(self, path, verbosity=True, profile=None):
         """
         ++----------------------------------------------------------------------
         +   __init__ method or constructor for initialization
@@ -124,7 +175,66 @@ class qe_out(object):
             raise IOError("Fail to open QE output file")
             
 
-        self.lines = qe_output.readlines()
+        self._profiler = profiler(profile)
+        self.profile_stats = self._profiler.stats
+        with self._profiler.stage("read_file"):
+            self.lines = qe_output.readlines()
+            self._profiler.count(
+                lines=len(self.lines),
+                bytes_read=os.path.getsize(qe_output.name)
+            )
+        self.read_header()
+
+        self.verbosity = verbosity
+        if verbosity:
+            print("----------------Quantum Espresso----------------")
+            print("Atomic species: {}".format(self.atomic_species))
+            print("Number of atoms: {}".format(str(self.nat)))
+            print("Number of atomic types: {}".format(str(self.ntyp)))
+            print(
+                "Number of k points in irreducible Brilloin zone: {}"
+                .format(str(self.nk))
+            )
+            print("Number of bands: {}".format(str(self.nbnd)))
+            print(
+                "Kinetic-energy cutoff (ecutwfc): {} Ry"
+                .format(str(self.ecutwfc))
+            )
+            print("Exchange-correlation: {}".format(self.xc_functional))
+            print("Spin polarization: {}".format(self.spinpol))
+            print("Spin-orbit coupling: {}".format(self.soc))
+
+            if self.spinpol and self.up_ne != 0:
+                print(
+                    "Number of electrons: {} (up: {}, down: {})"
+                    .format(str(self.ne), str(self.up_ne), str(self.dn_ne))
+                )
+            elif self.spinpol and self.up_ne == 0:
+                print(
+                    "Number of electrons: {} (Input has no 'nspin=2')"
+                    .format(str(self.ne))
+                )
+            else:
+                print("Number of electrons: {}".format(str(self.ne)))
+        
+        # call all the dynamic methods
+        self.read_atomic_pos()
+        self.read_eigenenergies()
+        self.read_bandgap()
+        #self.read_miscellus()
+        self.read_etot()
+        if self._profiler.log:
+            self._profiler.report(path)
+
+    @profiled
+    def read_header(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads the size of the system, the cell, the k points
+        +   and the kind of calculation, called by the constructor
+        ++----------------------------------------------------------------------
+        """
+        regex = counting(self._profiler, re)
         self.atomic_species = {}
         self.up_ne = 0
         self.dn_ne = 0
@@ -139,27 +249,27 @@ class qe_out(object):
 
         for i, line in enumerate(self.lines):
             if "number of atoms/cell" in line:
-                self.nat = int(re.findall(r"[+-]?\d+", line)[0])
+                self.nat = int(regex.findall(r"[+-]?\d+", line)[0])
             if "number of atomic types" in line:
-                self.ntyp = int(re.findall(r"[+-]?\d+", line)[0])
+                self.ntyp = int(regex.findall(r"[+-]?\d+", line)[0])
             if "number of electrons" in line:
-                self.ne = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
+                self.ne = float(regex.findall(r"[+-]?\d+\.\d*", line)[0])
                 if "up:" in line and "down:" in line:
                     self.spinpol = True # spin polarization
-                    self.up_ne = float(re.findall(r"[+-]?\d+\.\d*", line)[1])
-                    self.dn_ne = float(re.findall(r"[+-]?\d+\.\d*", line)[2])
+                    self.up_ne = float(regex.findall(r"[+-]?\d+\.\d*", line)[1])
+                    self.dn_ne = float(regex.findall(r"[+-]?\d+\.\d*", line)[2])
                 else:
                     self.spinpol = False
             if "number of Kohn-Sham states" in line:
-                self.nbnd = int(re.findall(r"[+-]?\d+", line)[0])
+                self.nbnd = int(regex.findall(r"[+-]?\d+", line)[0])
             if "kinetic-energy cutoff" in line:
-                self.ecutwfc = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
+                self.ecutwfc = float(regex.findall(r"[+-]?\d+\.\d*", line)[0])
             if "mixing beta" in line:
-                self.mixing_beta = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
+                self.mixing_beta = float(regex.findall(r"[+-]?\d+\.\d*", line)[0])
             if "Exchange-correlation" in line:
-                self.xc_functional = re.search(r"PBE0|PBE|HSE|.", line).group(0)
+                self.xc_functional = _xc_functional(line)
             if "EXX-fraction" in line:
-                self.exx_fraction = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
+                self.exx_fraction = float(regex.findall(r"[+-]?\d+\.\d*", line)[0])
             if "spin-orbit" in line:
                 self.soc = True
             if "celldm(1)" in line: # lattic constant
@@ -168,32 +278,32 @@ class qe_out(object):
                 self.R_axes = np.zeros((3, 3))
                 # read celldm1 and convert the unit from bohr to angstron
                 self.celldm1 = (
-                    float(re.findall(r"[+-]?\d\.\d+[Ee][+-]?\d+|[+-]?\d+[Ee][+-]?\d+|[+-]?\d+\.\d*|[+-]?\d+", line)[1]) * Bohr2Ang
+                    float(regex.findall(r"[+-]?\d\.\d+[Ee][+-]?\d+|[+-]?\d+[Ee][+-]?\d+|[+-]?\d+\.\d*|[+-]?\d+", line)[1]) * Bohr2Ang
                     #float(re.findall(r"[+-]?\d+\.\d*", line)[0]) * Bohr2Ang # same as above
                 )
                 for j in range(3):
-                    self.cryst_axes[j, :] = re.findall(
+                    self.cryst_axes[j, :] = regex.findall(
                         r"[+-]?\d+\.\d*", self.lines[i+4+j]
                     )
-                    self.R_axes[j, :] = re.findall(
+                    self.R_axes[j, :] = regex.findall(
                         r"[+-]?\d+\.\d*", self.lines[i+9+j]
                     )
                 self.cell_parameters = self.cryst_axes * self.celldm1
                 self.inv_cell_parameters = np.linalg.inv(self.cell_parameters)
-                self.R_axes = self.R_axes * (2*np.pi / celldm1)
+                self.R_axes = self.R_axes * (2*np.pi / self.celldm1)
             if "CELL_PARAMETERS" in line:
                 if "alat" in line:
                     alat = (
-                        float(re.findall(r"[+-]?\d+\.\d*", line)[0]) * Bohr2Ang
+                        float(regex.findall(r"[+-]?\d+\.\d*", line)[0]) * Bohr2Ang
                     )
                     for j in range(3):
-                        self.cryst_axes[j, :] = re.findall(
+                        self.cryst_axes[j, :] = regex.findall(
                             r"[+-]?\d+\.\d*", self.lines[i+1+j]
                         )
                     self.cell_parameters = self.cryst_axes * alat
                 elif "angstrom" in line:
                     for j in range(3):
-                        self.cell_parameters[j, :] = re.findall(
+                        self.cell_parameters[j, :] = regex.findall(
                             r"[+-]?\d+\.\d*", self.lines[i+1+j]
                         )
                 self.inv_cell_parameters = np.linalg.inv(self.cell_parameters)
@@ -201,23 +311,23 @@ class qe_out(object):
                 temp = self.lines[i+1:i+self.ntyp+1]
                 for j in range(self.ntyp):
                     temp[j] = temp[j].strip("\n").split()
-                    element = re.sub(r"[^a-zA-Z]", "", temp[j][0])
+                    element = regex.sub(r"[^a-zA-Z]", "", temp[j][0])
                     mass = float(temp[j][2])
                     self.atomic_species.update({element: mass})
             if "number of k points" in line:
-                self.nk = int(re.findall(r"[+-]?\d+", line)[0])
+                self.nk = int(regex.findall(r"[+-]?\d+", line)[0])
                 self.kpts_cart_coord = np.zeros((self.nk, 3))
                 self.kpts_cryst_coord = np.zeros((self.nk, 3))
                 if "cart. coord." in self.lines[i+1]:
                     for j in range(self.nk):
                         self.kpts_cart_coord[j, :] = np.array(
-                            re.findall(r"[+-]?\d+\.\d*", self.lines[i+j+2])[0:3]
-                        ).astype(float) * (2*np.pi / celldm1)
+                            regex.findall(r"[+-]?\d+\.\d*", self.lines[i+j+2])[0:3]
+                        ).astype(float) * (2*np.pi / self.celldm1)
                 if "cryst. coord." in self.lines[i+self.nk+3]:
                     # exist only when being verbosity
                     for j in range(self.nk):
                         self.kpts_cryst_coord[j, :] = np.array(
-                            re.findall(
+                            regex.findall(
                                 r"[+-]?\d+\.\d*", self.lines[i+j+4+self.nk]
                             )[0:3]
                         ).astype(float)
@@ -239,48 +349,9 @@ class qe_out(object):
                 self.scf_cycle += 1
             if "EXX self-consistency reached" in line:
                 self.exx_scf_cycle += 1
-
-
-        self.verbosity = verbosity
-        if verbosity:
-            print("----------------Quantum Espresso----------------")
-            print("Atomic species: {}".format(self.atomic_species))
-            print("Number of atoms: {}".format(str(self.nat)))
-            print("Number of atomic types: {}".format(str(self.ntyp)))
-            print(
-                "Number of k points in irreducible Brilloin zone: {}"
-                .format(str(self.nk))
-            )
-            print("Number of bands: {}".format(str(self.nbnd)))
-            print(
-                "Kinetic-energy cutoff (ecutwfc): {} Ry"
-                .format(str(self.ecutwfc))
-            )
-            print("Exchange-correlation: {}".format(self.xc_functional))
-            print("Spin polarization: {}".format(self.spinpol))
-            print("Spin-orbit coupling: {}".format(self.soc))
-
-            if self.spinpol and self.up_ne != 0:
-                print(
-                    "Number of electrons: {} (up: {}, down: {})"
-                    .format(str(self.ne), str(self.up_ne), str(self.dn_ne))
-                )
-            elif self.spinpol and self.up_ne == 0:
-                print(
-                    "Number of electrons: {} (Input has no 'nspin=2')"
-                    .format(str(self.ne))
-                )
-            else:
-                print("Number of electrons: {}".format(str(self.ne)))
-        
-        # call all the dynamic methods
-        self.read_atomic_pos()
-        self.read_eigenenergies()
-        self.read_bandgap()
-        #self.read_miscellus()
-        self.read_etot()
         
 
+    @profiled
     def read_etot(self):
         """
         ++----------------------------------------------------------------------
@@ -289,6 +360,7 @@ class qe_out(object):
         +   conditions can be "!", "!!" and "Final"
         ++----------------------------------------------------------------------
         """
+        regex = counting(self._profiler, re)
         # physical constants
         Ry = 2.1798723611035e-18 # Rydberg in Joules
         Ry2eV = 13.605693122994 # Rydberg constant in eV
@@ -307,18 +379,18 @@ class qe_out(object):
                 # \.    # the decimal point
                 # \d *  # some fractional digits
                 self.etot[etot_count] = (
-                    float(re.findall(r"[+-]?\d+\.\d*", line)[0]) * Ry2eV
+                    float(regex.findall(r"[+-]?\d+\.\d*", line)[0]) * Ry2eV
                 )
                 etot_count += 1
             elif "!!   total energy" in line:
                 self.exx_etot[exx_etot_count] = (
-                    float(re.findall(r"[+-]?\d+\.\d*", line)[0]) * Ry2eV
+                    float(regex.findall(r"[+-]?\d+\.\d*", line)[0]) * Ry2eV
                 )
                 exx_etot_count += 1
             elif "Final" in line:
                 if self.verbosity:
                     print("Geometry optimization done")
-                final_energy = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
+                final_energy = float(regex.findall(r"[+-]?\d+\.\d*", line)[0])
                 self.final_energy = final_energy * Ry2eV
                 break
         if self.final_energy == 0:
@@ -326,7 +398,10 @@ class qe_out(object):
             if self.xc_functional == "PBE":
                 self.final_energy = self.etot[-1]
             else: # hybrid functionals or functionals with vdW_corr
-                if self.xc_functional == "PBE0" or self.xc_functional == "HSE":
+                if (
+                    self.xc_functional in ("PBE0", "HSE")
+                    and self.exx_etot.size > 0
+                ):
                     # if hybrid calculation, and it can converge
                     if self.verbosity:
                         print("Hybrid calculation is not done")
@@ -340,6 +415,7 @@ class qe_out(object):
             print("Final energy = {} eV".format(self.final_energy))
 
 
+    @profiled
     def read_eigenenergies(self):
         """
         ++----------------------------------------------------------------------
@@ -368,6 +444,7 @@ class qe_out(object):
         +
         ++----------------------------------------------------------------------
         """
+        regex = counting(self._profiler, re)
         if self.spinpol:
             # In this case, self.eigenE[0:self.nk, :] are spin up eigenenergies,
             # self.eigenE[self.nk:self.nk*2, :] are spin down eigenenergies
@@ -403,7 +480,7 @@ class qe_out(object):
                 temp_occ = self.lines[i+4+rows : i+4+rows*2]
                 for j in range(rows):
                     if int_multi_8:
-                        self.eigenE[k_counted, j*8:(j+1)*8] = re.findall(
+                        self.eigenE[k_counted, j*8:(j+1)*8] = regex.findall(
                                 "[+-]?\d+\.\d*", temp_E[j]
                             )
                         if self.exist_occ:
@@ -412,7 +489,7 @@ class qe_out(object):
                             )
                     else:
                         if j < rows -1:
-                            self.eigenE[k_counted, j*8:(j+1)*8] = re.findall(
+                            self.eigenE[k_counted, j*8:(j+1)*8] = regex.findall(
                                 "[+-]?\d+\.\d*", temp_E[j]
                             )
                             if self.exist_occ:
@@ -420,7 +497,7 @@ class qe_out(object):
                                     temp_occ[j].strip().split()
                                 )
                         else:
-                            self.eigenE[k_counted, j*8:j*8+modulo] = re.findall(
+                            self.eigenE[k_counted, j*8:j*8+modulo] = regex.findall(
                                 "[+-]?\d+\.\d*", temp_E[j]
                             )
                             if self.exist_occ:
@@ -445,6 +522,7 @@ class qe_out(object):
                     )
 
 
+    @profiled
     def read_bandgap(self):
         """
         ++----------------------------------------------------------------------
@@ -651,97 +729,105 @@ class qe_out(object):
             )
 
 
+    @profiled
     def read_charge(self):
         """
         ++----------------------------------------------------------------------
-        +   This method reads the charge after convergence
+        +   This method reads the charge after convergence, i.e. the last row
+        +   of self.charge_history (zeros if it is not printed)
         ++----------------------------------------------------------------------
         """
-        self.charge = np.zeros(self.nat)
-        num_scf = self.scf_cycle
-        if not self.soc:
-            for i, line in enumerate(self.lines):
-                if "End of self-consistent calculation" in line and num_scf > 0:
-                    num_scf -= 1
-                    continue
-                elif num_scf == 1 and "Magnetic moment per site:" in line:
-                    for j in range(self.nat):
-                        self.charge[j] = np.asarray(
-                            self.lines[i+1+j].strip().split()
-                        )[3]
-        elif self.soc:
-            j = 0
-            for i, line in enumerate(self.lines):
-                if "End of self-consistent calculation" in line and num_scf > 0:
-                    num_scf -= 1
-                    continue
-                elif num_scf == 1 and "charge :  " in line:
-                    self.charge[j] = np.asarray(
-                        re.findall(r"[+-]?\d+\.\d*", line)[0]
-                    ).astype(float)
-                    j += 1
-                    if j == self.nat - 1:
-                        break
+        if not hasattr(self, "charge_history"):
+            self.read_charge_magnet_history()
+        if self.charge_history.shape[0] > 0:
+            self.charge = np.nan_to_num(self.charge_history[-1])
+        else:
+            self.charge = np.zeros(self.nat)
 
 
+    @profiled
     def read_magnet(self):
         """
         ++----------------------------------------------------------------------
-        +   This method reads the magnetic moment after convergence
+        +   This method reads the magnetic moment after convergence, i.e. the
+        +   last row of self.magnet_history (zeros if it is not printed)
+        +   if noncollinear, self.polar_coord is the magnetic moment in polar
+        +   coordinates (r, theta, phi [deg])
         ++----------------------------------------------------------------------
         """
-        if not self.soc:
-            self.magnet = np.zeros(self.nat)
-            num_scf = self.scf_cycle
-            for i, line in enumerate(self.lines):
-                if "End of self-consistent calculation" in line and num_scf > 0:
-                    num_scf -= 1
-                    continue
-                elif num_scf == 1 and "Magnetic moment per site:" in line:
-                    for j in range(self.nat):
-                        self.magnet[j] = np.asarray(
-                            self.lines[i+1+j].strip().split()
-                        )[5]
-        elif self.soc:
-            self.magnet = np.zeros((self.nat, 3))
-            self.polar_coord = np.zeros((self.nat, 3))
-            num_scf = self.scf_cycle
-            j = 0
-            for i, line in enumerate(self.lines):
-                if "End of self-consistent calculation" in line and num_scf > 0:
-                    num_scf -= 1
-                    continue
-                elif num_scf == 1 and "magnetization :   " in line:
-                    self.magnet[j] = np.asarray(
-                        re.findall(r"[+-]?\d+\.\d*", line)
-                    ).astype(float)
-                    self.polar_coord[j] = np.asarray(
-                        re.findall(r"[+-]?\d+\.\d*", line)
-                    ).astype(float)
-                    j += 1
-                    if j == self.nat - 1:
-                        break
+        if not hasattr(self, "magnet_history"):
+            self.read_charge_magnet_history()
+        if self.magnet_history.shape[0] > 0:
+            self.magnet = np.nan_to_num(self.magnet_history[-1])
+        else:
+            self.magnet = np.zeros(self.magnet_history.shape[1:])
+        if self.magnet.ndim == 2:
+            r = np.linalg.norm(self.magnet, axis=1)
+            theta = np.degrees(
+                np.arccos(
+                    np.divide(
+                        self.magnet[:, 2], r, out=np.ones_like(r), where=r > 0
+                    )
+                )
+            )
+            phi = np.degrees(np.arctan2(self.magnet[:, 1], self.magnet[:, 0]))
+            self.polar_coord = np.column_stack((r, theta, phi))
 
 
+    @profiled
+    def read_charge_magnet_history(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads the charge and magnetic moment per site of every
+        +   scf cycle, see read_charge_magnet_history(path, nat)
+        +   Attributes:
+        +   self.charge_history (charge per site, (nstep x nat))
+        +   self.magnet_history (magnetic moment per site, (nstep x nat), or
+        +   (nstep x nat x 3) if noncollinear)
+        ++----------------------------------------------------------------------
+        """
+        self.charge_history, self.magnet_history = read_charge_magnet_history(
+            self.lines, self.nat, self._profiler
+        )
+
+
+    @profiled
     def read_forces(self):
         """
         ++----------------------------------------------------------------------
-        +   This method reads the forces after convergence
+        +   This method reads the forces after convergence, i.e. the last row
+        +   of self.forces_history (zeros if it is not printed)
         ++----------------------------------------------------------------------
         """
-        self.forces = np.zeros((self.nat, 3)) # unit 
-        num_scf = self.scf_cycle
-        for i, line in enumerate(self.lines):
-            if "End of self-consistent calculation" in line and num_scf > 0:
-                num_scf -= 1
-                continue
-            elif num_scf == 0 and "Forces acting on atoms " in line:
-                for j in range(self.nat):
-                    self.forces[j] = np.asarray(
-                        self.lines[i+2+j].strip().split()
-                    )[-3:]
-                    
+        if not hasattr(self, "forces_history"):
+            self.read_forces_history()
+        if self.forces_history.shape[0] > 0:
+            self.forces = np.nan_to_num(self.forces_history[-1]) # unit Ry/au
+        else:
+            self.forces = np.zeros((self.nat, 3))
+
+
+    @profiled
+    def read_forces_history(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads the forces and stress of every scf cycle, see
+        +   read_forces_history(path, nat)
+        +   Attributes:
+        +   self.forces_history (forces acting on atoms, Ry/au, (nstep x nat x 3))
+        +   self.total_force (total force, Ry/au, (nstep))
+        +   self.max_force (largest absolute force component, Ry/au, (nstep))
+        +   self.stress (stress tensor, kbar, (nstep x 3 x 3))
+        +   self.pressure (pressure, kbar, (nstep))
+        ++----------------------------------------------------------------------
+        """
+        (
+            self.forces_history, self.total_force, self.max_force,
+            self.stress, self.pressure
+        ) = read_forces_history(self.lines, self.nat, self._profiler)
+
 
+    @profiled
     def read_atomic_pos(self):
         """
         ++----------------------------------------------------------------------
@@ -757,8 +843,9 @@ class qe_out(object):
         +
         ++----------------------------------------------------------------------
         """
-        self.atomsfull = np.zeros(self.nat, dtype="U4")
-        self.atoms = np.zeros(self.nat, dtype="U4")
+        regex = counting(self._profiler, re)
+        # labels like "Fe1" of the atoms, kept as codes once all are read
+        labels = [""] * self.nat
         self.atomic_pos_cryst = np.zeros((self.nat, 3))
         self.atomic_pos_cart = np.zeros((self.nat, 3))
         self.atomic_mass = np.zeros(self.nat)
@@ -767,9 +854,7 @@ class qe_out(object):
         for i, line in enumerate(self.lines):
             if "Cartesian axes" in line:
                 for j in range(self.nat):
-                    self.atomsfull[j] = self.lines[i+3+j].strip().split()[1]
-                    # substitute any digit in self.atomsfull with nothing
-                    self.atoms[j] = re.sub(r"[^a-zA-Z]", "", self.atomsfull[j])
+                    labels[j] = self.lines[i+3+j].strip().split()[1]
                     self.atomic_pos_cart[j] = (
                         self.lines[i+3+j].strip().split()[6:9]
                     )
@@ -781,9 +866,7 @@ class qe_out(object):
                     )
             if "Crystallographic axes" in line:
                 for j in range(self.nat):
-                    self.atomsfull[j] = self.lines[i+3+j].strip().split()[1]
-                    # substitute any digit in self.atomsfull with nothing
-                    self.atoms[j] = re.sub(r"[^a-zA-Z]", "", self.atomsfull[j])
+                    labels[j] = self.lines[i+3+j].strip().split()[1]
                     self.atomic_pos_cryst[j] = (
                         self.lines[i+3+j].strip().split()[6:9]
                     )
@@ -805,13 +888,7 @@ class qe_out(object):
                 if "crystal" in self.lines[i+n]: # crystal fractional coordinate
                     # print("crystal")
                     for j in range(self.nat):
-                        self.atomsfull[j] = (
-                            self.lines[i+(n+1)+j].strip().split()[0]
-                        )
-                        # substitute any digit in self.atomsfull with nothing
-                        self.atoms[j] = re.sub(
-                            r"[^a-zA-Z]", "", self.atomsfull[j]
-                        )
+                        labels[j] = self.lines[i+(n+1)+j].strip().split()[0]
                         self.atomic_pos_cryst[j] = (
                             self.lines[i+(n+1)+j].strip().split()[1:4]
                         )
@@ -822,13 +899,7 @@ class qe_out(object):
                     )
                 elif "angstrom" in self.lines[i+n]: # cartisian coordinate
                     for j in range(self.nat):
-                        self.atomsfull[j] = (
-                            self.lines[i+(n+1)+j].strip().split()[0]
-                        )
-                        # substitute any digit in self.atomsfull with nothing
-                        self.atoms[j] = re.sub(
-                            r"[^a-zA-Z]", "", self.atomsfull[j]
-                        )
+                        labels[j] = self.lines[i+(n+1)+j].strip().split()[0]
                         self.atomic_pos_cart[j] = (
                             self.lines[i+(n+1)+j].strip().split()[1:4]
                         )
@@ -845,46 +916,97 @@ class qe_out(object):
                 print("This is a single-point calculation (scf or nscf).")
         
 
-        for i in range(self.nat):
-            self.atomic_mass[i] = self.atomic_species[self.atoms[i]]
+        # codes, the digits are removed once per label and the masses are
+        # looked up once per species, not once per atom
+        self.labels, self.label_codes = encode(labels)
+        self.species, label_species = encode(
+            [regex.sub(r"[^a-zA-Z]", "", label) for label in self.labels]
+        )
+        self.species_codes = label_species[self.label_codes]
+        self.atomic_mass = np.array(
+            [self.atomic_species[s] for s in self.species]
+        )[self.species_codes]
     
 
+    @property
+    def atoms(self):
+        """
+        ++----------------------------------------------------------------------
+        +   Atomic species of each atom (U4), decoded from self.species_codes
+        +   when asked for
+        ++----------------------------------------------------------------------
+        """
+        return decode(self.species, self.species_codes)
+
+    @property
+    def atomsfull(self):
+        """
+        ++----------------------------------------------------------------------
+        +   Labels of the atoms as printed by pw.x, e.g. "Fe1" (U4), decoded
+        +   from self.label_codes when asked for
+        ++----------------------------------------------------------------------
+        """
+        return decode(self.labels, self.label_codes)
+
+    @profiled
     def read_miscellus(self):
+        regex = counting(self._profiler, re)
         self.fft = np.zeros(3)
         self.cpu_time = 0
         self.wall_time = 0
         for line in self.lines:
             if "FFT dimensions" in line:
-                self.dense_grid = re.findall(r"[+-]?\d+\.\d*|[+-]?\d+", line)[0]
-                self.fft = re.findall(r"[+-]?\d+\.\d*|[+-]?\d+", line)[1:]
-
-        for line in self.lines[::-1]:
-            if "PWSCF        :" in line:
-                time = re.findall(r"[+-]?\d+\.\d*|[+-]?\d+", line)
-                # a regular expression matches either d, h, m or s
-                units = re.findall(r"d|h|m|s", line)
-                num = int(len(units)/2)
-        for i, unit in enumerate(units[:num]): # cpu time, convert units to s
-            if unit == "d":
-                self.cpu_time += float(time[i]) * 24 * 60 * 60
-            elif unit == "h":
-                self.cpu_time += float(time[i]) * 60 * 60
-            elif unit == "m":
-                self.cpu_time += float(time[i]) * 60
-            else:
-                self.cpu_time += float(time[i])
-        for i, unit in enumerate(units[num:]): # wall time, convert units to s
-            if unit == "d":
-                self.wall_time += float(time[i+num]) * 24 * 60 * 60
-            elif unit == "h":
-                self.wall_time += float(time[i+num]) * 60 * 60
-            elif unit == "m":
-                self.wall_time += float(time[i+num]) * 60
-            else:
-                self.wall_time += float(time[i+num])
+                self.dense_grid = regex.findall(r"[+-]?\d+\.\d*|[+-]?\d+", line)[0]
+                self.fft = regex.findall(r"[+-]?\d+\.\d*|[+-]?\d+", line)[1:]
+
+        # cpu and wall time of the whole run from the clock table
+        self.read_timing()
+        is_pwscf = self.timing["routine"] == "PWSCF"
+        if np.any(is_pwscf):
+            self.cpu_time = self.timing["cpu"][is_pwscf][-1]
+            self.wall_time = self.timing["wall"][is_pwscf][-1]
         if self.verbosity:
             print("Calculation time: {} s".format(self.wall_time))
 
+    @profiled
+    def read_timing(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads the clock table at the end of the output and the
+        +   parallelization, see read_timing(path)
+        +   Attributes:
+        +   self.timing (structured array with fields routine, group, cpu,
+        +   wall and calls, s)
+        +   self.parallel_info (dictionary of MPI processes, threads, pools
+        +   and nodes)
+        ++----------------------------------------------------------------------
+        """
+        self.timing, self.parallel_info = read_timing(self.lines, self._profiler)
+
+    @profiled
+    def read_scf_history(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads every scf iteration, see read_scf_history(path)
+        +   Attributes:
+        +   self.scf_history (structured array with fields iteration, energy,
+        +   accuracy, magnetization, absolute_magnetization and cpu_time)
+        +   self.scf_offsets (scf cycle i is
+        +   self.scf_history[self.scf_offsets[i]:self.scf_offsets[i+1]])
+        ++----------------------------------------------------------------------
+        """
+        self.scf_history, self.scf_offsets = read_scf_history(self.lines, self._profiler)
+
+    @profiled
+    def read_fermi(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads the last Fermi energy or band edges, see
+        +   read_fermi(path)
+        ++----------------------------------------------------------------------
+        """
+        self.fermi, self.homo, self.lumo = read_fermi(self.lines, self._profiler)
+
 
 #------------------------------------------------------------------------------#
 #------------------------------------------------------------------------------#
@@ -893,44 +1015,687 @@ class qe_out(object):
 #------------------------------------------------------------------------------#
 #------------------------------------------------------------------------------#
 
-def read_vac(dir_f=".avg.out"):
+# a line of the clock table, e.g.
+#      electrons    :   1m23.45s CPU   1m25.00s WALL (       1 calls)
+_pattern_clock = re.compile(
+    r"^\s*(\S+?)\s*:\s+(.*?)CPU(.*?)WALL(?:\s*\(\s*(\d+)\s*calls\))?"
+)
+_pattern_time = re.compile(r"(\d+\.?\d*)\s*([dhms])")
+# a number in fixed or scientific notation, e.g. -31.6, 4.6E-09
+_pattern_number = re.compile(r"[+-]?(?:\d+\.\d*|\.\d+|\d+)(?:[EeDd][+-]?\d+)?")
+# a row of numbers, e.g. of average.x
+_pattern_data_row = re.compile(r"^\s*[+-]?(?:\d|\.\d)")
+# the end of the averages in the output of average.x, "AVERAGE      :"
+_pattern_average = re.compile(r"^\s*AVERAGE\s*:")
+_pattern_xc = re.compile(r"\b(?:PBE0|HSE|PBE)\b")
+_seconds_of_unit = {"d": 86400.0, "h": 3600.0, "m": 60.0, "s": 1.0}
+
+
+def _xc_functional(line):
+    """
+    ++--------------------------------------------------------------------------
+    +   Name of the functional on the line "Exchange-correlation= PBE0", i.e.
+    +   PBE0, HSE or PBE, or else the name printed by pw.x
+    ++--------------------------------------------------------------------------
+    """
+    name = line.split("=", 1)[1].split("(")[0].strip()
+    match = _pattern_xc.search(name)
+    return match.group(0) if match is not None else name
+
+
+def _qe_time_to_seconds(text):
     """
     ++--------------------------------------------------------------------------
-    +   Read electrostatic potential file avg.out
-    +   electrostatic potential data start from line 23 and stop at line -10
+    +   Convert a time of QE like "1h 2m", "1m23.45s" or "0.27s" to seconds
+    ++--------------------------------------------------------------------------
+    """
+    return sum(
+        float(val) * _seconds_of_unit[unit]
+        for val, unit in _pattern_time.findall(text)
+    )
+
+
+def _iter_lines(source):
+    """
+    ++--------------------------------------------------------------------------
+    +   Iterate over the lines of a file given by its path, or over a list of
+    +   lines that is already read
+    ++--------------------------------------------------------------------------
+    """
+    if isinstance(source, str):
+        with open(source, "r") as f:
+            for line in f:
+                yield line
+    else:
+        for line in source:
+            yield line
+
+
+def read_timing(source, prof=None):
+    """
+    ++--------------------------------------------------------------------------
+    +   Read the clock table that pw.x prints at the end of the output
     +
-    +   return(z, vac)
-    +   z: positions in z of cell (angstrom)
-    +   vac: vacuum electrostatic potential (eV)
+    +        init_run     :      0.25s CPU      0.27s WALL (       1 calls)
+    +        electrons    :      1.53s CPU      1.62s WALL (       1 calls)
+    +
+    +        Called by electrons:
+    +        c_bands      :      1.20s CPU      1.26s WALL (      11 calls)
+    +        ...
+    +        PWSCF        :      2.10s CPU      2.31s WALL
+    +
+    +   and the parallelization at the beginning of the output
+    +
+    +   source (path to pw.x output file or list of lines)
+    +   prof (profiler counting the regex calls, see profiler.counting)
+    +
+    +   return(timing, parallel_info)
+    +   timing (structured array with fields routine, group ("" or the
+    +   routine after "Called by"), cpu (s), wall (s) and calls)
+    +   parallel_info (dictionary with mpi_processes, threads, npool, nodes
+    +   and cores = mpi_processes * threads)
     ++--------------------------------------------------------------------------
     """
-    f = open(dir_f, "r")
-    lines = f.readlines()
-    z = []
-    vac = []
-    found_vac = False
-    for i, line in enumerate(lines):
-        if "Reading data from file  bn.pot" in line and not found_vac:
-            found_vac = True
+    regex = counting(prof, re)
+    pattern_clock = counting(prof, _pattern_clock)
+    rows = []
+    group = ""
+    parallel_info = {
+        "mpi_processes": 1, "threads": 1, "npool": 1, "nodes": 1
+    }
+    for line in _iter_lines(source):
+        if "WALL" in line:
+            match = pattern_clock.match(line)
+            if match is not None:
+                routine, cpu, wall, calls = match.groups()
+                rows.append(
+                    (
+                        routine, "" if routine == "PWSCF" else group,
+                        _qe_time_to_seconds(cpu),
+                        _qe_time_to_seconds(wall),
+                        int(calls) if calls is not None else 0
+                    )
+                )
+        elif "Called by" in line:
+            group = line.split("Called by")[1].strip().rstrip(":")
+        elif line.strip().endswith("routines") and rows:
+            # e.g. "General routines", "Parallel routines"
+            group = line.strip()
+        elif "running on" in line and "Parallel version" in line:
+            num = int(regex.findall(r"\d+", line.split("running on")[1])[0])
+            if "processor cores" in line:
+                # "Parallel version (MPI & OpenMP), running on 16 processor cores"
+                parallel_info["cores"] = num
+            else:
+                # "Parallel version (MPI), running on 4 processors"
+                parallel_info["mpi_processes"] = num
+        elif "Number of MPI processes:" in line:
+            parallel_info["mpi_processes"] = int(regex.findall(r"\d+", line)[0])
+        elif "Threads/MPI process:" in line:
+            parallel_info["threads"] = int(regex.findall(r"\d+", line)[0])
+        elif "K-points division:" in line and "npool" in line:
+            parallel_info["npool"] = int(regex.findall(r"\d+", line)[-1])
+        elif "MPI processes distributed on" in line:
+            parallel_info["nodes"] = int(regex.findall(r"\d+", line)[0])
+    if "cores" not in parallel_info:
+        parallel_info["cores"] = (
+            parallel_info["mpi_processes"] * parallel_info["threads"]
+        )
+    timing = np.array(
+        rows,
+        dtype=[
+            ("routine", "U32"), ("group", "U32"), ("cpu", float),
+            ("wall", float), ("calls", int)
+        ]
+    )
+    return(timing, parallel_info)
+
+
+def compare_timings(paths, reference=0, threshold=0.8, routines=None):
+    """
+    ++--------------------------------------------------------------------------
+    +   Compare the clock tables of many pw.x runs, e.g. the same system on
+    +   different numbers of cores, to find routines that scale badly
+    +
+    +   paths (paths to pw.x output files)
+    +   reference (index of the run that the others are compared to)
+    +   threshold (parallel efficiency below which a routine is a regression)
+    +   routines (routines to compare, default the routines of all runs)
+    +
+    +   The parallel efficiency of a routine in run i is
+    +   wall_ref * cores_ref / (wall_i * cores_i)
+    +
+    +   return a dictionary with
+    +   paths, routines (nroutine), cores (nrun), cpu, wall, calls
+    +   (nrun x nroutine, NaN or 0 if missing), speedup and efficiency
+    +   (nrun x nroutine), regressions (list of (path, routine, efficiency))
+    ++--------------------------------------------------------------------------
+    """
+    tables = []
+    cores = np.zeros(len(paths), dtype=int)
+    for i, path in enumerate(paths):
+        timing, parallel_info = read_timing(path)
+        tables.append(timing)
+        cores[i] = parallel_info["cores"]
+
+    if routines is None:
+        routines = []
+        for timing in tables:
+            for routine in timing["routine"]:
+                if routine not in routines:
+                    routines.append(routine)
+    routines = np.asarray(routines)
+
+    shape = (len(paths), routines.shape[0])
+    cpu = np.full(shape, np.nan)
+    wall = np.full(shape, np.nan)
+    calls = np.zeros(shape, dtype=int)
+    for i, timing in enumerate(tables):
+        # the first appearance of a routine in the table
+        names, index = np.unique(timing["routine"], return_index=True)
+        position = np.searchsorted(names, routines)
+        position[position == names.shape[0]] = 0
+        exist = (names.shape[0] > 0) & (names[position] == routines)
+        cpu[i, exist] = timing["cpu"][index[position[exist]]]
+        wall[i, exist] = timing["wall"][index[position[exist]]]
+        calls[i, exist] = timing["calls"][index[position[exist]]]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speedup = wall[reference] / wall
+        efficiency = speedup * cores[reference] / cores[:, None]
+
+    regressions = []
+    for i, j in zip(*np.nonzero(efficiency < threshold)):
+        regressions.append((paths[i], str(routines[j]), float(efficiency[i, j])))
+    regressions.sort(key=lambda item: item[2])
+
+    return {
+        "paths": list(paths), "routines": routines, "cores": cores,
+        "cpu": cpu, "wall": wall, "calls": calls,
+        "speedup": speedup, "efficiency": efficiency,
+        "regressions": regressions
+    }
+
+
+def read_scf_history(source, prof=None):
+    """
+    ++--------------------------------------------------------------------------
+    +   Read every scf iteration of a pw.x output in one pass
+    +
+    +        iteration #  3     ecut=    30.00 Ry     beta= 0.70
+    +        ...
+    +        total cpu time spent up to now is        1.2 secs
+    +        total energy              =     -31.60457383 Ry
+    +        estimated scf accuracy    <       0.00012345 Ry
+    +        total magnetization       =     2.00 Bohr mag/cell
+    +        absolute magnetization    =     2.05 Bohr mag/cell
+    +
+    +   The converged iteration prints its energy on the "!" line after
+    +   "End of self-consistent calculation", which is also read. A new scf
+    +   cycle (ionic step or EXX step) starts when "iteration #" goes back.
+    +
+    +   source (path to pw.x output file or list of lines)
+    +   prof (profiler counting the regex calls, see profiler.counting)
+    +
+    +   return(history, offsets)
+    +   history (structured array of all iterations with fields iteration,
+    +   energy (eV), accuracy (eV), magnetization (Bohr mag/cell, 3 components
+    +   if noncollinear), absolute_magnetization (Bohr mag/cell) and
+    +   cpu_time (s), nan if not printed)
+    +   offsets (scf cycle i is history[offsets[i]:offsets[i+1]])
+    ++--------------------------------------------------------------------------
+    """
+    pattern_number = counting(prof, _pattern_number)
+    # physical constants
+    Ry2eV = 13.605693122994 # Rydberg constant in eV
+
+    iteration = []
+    energy = []
+    accuracy = []
+    magnet = []
+    abs_magnet = []
+    cpu_time = []
+    offsets = [0]
+    last_iteration = 0
+    for line in _iter_lines(source):
+        if "iteration #" in line:
+            num = int(line.split("#")[1].split()[0])
+            if num <= last_iteration:
+                offsets.append(len(iteration))
+            last_iteration = num
+            iteration.append(num)
+            energy.append(np.nan)
+            accuracy.append(np.nan)
+            magnet.append([])
+            abs_magnet.append(np.nan)
+            cpu_time.append(np.nan)
+        elif not iteration:
             continue
-        elif "AVERAGE      :" in line:
-            break
-        elif found_vac and line.strip():
-            z.append(float(re.findall(r"[+-]?\d+\.\d*", line)[0]))
-            vac.append(float(re.findall(r"[+-]?\d+\.\d*", line)[1]))
-        elif found_vac and not line.strip():
+        elif "total cpu time spent up to now" in line:
+            cpu_time[-1] = float(pattern_number.findall(line)[0])
+        elif (
+            line.lstrip(" !").startswith("total energy") and "=" in line
+            and "!!" not in line
+        ):
+            energy[-1] = float(pattern_number.findall(line)[0]) * Ry2eV
+        elif "estimated scf accuracy" in line:
+            accuracy[-1] = float(
+                pattern_number.findall(line)[0].replace("D", "E")
+            ) * Ry2eV
+        elif "total magnetization" in line:
+            magnet[-1] = pattern_number.findall(line.split("=")[1])
+        elif "absolute magnetization" in line:
+            abs_magnet[-1] = float(pattern_number.findall(line)[0])
+    if iteration:
+        offsets.append(len(iteration))
+
+    ncomp = max([len(m) for m in magnet], default=0)
+    dtype = [
+        ("iteration", int), ("energy", float), ("accuracy", float),
+        ("magnetization", float) if ncomp < 3 else ("magnetization", float, 3),
+        ("absolute_magnetization", float), ("cpu_time", float)
+    ]
+    history = np.empty(len(iteration), dtype=dtype)
+    history["iteration"] = iteration
+    history["energy"] = energy
+    history["accuracy"] = accuracy
+    history["absolute_magnetization"] = abs_magnet
+    history["cpu_time"] = cpu_time
+    history["magnetization"] = np.nan
+    for i, m in enumerate(magnet):
+        if m:
+            history["magnetization"][i] = m if ncomp == 3 else m[0]
+    return(history, np.asarray(offsets))
+
+
+# charge and magnetic moment of a site, e.g.
+#      atom:    1    charge:    4.5891    magn:   -0.0004    constr:    0.0000
+#      atom   1 (R=0.190)  charge=  4.5891  magn= -0.0004
+#      charge :     4.589100
+#      magnetization :     0.000000    0.000000   -0.000400
+_pattern_site_charge = re.compile(r"(?<!/)charge\s*[:=]\s*([+-]?\d+\.\d*)")
+_pattern_site_magnet = re.compile(
+    r"magn(?:etization)?\s*[:=]((?:\s*[+-]?\d+\.\d*){1,3})"
+)
+
+
+def read_charge_magnet_history(source, nat, prof=None):
+    """
+    ++--------------------------------------------------------------------------
+    +   Read the charge and magnetic moment per site of every scf cycle
+    +   (ionic step) of a pw.x output in one pass. pw.x prints them at each
+    +   scf iteration, the last block before "End of self-consistent
+    +   calculation" is kept. Both the collinear block
+    +
+    +        Magnetic moment per site:
+    +        atom:    1    charge:    4.5891    magn:   -0.0004    constr: ...
+    +
+    +   and the noncollinear blocks
+    +
+    +        atom    1 relative position :     0.0000    0.0000    0.0000
+    +        charge :     4.589100
+    +        magnetization :     0.000000    0.000000   -0.000400
+    +
+    +   are read, each block is converted by a single regex call
+    +
+    +   source (path to pw.x output file or list of lines)
+    +   nat (number of atoms)
+    +   prof (profiler counting the regex calls, see profiler.counting)
+    +
+    +   return(charge, magnet)
+    +   charge (charge per site, (nstep x nat), nan if not printed)
+    +   magnet (magnetic moment per site, (nstep x nat), or (nstep x nat x 3)
+    +   if noncollinear, nan if not printed)
+    ++--------------------------------------------------------------------------
+    """
+    pattern_number = counting(prof, _pattern_number)
+    pattern_site_charge = counting(prof, _pattern_site_charge)
+    pattern_site_magnet = counting(prof, _pattern_site_magnet)
+    blocks = [] # the last block of each scf cycle
+    block = None # the last block of the current scf cycle
+    remaining = 0 # lines left in a "Magnetic moment per site" block
+    for line in _iter_lines(source):
+        if remaining > 0:
+            block.append(line)
+            remaining -= 1
+        elif "Magnetic moment per site" in line:
+            block = []
+            remaining = nat
+        elif "relative position" in line:
+            if int(pattern_number.findall(line)[0]) == 1:
+                block = []
+        elif block is not None and (
+            "charge :" in line or "magnetization :" in line
+        ):
+            block.append(line)
+        elif "End of self-consistent calculation" in line:
+            blocks.append(block)
+            block = None
+
+    nstep = len(blocks)
+    charge = np.full((nstep, nat), np.nan)
+    magnets = [None] * nstep
+    ncomp = 1
+    for i, block in enumerate(blocks):
+        if not block:
             continue
-    
+        text = "".join(block)
+        values = np.asarray(pattern_site_charge.findall(text), dtype=float)
+        if values.shape[0] == nat:
+            charge[i] = values
+        values = np.asarray(
+            " ".join(pattern_site_magnet.findall(text)).split(), dtype=float
+        )
+        if values.shape[0] in (nat, 3 * nat):
+            ncomp = values.shape[0] // nat
+            magnets[i] = values
+    if ncomp == 1:
+        magnet = np.full((nstep, nat), np.nan)
+    else:
+        magnet = np.full((nstep, nat, 3), np.nan)
+    for i, values in enumerate(magnets):
+        if values is not None and values.shape[0] == magnet[i].size:
+            magnet[i] = values.reshape(magnet.shape[1:])
+    return(charge, magnet)
+
+
+def read_forces_history(source, nat, prof=None):
+    """
+    ++--------------------------------------------------------------------------
+    +   Read the forces and stress of every scf cycle (ionic step) of a pw.x
+    +   output in one pass
+    +
+    +        Forces acting on atoms (cartesian axes, Ry/au):
+    +
+    +        atom    1 type  1   force =    -0.00123456    0.00012345    0.0...
+    +        ...
+    +        Total force =     0.002349     Total SCF correction =     0.000032
+    +        ...
+    +             total   stress  (Ry/bohr**3)                (kbar)     P=   -1.23
+    +     -0.00000123   0.00000000   0.00000000         -0.18        0.00   0.00
+    +
+    +   Each block is converted by a single regex call. The blocks printed
+    +   after the k-th "End of self-consistent calculation" are in row k-1.
+    +
+    +   source (path to pw.x output file or list of lines)
+    +   nat (number of atoms)
+    +   prof (profiler counting the regex calls, see profiler.counting)
+    +
+    +   return(forces, total_force, max_force, stress, pressure)
+    +   forces (forces acting on atoms, Ry/au, (nstep x nat x 3))
+    +   total_force (total force, Ry/au, (nstep))
+    +   max_force (largest absolute force component, Ry/au, (nstep))
+    +   stress (stress tensor, kbar, (nstep x 3 x 3))
+    +   pressure (pressure, kbar, (nstep))
+    +   nan where a block is not printed
+    ++--------------------------------------------------------------------------
+    """
+    pattern_number = counting(prof, _pattern_number)
+    force_blocks = {}
+    stress_blocks = {}
+    total_force = {}
+    pressure = {}
+    step = -1
+    block = None
+    remaining_forces = 0
+    remaining_stress = 0
+    for line in _iter_lines(source):
+        if remaining_forces > 0:
+            if "force =" in line:
+                block.append(line)
+                remaining_forces -= 1
+        elif remaining_stress > 0:
+            block.append(line)
+            remaining_stress -= 1
+        elif "End of self-consistent calculation" in line:
+            step += 1
+        elif step < 0:
+            continue
+        elif "Forces acting on atoms" in line:
+            block = force_blocks[step] = []
+            remaining_forces = nat
+        elif "Total force" in line:
+            total_force[step] = float(pattern_number.findall(line)[0])
+        elif "total   stress" in line:
+            pressure[step] = float(pattern_number.findall(line.split("P=")[1])[0])
+            block = stress_blocks[step] = []
+            remaining_stress = 3
+
+    nstep = step + 1
+    forces = np.full((nstep, nat, 3), np.nan)
+    stress = np.full((nstep, 3, 3), np.nan)
+    for i, block in force_blocks.items():
+        if len(block) == nat:
+            # atom, type, and 3 force components
+            forces[i] = np.asarray(
+                pattern_number.findall("".join(block)), dtype=float
+            ).reshape(nat, 5)[:, 2:]
+    for i, block in stress_blocks.items():
+        if len(block) == 3:
+            # 3 components in Ry/bohr**3 followed by 3 components in kbar
+            stress[i] = np.asarray(
+                pattern_number.findall("".join(block)), dtype=float
+            ).reshape(3, 6)[:, 3:]
+    total_force = np.array([total_force.get(i, np.nan) for i in range(nstep)])
+    pressure = np.array([pressure.get(i, np.nan) for i in range(nstep)])
+    if nstep > 0:
+        max_force = np.max(np.abs(forces), axis=(1, 2))
+    else:
+        max_force = np.zeros(0)
+    return(forces, total_force, max_force, stress, pressure)
+
+
+def read_fermi(source, prof=None):
+    """
+    ++--------------------------------------------------------------------------
+    +   Read the last Fermi energy or band edges printed by pw.x
+    +
+    +        the Fermi energy is     5.1234 ev
+    +        the spin up/dw Fermi energies are     5.1234    5.2345 ev
+    +        highest occupied, lowest unoccupied level (ev):    -1.2345   0.5432
+    +        highest occupied level (ev):    -1.2345
+    +
+    +   source (path to pw.x output file or list of lines)
+    +   prof (profiler counting the regex calls, see profiler.counting)
+    +
+    +   return(fermi, homo, lumo)
+    +   fermi (Fermi energy, eV, the higher one of spin up and down; nan
+    +   without smearing)
+    +   homo, lumo (highest occupied and lowest unoccupied levels, eV; nan
+    +   with smearing or if not printed)
+    ++--------------------------------------------------------------------------
+    """
+    pattern_number = counting(prof, _pattern_number)
+    fermi = homo = lumo = np.nan
+    for line in _iter_lines(source):
+        if "Fermi energ" in line:
+            fermi = max(float(x) for x in pattern_number.findall(line))
+        elif "highest occupied, lowest unoccupied level" in line:
+            homo, lumo = (
+                float(x) for x in pattern_number.findall(line.split(":")[1])
+            )
+        elif "highest occupied level" in line:
+            homo = float(pattern_number.findall(line.split(":")[1])[0])
+    return(fermi, homo, lumo)
+
+
+def read_avg(source):
+    """
+    ++--------------------------------------------------------------------------
+    +   Read the planar (and macroscopic) averages written by average.x,
+    +   either avg.dat or the output of average.x, where they follow
+    +   "Reading data from file ..." and stop at "AVERAGE :"
+    +   All numbers are converted at once.
+    +
+    +   source (path to the file or list of lines)
+    +
+    +   return(z, planar, macroscopic)
+    +   z (positions along the averaging axis, angstrom)
+    +   planar (planar average, eV)
+    +   macroscopic (macroscopic average, eV; None if not in the file)
+    ++--------------------------------------------------------------------------
+    """
     # physical constants
-    Bohr = 5.29177210903e-11 # unit m
-    Bohr2Ang = Bohr/1e-10
-    Ry = 2.1798723611035e-18 # Rydberg in Joules
+    Bohr2Ang = 0.529177210903
     Ry2eV = 13.605693122994 # Rydberg constant in eV
 
-    z = np.asarray(z) * Bohr2Ang
-    vac = np.asarray(vac) * Ry2eV
+    rows = []
+    found_data = False
+    for line in _iter_lines(source):
+        if "Reading data from file" in line:
+            if not found_data:
+                # anything numeric before is not the averages
+                rows = []
+            found_data = True
+        elif _pattern_average.match(line):
+            break
+        elif _pattern_data_row.match(line):
+            rows.append(line)
+    if not rows:
+        raise ValueError("No averages are found in {}".format(source))
+    ncol = len(rows[0].split())
+    data = np.array(
+        " ".join(rows).replace("D", "E").split(), dtype=float
+    ).reshape(-1, ncol)
+    z = data[:, 0] * Bohr2Ang
+    planar = data[:, 1] * Ry2eV
+    macroscopic = data[:, 2] * Ry2eV if ncol > 2 else None
+    return(z, planar, macroscopic)
+
+
+def read_vac(dir_f=".avg.out"):
+    """
+    ++--------------------------------------------------------------------------
+    +   Read electrostatic potential file avg.out, see read_avg
+    +
+    +   return(z, vac)
+    +   z: positions in z of cell (angstrom)
+    +   vac: vacuum electrostatic potential (eV)
+    ++--------------------------------------------------------------------------
+    """
+    z, vac = read_avg(dir_f)[:2]
     return(z, vac)
 
+
+def vacuum_level(z, potential, window=None, flatness=0.02, width=2.0):
+    """
+    ++--------------------------------------------------------------------------
+    +   Detect the vacuum plateaus of a periodic potential (eV) along z
+    +   (angstrom, uniform grid)
+    +   window (widths of the macroscopic average windows, angstrom, see
+    +   read_volumetric.macroscopic_average; None if the potential is
+    +   already averaged)
+    +   A point is on a plateau if a window of width (angstrom) around it
+    +   varies by less than flatness (eV). Only the plateaus above the mean
+    +   potential of the cell are vacuum, the flat bulk of a slab is not.
+    +   With a dipole correction the vacuum has two plateaus at different
+    +   levels.
+    +
+    +   return(levels, bounds)
+    +   levels (mean potential of each plateau, eV, highest first)
+    +   bounds (z at the start and end of each plateau, angstrom, n x 2)
+    ++--------------------------------------------------------------------------
+    """
+    z = np.asarray(z, dtype=float)
+    potential = np.asarray(potential, dtype=float)
+    spacing = z[1] - z[0]
+    if window is not None:
+        potential = macroscopic_average(potential, spacing, window)
+    n = potential.shape[0]
+    m = min(max(2, int(round(width / spacing)) + 1), n)
+    # spread of the m points starting at each point, periodic
+    windows = np.lib.stride_tricks.sliding_window_view(
+        np.concatenate((potential, potential[:m-1])), m
+    )
+    flat = (np.amax(windows, axis=1) - np.amin(windows, axis=1)) <= flatness
+    if np.all(flat):
+        return(np.array([np.mean(potential)]), np.array([[z[0], z[-1]]]))
+    # a run of flat windows starting at a, ..., b - 1 is a plateau from a to
+    # b + m - 2; a step between two plateaus breaks the run. The runs are
+    # found after rolling the first window to a window which is not flat.
+    shift = int(np.argmin(flat))
+    edges = np.diff(
+        np.concatenate(([0], np.roll(flat, -shift).astype(int), [0]))
+    )
+    starts = np.nonzero(edges == 1)[0] + shift
+    ends = np.nonzero(edges == -1)[0] + shift + m - 1
+    levels = np.array(
+        [
+            np.mean(np.take(potential, np.arange(a, b), mode="wrap"))
+            for a, b in zip(starts, ends)
+        ]
+    )
+    bounds = np.column_stack((z[starts % n], z[(ends - 1) % n]))
+    # the bulk of a slab is also flat after the macroscopic average, but
+    # below the mean potential of the cell, unlike the vacuum
+    order = np.argsort(-levels)
+    order = order[levels[order] > np.mean(potential)]
+    return(levels[order], bounds[order])
+
+
+def work_functions(
+    avg_paths, pw_paths, window=None, flatness=0.02, width=2.0,
+    verbosity=True
+):
+    """
+    ++--------------------------------------------------------------------------
+    +   Work functions and band edges relative to the vacuum of a series of
+    +   slabs, e.g. of increasing thickness
+    +   avg_paths (average.x outputs or avg.dat of the electrostatic
+    +   potential, one per slab)
+    +   pw_paths (pw.x outputs with the Fermi energy or band edges, one per
+    +   slab)
+    +   window, flatness, width (see vacuum_level; without window, the
+    +   macroscopic average of the file is used if there is one)
+    +
+    +   return(results)
+    +   results (structured array, one row per slab, with fields avg, pw,
+    +   vacuum (highest plateau, eV), vacuum_2 (second plateau if a dipole
+    +   correction splits the vacuum, else nan), fermi (eV),
+    +   work_function = vacuum - fermi (the highest occupied level replaces
+    +   the Fermi energy without smearing), vbm and cbm (highest occupied
+    +   and lowest unoccupied levels relative to the vacuum, eV))
+    ++--------------------------------------------------------------------------
+    """
+    results = np.zeros(
+        len(avg_paths),
+        dtype=[
+            ("avg", "U256"), ("pw", "U256"), ("vacuum", float),
+            ("vacuum_2", float), ("fermi", float), ("work_function", float),
+            ("vbm", float), ("cbm", float)
+        ]
+    )
+    for row, avg_path, pw_path in zip(results, avg_paths, pw_paths):
+        z, planar, macroscopic = read_avg(avg_path)
+        if window is None and macroscopic is not None:
+            levels = vacuum_level(z, macroscopic, None, flatness, width)[0]
+        else:
+            levels = vacuum_level(z, planar, window, flatness, width)[0]
+        fermi, homo, lumo = read_fermi(pw_path)
+        vacuum = levels[0] if len(levels) else np.nan
+        row["avg"] = avg_path
+        row["pw"] = pw_path
+        row["vacuum"] = vacuum
+        row["vacuum_2"] = levels[1] if len(levels) > 1 else np.nan
+        row["fermi"] = fermi
+        row["work_function"] = vacuum - (homo if np.isnan(fermi) else fermi)
+        row["vbm"] = homo - vacuum
+        row["cbm"] = lumo - vacuum
+    if verbosity:
+        print(
+            "{:>30} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+                "pw.x output", "vacuum", "fermi", "W", "VBM", "CBM"
+            )
+        )
+        for row in results:
+            print(
+                "{:>30} {:10.4f} {:10.4f} {:10.4f} {:10.4f} {:10.4f}".format(
+                    os.path.basename(row["pw"]), row["vacuum"], row["fermi"],
+                    row["work_function"], row["vbm"], row["cbm"]
+                )
+            )
+    return(results)
+
 #------------------------------------------------------------------------------#
 #------------------------------------------------------------------------------#
 #------------------------------------------------------------------------------#
@@ -939,9 +1704,18 @@ def read_vac(dir_f=".avg.out"):
 #------------------------------------------------------------------------------#
     
 class band_out_and_band_dat(object):
-    def __init__(self, dir_dat="bands.dat", dir_out="bands.out"):
-        bands_dat = open(dir_dat, "r")
-        self.dat_lines = bands_dat.readlines()
+    def __init__(self, dir_dat="bands.dat", dir_out="bands.out", profile=None):
+        self._profiler = profiler(profile)
+        self.profile_stats = self._profiler.stats
+        with self._profiler.stage("read_file"):
+            bands_dat = open(dir_dat, "r")
+            self.dat_lines = bands_dat.readlines()
+            bands_out = open(dir_out, "r")
+            self.out_lines = bands_out.readlines()
+            self._profiler.count(
+                lines=len(self.dat_lines) + len(self.out_lines),
+                bytes_read=os.path.getsize(dir_dat) + os.path.getsize(dir_out)
+            )
         self.nbnd = int(
             re.findall(r"[+-]?\d+\.\d*|[+-]?\d+", self.dat_lines[0])[0]
         )
@@ -949,8 +1723,6 @@ class band_out_and_band_dat(object):
             re.findall(r"[+-]?\d+\.\d*|[+-]?\d+", self.dat_lines[0])[1]
         )
 
-        bands_out = open(dir_out, "r")
-        self.out_lines = bands_out.readlines()
         self.num_hsymmpts = 0 # number of high symmetry points
         for line in self.out_lines:
             if "high-symmetry point: " in line:
@@ -975,7 +1747,10 @@ class band_out_and_band_dat(object):
         
         # call all the dynamic methods
         self.read_bands_kpts()
+        if self._profiler.log:
+            self._profiler.report(dir_dat)
     
+    @profiled
     def read_bands_kpts(self):
         """
         ++----------------------------------------------------------------------
@@ -1070,6 +1845,7 @@ class qe_bands(object):
     ++--------------------------------------------------------------------------
     +   Input: path to Quantum Espresso pw.x output file
     +   specifically, nscf_for_bands.out. calculation='bands'
+    +   profile (True, "log" or None to follow QE_POST_PROFILE, see profiler.py)
     ++--------------------------------------------------------------------------
     +   1. Constructor
     +   Attributes:
@@ -1094,6 +1870,7 @@ class qe_bands(object):
     +   self.kpts_cryst_coord (k points in crystal coordinates)
     +   self.spinpol (is spin polarization?)
     +   self.soc (is spin-orbit coupling?)
+    +   self.profile_stats (time, lines, regex calls and bytes of each method)
     +
     +   No return
     ++--------------------------------------------------------------------------
@@ -1104,7 +1881,7 @@ class qe_bands(object):
     +   No return
     ++--------------------------------------------------------------------------
     """
-    def __init__(self, path, verbosity=True):
+    def __init__(self, path, verbosity=True, profile=None):
         """
         init method or constructor for initialization
         read information in qe output file like scf.out and relax.out
@@ -1125,7 +1902,58 @@ class qe_bands(object):
             raise IOError("Fail to open {}".format("QE output file"))
             
 
-        self.lines = qe_output.readlines()
+        self._profiler = profiler(profile)
+        self.profile_stats = self._profiler.stats
+        with self._profiler.stage("read_file"):
+            self.lines = qe_output.readlines()
+            self._profiler.count(
+                lines=len(self.lines),
+                bytes_read=os.path.getsize(qe_output.name)
+            )
+        self.read_header()
+
+        self.verbosity = verbosity
+        if verbosity:
+            print("\rQuantum Espresso bands.x")
+            print("Atomic species: {}".format(self.atomic_species))
+            print("Number of atoms: {}".format(str(self.nat)))
+            print("Number of atomic types: {}".format(str(self.ntyp)))
+            print(
+                "Number of K points in irreducible Brilloin zone: {}"
+                .format(str(self.nk))
+            )
+            print("Number of bands: {}".format(str(self.nbnd)))
+            print(
+                "Kinetic-energy cutoff (ecutwfc): {} Ry"
+                .format(str(self.ecutwfc))
+            )
+            print("Spin polarization: {}".format(self.spinpol))
+            print("Spin-orbit coupling: {}".format(self.soc))
+
+            if self.spinpol and self.up_ne != 0:
+                print(
+                    "Number of electrons: {} (up: {}, down: {})"
+                    .format(str(self.ne), str(self.up_ne), str(self.dn_ne))
+                )
+            elif self.spinpol and self.up_ne == 0:
+                print(
+                    "Number of electrons: {} (Input has no 'nspin=2')"
+                    .format(str(self.ne))
+                )
+            else:
+                print("Number of electrons: {}".format(str(self.ne)))
+        if self._profiler.log:
+            self._profiler.report(path)
+
+    @profiled
+    def read_header(self):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads the size of the system, the cell and the k
+        +   points, called by the constructor
+        ++----------------------------------------------------------------------
+        """
+        regex = counting(self._profiler, re)
         self.atomic_species = {}
         self.up_ne = 0
         self.dn_ne = 0
@@ -1137,27 +1965,27 @@ class qe_bands(object):
 
         for i, line in enumerate(self.lines):
             if "number of atoms/cell" in line:
-                self.nat = int(re.findall(r"[+-]?\d+", line)[0])
+                self.nat = int(regex.findall(r"[+-]?\d+", line)[0])
             if "number of atomic types" in line:
-                self.ntyp = int(re.findall(r"[+-]?\d+", line)[0])
+                self.ntyp = int(regex.findall(r"[+-]?\d+", line)[0])
             if "number of electrons" in line:
-                self.ne = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
+                self.ne = float(regex.findall(r"[+-]?\d+\.\d*", line)[0])
                 if "up:" in line and "down:" in line:
                     self.spinpol = True # spin polarization
-                    self.up_ne = float(re.findall(r"[+-]?\d+\.\d*", line)[1])
-                    self.dn_ne = float(re.findall(r"[+-]?\d+\.\d*", line)[2])
+                    self.up_ne = float(regex.findall(r"[+-]?\d+\.\d*", line)[1])
+                    self.dn_ne = float(regex.findall(r"[+-]?\d+\.\d*", line)[2])
                 else:
                     self.spinpol = False
             if "number of Kohn-Sham states" in line:
-                self.nbnd = int(re.findall(r"[+-]?\d+", line)[0])
+                self.nbnd = int(regex.findall(r"[+-]?\d+", line)[0])
             if "kinetic-energy cutoff" in line:
-                self.ecutwfc = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
+                self.ecutwfc = float(regex.findall(r"[+-]?\d+\.\d*", line)[0])
             if "mixing beta" in line:
-                self.mixing_beta = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
+                self.mixing_beta = float(regex.findall(r"[+-]?\d+\.\d*", line)[0])
             if "Exchange-correlation" in line:
-                self.xc_functional = re.search(r"PBE0|PBE|HSE|.", line).group(0)
+                self.xc_functional = _xc_functional(line)
             if "EXX-fraction" in line:
-                self.exx_fraction = float(re.findall(r"[+-]?\d+\.\d*", line)[0])
+                self.exx_fraction = float(regex.findall(r"[+-]?\d+\.\d*", line)[0])
             if "spin-orbit" in line:
                 self.soc = True
             if "celldm(1)" in line:
@@ -1165,36 +1993,35 @@ class qe_bands(object):
                 self.cryst_axes = np.zeros((3, 3))
                 self.R_axes = np.zeros((3, 3))
                 celldm1 = (
-                    float(re.findall(r"[+-]?\d+\.\d*", line)[0]) * Bohr2Ang
+                    float(regex.findall(r"[+-]?\d+\.\d*", line)[0]) * Bohr2Ang
                 )
                 for j in range(3):
-                    self.cryst_axes[j, :] = re.findall(
+                    self.cryst_axes[j, :] = regex.findall(
                         r"[+-]?\d+\.\d*", self.lines[i+4+j]
                     )
-                    self.R_axes[j, :] = re.findall(
+                    self.R_axes[j, :] = regex.findall(
                         r"[+-]?\d+\.\d*", self.lines[i+9+j]
                     )
                 self.cell_parameters = self.cryst_axes * celldm1
-                self.R_axes = self.R_axes / celldm1
             if "atomic species   valence    mass" in line:
                 temp = self.lines[i+1:i+self.ntyp+1]
                 for j in range(self.ntyp):
                     temp[j] = temp[j].strip("\n").split()
                     self.atomic_species.update({temp[j][0]: float(temp[j][2])})
             if "number of k points" in line:
-                self.nk = int(re.findall(r"[+-]?\d+", line)[0])
+                self.nk = int(regex.findall(r"[+-]?\d+", line)[0])
                 self.kpts_cart_coord = np.zeros((self.nk, 3))
                 self.kpts_cryst_coord = np.zeros((self.nk, 3))
                 if "cart. coord." in self.lines[i+1]:
                     for j in range(self.nk):
                         self.kpts_cart_coord[j, :] = np.array(
-                            re.findall(r"[+-]?\d+\.\d*", self.lines[i+j+2])[0:3]
+                            regex.findall(r"[+-]?\d+\.\d*", self.lines[i+j+2])[0:3]
                         ).astype(float)
                 if "cryst. coord." in self.lines[i+self.nk+3]:
                     # exist only when being verbosity
                     for j in range(self.nk):
                         self.kpts_cryst_coord[j, :] = np.array(
-                            re.findall(
+                            regex.findall(
                                 r"[+-]?\d+\.\d*", self.lines[i+j+4+self.nk]
                             )[0:3]
                         ).astype(float)
@@ -1210,39 +2037,9 @@ class qe_bands(object):
                     )
             if "SPIN" in line:
                 self.spinpol = True
-        
-        self.verbosity = verbosity
-        if verbosity:
-            print("\rQuantum Espresso bands.x")
-            print("Atomic species: {}".format(self.atomic_species))
-            print("Number of atoms: {}".format(str(self.nat)))
-            print("Number of atomic types: {}".format(str(self.ntyp)))
-            print(
-                "Number of K points in irreducible Brilloin zone: {}"
-                .format(str(self.nk))
-            )
-            print("Number of bands: {}".format(str(self.nbnd)))
-            print(
-                "Kinetic-energy cutoff (ecutwfc): {} Ry"
-                .format(str(self.ecutwfc))
-            )
-            print("Spin polarization: {}".format(self.spinpol))
-            print("Spin-orbit coupling: {}".format(self.soc))
-
-            if self.spinpol and self.up_ne != 0:
-                print(
-                    "Number of electrons: {} (up: {}, down: {})"
-                    .format(str(self.ne), str(self.up_ne), str(self.dn_ne))
-                )
-            elif self.spinpol and self.up_ne == 0:
-                print(
-                    "Number of electrons: {} (Input has no 'nspin=2')"
-                    .format(str(self.ne))
-                )
-            else:
-                print("Number of electrons: {}".format(str(self.ne)))
 
 
+    @profiled
     def read_eigenenergies(self):
         """
         ++----------------------------------------------------------------------
@@ -1271,6 +2068,7 @@ class qe_bands(object):
         +
         ++----------------------------------------------------------------------
         """
+        regex = counting(self._profiler, re)
         if self.spinpol:
             # In this case, self.eigenE[0:self.nk, :] are spin up eigenenergies,
             # self.eigenE[self.nk:self.nk*2, :] are spin down eigenenergies
@@ -1297,16 +2095,16 @@ class qe_bands(object):
                 temp_E = self.lines[i+2 : i+2+rows]
                 for j in range(rows):
                     if int_multi_8:
-                        self.eigenE[k_counted, j*8:(j+1)*8] = re.findall(
+                        self.eigenE[k_counted, j*8:(j+1)*8] = regex.findall(
                                 "[+-]?\d+\.\d*", temp_E[j]
                         )
                     else:
                         if j < rows -1:
-                            self.eigenE[k_counted, j*8:(j+1)*8] = re.findall(
+                            self.eigenE[k_counted, j*8:(j+1)*8] = regex.findall(
                                 "[+-]?\d+\.\d*", temp_E[j]
                             )
                         else:
-                            self.eigenE[k_counted, j*8:j*8+modulo] = re.findall(
+                            self.eigenE[k_counted, j*8:j*8+modulo] = regex.findall(
                                 "[+-]?\d+\.\d*", temp_E[j]
                             )
                 k_counted += 1
@@ -1329,17 +2127,42 @@ class read_pdos(object):
     ++--------------------------------------------------------------------------
     +   Input: path to Quantum Espresso pp.x output file
     +   specifically, pdos.out.
+    +   profile (True, "log" or None to follow QE_POST_PROFILE, see profiler.py)
     ++--------------------------------------------------------------------------
     +   1. Constructor
     +   Attributes:
-    +   self.lines (lines in the file)
+    +   self.path (path to the file)
+    +   self.lines (lines in the file without the projection blocks)
     +   self.nat (number of atoms)
     +   self.ntyp (number of atomic types)
+    +   self.profile_stats (time, lines, regex calls and bytes of each method)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   2. Method read_projections(self, sparse=None, max_density=0.1)
+    +   Attributes:
+    +   self.proj_nk (number of k points, doubled if spin polarized)
+    +   self.proj_nbnd (number of bands)
+    +   self.proj_eigenE (eigenenergies, eV, (nk x nbnd))
+    +   self.proj_psi2 (|psi|^2 of each band, (nk x nbnd))
+    +   self.projections (projections of bands on atomic states,
+    +   (nk x nbnd x nstates) array or sparse (nk*nbnd x nstates) matrix; by
+    +   default sparse while less than max_density, 10 %, of the weights are
+    +   nonzero)
     +
     +   No return
     ++--------------------------------------------------------------------------
+    +   3. Method aggregate_projections(self, by="species")
+    +
+    +   return(labels, weights)
+    ++--------------------------------------------------------------------------
+    +   4. Method read_pdos_files(self, directory=None, prefix=None,
+    +   by="species", atoms=None, l=None, max_workers=None)
+    +
+    +   return(energy, labels, pdos)
+    ++--------------------------------------------------------------------------
     """
-    def __init__(self, path, verbosity=True):
+    def __init__(self, path, verbosity=True, profile=None):
         """
         init method or constructor for initialization
         read information in qe post processing output file pdos.out
@@ -1348,14 +2171,31 @@ class read_pdos(object):
         if os.path.exists(path):
             if path.endswith(".out"):
                 is_pdos_out = True
-                pdos_out = open(path, "r")
+                self.path = path
             else:
-                pdos_out = open(os.path.join(path, sys.argv[1]), "r")
+                self.path = os.path.join(path, sys.argv[1])
                 is_pdos_out = True
         if not is_pdos_out:
             raise IOError("Fail to open {}".format("pdos.out"))
-        
-        self.lines = pdos_out.readlines()
+
+        # the projection blocks are most of the file, they are skipped here
+        # and read by self.read_projections() when needed
+        self._profiler = profiler(profile)
+        self.profile_stats = self._profiler.stats
+        self.lines = []
+        in_projections = False
+        with self._profiler.stage("read_file"):
+            with open(self.path, "r") as pdos_out:
+                for line in pdos_out:
+                    if line.startswith(" k = "):
+                        in_projections = True
+                    elif "Lowdin Charges" in line:
+                        in_projections = False
+                    if not in_projections:
+                        self.lines.append(line)
+            self._profiler.count(
+                lines=len(self.lines), bytes_read=os.path.getsize(self.path)
+            )
         self.soc = False
 
         # judge if SOC or not
@@ -1370,116 +2210,255 @@ class read_pdos(object):
         # call all the dynamic methods
         self.read_atomic_states()
         self.read_lowdin_charges()
+        if self._profiler.log:
+            self._profiler.report(path)
 
+    @profiled
     def read_atomic_states(self):
         """
         ++----------------------------------------------------------------------
         +   This method read the atomic states used for projection
-        +   all of the information is first saved in a list of dictionaries
+        +   each line "state #" is matched once by a precompiled pattern and
+        +   all of the information is saved in a structured array with fields
+        +   state, atom_num, atomic_species, wfc, l, m (or j, m_j if SOC)
         +   the atoms are then saved in an array for convenience
         ++----------------------------------------------------------------------
         """
-        self.atomic_states = []
-
+        regex = counting(self._profiler, re)
         if self.soc:
-            for i, line in enumerate(self.lines):
-                if "state #" in line:
-                    self.atomic_states.append(
-                        {
-                            "state": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[0]
-                            ),
-                            "atom_num": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[1]
-                            ),
-                            "atomic_species": re.findall("\(([^)]+)\)", line)[0],
-                            "wfc": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[2]
-                            ),
-                            "l": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[3]
-                            ),
-                            "j": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[4]
-                            ),
-                            "m_j": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[5]
-                            )
-                        }
-                    )
+            # state #   1: atom   1 (Mo ), wfc  1 (l=2 j=1.5 m_j=-1.5)
+            pattern = regex.compile(
+                r"state #\s*(\d+):\s*atom\s*(\d+)\s*\(\s*([^)\s]+)\s*\)\s*,"
+                r"\s*wfc\s*(\d+)\s*\(l=\s*(\d+)\s*j=\s*([+-]?\d+\.?\d*)"
+                r"\s*m_j=\s*([+-]?\d+\.?\d*)"
+            )
+            dtype = [
+                ("state", int), ("atom_num", int), ("atomic_species", "U4"),
+                ("wfc", int), ("l", int), ("j", float), ("m_j", float)
+            ]
         else:
-            for i, line in enumerate(self.lines):
-                if "state #" in line:
-                    self.atomic_states.append(
-                        {
-                            "state": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[0]
-                            ),
-                            "atom_num": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[1]
-                            ),
-                            "atomic_species": re.findall("\(([^)]+)\)", line)[0],
-                            "wfc": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[2]
-                            ),
-                            "l": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[3]
-                            ),
-                            "m": float(
-                                re.findall("[+-]?\d+\.\d*|\d+", line)[4]
-                            )
-                        }
-                    )
-        # determine the number of atoms by the last value of atom_num in atomic states
-        self.nat = self.atomic_states[-1]["atom_num"]
-
-        self.atoms = []
-        # remove duplicate atomic number in the dictionary and save the atoms
-        # in an array
-        temp = []
-        temp_dict = dict()
-        for i, item in enumerate(self.atomic_states):
-            val = item["atom_num"]
-            if val not in temp:
-                temp.append(val)
-                self.atoms.append(item["atomic_species"])
-        self.atoms = np.asarray(self.atoms)
+            # state #   1: atom   1 (Mo ), wfc  1 (l=0 m= 1)
+            pattern = regex.compile(
+                r"state #\s*(\d+):\s*atom\s*(\d+)\s*\(\s*([^)\s]+)\s*\)\s*,"
+                r"\s*wfc\s*(\d+)\s*\(l=\s*(\d+)\s*m=\s*(\d+)"
+            )
+            dtype = [
+                ("state", int), ("atom_num", int), ("atomic_species", "U4"),
+                ("wfc", int), ("l", int), ("m", int)
+            ]
+
+        states = []
+        for line in self.lines:
+            if "state #" in line:
+                match = pattern.search(line)
+                if match is not None:
+                    states.append(match.groups())
+        self.atomic_states = np.array(states, dtype=dtype)
+
+        # determine the number of atoms by the largest atom_num
+        self.nat = int(np.amax(self.atomic_states["atom_num"]))
+
+        # remove duplicate atomic number and save the atoms in an array
+        atom_num, index = np.unique(
+            self.atomic_states["atom_num"], return_index=True
+        )
+        self.atoms = self.atomic_states["atomic_species"][index]
 
+    @profiled
     def read_lowdin_charges(self):
         """
         ++----------------------------------------------------------------------
         +   This method read the Lowdin charges of all atoms without duplication
-        +   all of the information is first saved in a list of dictionaries
+        +   all of the information is first saved in a structured array with
+        +   fields atom_num and tot_charge
         +   the lowdin charges are then saved in an array for convenience
         ++----------------------------------------------------------------------
         """
-        self.dict_lowdin_charges = []
-        self.lowdin_charges = []
-        temp_dict_lowdin_charges = []
-        for i, line in enumerate(self.lines):
+        regex = counting(self._profiler, re)
+        # Atom #   1: total charge =   5.6839, s =  ...
+        pattern = regex.compile(
+            r"Atom #\s*(\d+):\s*total charge =\s*([+-]?\d+\.?\d*)"
+        )
+        charges = []
+        for line in self.lines:
             if "total charge =" in line:
-                temp_dict_lowdin_charges.append(
-                    {
-                        "atom_num": float(
-                            re.findall("[+-]?\d+\.\d*|\d+", line)[0]
-                        ),
-                        "tot_charge": float(
-                            re.findall("[+-]?\d+\.\d*|\d+", line)[1]
-                        )
-                    }
-                )
-        
-        # remove duplicate value in the dictionary and save the lowdin charges
-        # in an array
-        temp = []
-        temp_dict = dict()
-        for i, item in enumerate(temp_dict_lowdin_charges):
-            val = item["atom_num"]
-            if val not in temp:
-                temp.append(val)
-                self.dict_lowdin_charges.append(item)
-                self.lowdin_charges.append(item["tot_charge"])
-        self.lowdin_charges = np.asarray(self.lowdin_charges)
+                match = pattern.search(line)
+                if match is not None:
+                    charges.append(match.groups())
+        temp_dict_lowdin_charges = np.array(
+            charges, dtype=[("atom_num", int), ("tot_charge", float)]
+        )
+
+        # remove duplicate atomic number and keep the first appearance
+        atom_num, index = np.unique(
+            temp_dict_lowdin_charges["atom_num"], return_index=True
+        )
+        self.dict_lowdin_charges = temp_dict_lowdin_charges[np.sort(index)]
+        self.lowdin_charges = self.dict_lowdin_charges["tot_charge"]
+
+    @profiled
+    def read_projections(self, sparse=None, max_density=0.1):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads the projections of the Kohn-Sham states on the
+        +   atomic states, i.e. the blocks
+        +
+        +    k =   0.0000000000  0.0000000000  0.0000000000
+        +   ==== e(   1) =    -5.82150 eV ====
+        +        psi = 0.249*[#   1]+0.249*[#   5]+
+        +       |psi|^2 = 0.998
+        +
+        +   The file is read line by line in a single pass and the nonzero
+        +   weights are stored in compressed sparse rows as they are read, so
+        +   that outputs of several GB do not have to fit in memory as text.
+        +
+        +   sparse (True: keep the sparse matrix, False: dense array,
+        +   None: sparse only if the fraction of nonzero weights is smaller
+        +   than max_density, dense as soon as 10 % of the weights are nonzero
+        +   with the default max_density=0.1)
+        +   ____                           ____
+        +   |                                 |
+        +   :           projections           :
+        +   |____                         ____| (nk x nbnd x nstates)
+        +
+        ++----------------------------------------------------------------------
+        """
+        from array import array
+        import scipy.sparse
+        regex = counting(self._profiler, re)
+
+        nstates = len(self.atomic_states)
+        pattern_weight = regex.compile(r"([+-]?\d+\.\d*)\*\[#\s*(\d+)\]")
+        pattern_energy = regex.compile(r"[+-]?\d+\.\d*")
+
+        # compressed sparse rows, one row for each band at each k point
+        weights = array("f")
+        indices = array("i")
+        indptr = array("q", [0])
+        eigenE = array("d")
+        psi2 = array("d")
+        nbnd_per_k = []
+        band_texts = []
+
+        def flush_k():
+            # convert the projections of all bands at one k point at once
+            if not band_texts:
+                return
+            pairs = []
+            for text in band_texts:
+                temp = pattern_weight.findall(text)
+                pairs.extend(temp)
+                indptr.append(indptr[-1] + len(temp))
+            if pairs:
+                temp = np.array(pairs, dtype=float)
+                weights.frombytes(temp[:, 0].astype(np.float32).tobytes())
+                indices.frombytes((temp[:, 1] - 1).astype(np.int32).tobytes())
+            nbnd_per_k.append(len(band_texts))
+            band_texts.clear()
+
+        in_projections = False
+        with open(self.path, "r") as pdos_out:
+            for line in pdos_out:
+                if line.startswith(" k = "):
+                    flush_k()
+                    in_projections = True
+                elif not in_projections:
+                    continue
+                elif "psi =" in line and "|psi|^2" not in line:
+                    band_texts.append(line)
+                elif line.lstrip().startswith("+"):
+                    band_texts[-1] += line
+                elif "|psi|^2" in line:
+                    psi2.append(float(pattern_energy.findall(line)[-1]))
+                elif "e(" in line or line.lstrip().startswith("e ="):
+                    # "==== e(   1) =    -5.82150 eV ====" or "e = -5.8215 eV"
+                    eigenE.append(
+                        float(pattern_energy.findall(line.split("=", 1)[1])[0])
+                    )
+                elif "Lowdin Charges" in line:
+                    break
+        self._profiler.count(bytes_read=os.path.getsize(self.path))
+        flush_k()
+
+        if len(set(nbnd_per_k)) > 1:
+            raise ValueError("Number of bands changes between k points.")
+        self.proj_nk = len(nbnd_per_k)
+        self.proj_nbnd = nbnd_per_k[0] if nbnd_per_k else 0
+        shape = (self.proj_nk, self.proj_nbnd)
+        self.proj_eigenE = np.frombuffer(eigenE, dtype=float).reshape(shape)
+        self.proj_psi2 = np.frombuffer(psi2, dtype=float).reshape(shape)
+        self.projections = scipy.sparse.csr_matrix(
+            (
+                np.frombuffer(weights, dtype=np.float32),
+                np.frombuffer(indices, dtype=np.int32),
+                np.frombuffer(indptr, dtype=np.int64)
+            ),
+            shape=(self.proj_nk * self.proj_nbnd, nstates)
+        )
+        if sparse is None:
+            density = self.projections.nnz / max(
+                self.proj_nk * self.proj_nbnd * nstates, 1
+            )
+            sparse = density < max_density
+        if not sparse:
+            self.projections = self.projections.toarray().reshape(
+                self.proj_nk, self.proj_nbnd, nstates
+            )
+
+    @profiled
+    def aggregate_projections(self, by="species"):
+        """
+        ++----------------------------------------------------------------------
+        +   This method sums the projections over the atomic states of the
+        +   same group, should be called after self.read_projections()
+        +
+        +   by ("species", "atom", "l", "species_l", "atom_l" or "l_m")
+        +
+        +   return(labels, weights)
+        +   labels (label of each group)
+        +   weights (summed projections, (nk x nbnd x ngroups))
+        ++----------------------------------------------------------------------
+        """
+        import scipy.sparse
+        regex = counting(self._profiler, re)
+
+        species = self.atomic_states["atomic_species"]
+        atom_num = self.atomic_states["atom_num"]
+        l = self.atomic_states["l"]
+        if by == "species":
+            keys = species
+        elif by == "atom":
+            keys = atom_num
+        elif by == "l":
+            keys = l
+        elif by == "species_l":
+            keys = np.char.add(np.char.add(species, "_l"), l.astype(str))
+        elif by == "atom_l":
+            keys = np.char.add(np.char.add(atom_num.astype(str), "_l"), l.astype(str))
+        elif by == "l_m":
+            if self.soc:
+                second = self.atomic_states["m_j"].astype(str)
+            else:
+                second = self.atomic_states["m"].astype(str)
+            keys = np.char.add(np.char.add(l.astype(str), "_"), second)
+        else:
+            raise ValueError("Unknown group {}".format(by))
+
+        labels, group = np.unique(keys, return_inverse=True)
+        nstates = group.shape[0]
+        # matrix that maps the atomic states onto the groups
+        to_group = scipy.sparse.csr_matrix(
+            (np.ones(nstates), (np.arange(nstates), group)),
+            shape=(nstates, labels.shape[0])
+        )
+        if scipy.sparse.issparse(self.projections):
+            weights = np.asarray((self.projections @ to_group).todense())
+        else:
+            weights = np.asarray(
+                self.projections.reshape(-1, nstates) @ to_group
+            )
+        weights = weights.reshape(self.proj_nk, self.proj_nbnd, labels.shape[0])
+        return(labels, weights)
 
 
         # # Additionally read projection charge. Not used.
@@ -1488,17 +2467,182 @@ class read_pdos(object):
         #         if "total charge =" in line:
         #             self.atomic_states.append(
         #                 {
-        #                     "atom_num": re.findall("[+-]?\d+\.\d*|\d", f)[0],
-        #                     "tot_charge": re.findall("[+-]?\d+\.\d*|\d", f)[1],
+        #                     "atom_num": regex.findall("[+-]?\d+\.\d*|\d", f)[0],
+        #                     "tot_charge": regex.findall("[+-]?\d+\.\d*|\d", f)[1],
         #                     "proj_charge": {
-        #                         "l": re.findall("\,([^=#]+)\=", f)[0],
-        #                         "charge": re.findall("[+-]?\d+\.\d*|\d", f)[2]
+        #                         "l": regex.findall("\,([^=#]+)\=", f)[0],
+        #                         "charge": regex.findall("[+-]?\d+\.\d*|\d", f)[2]
         #                     },
         #                 }
         #             )
         
 
 
+    @profiled
+    def read_pdos_files(
+        self, directory=None, prefix=None, by="species", atoms=None, l=None,
+        max_workers=None
+    ):
+        """
+        ++----------------------------------------------------------------------
+        +   This method reads the files prefix.pdos_atm#N(El)_wfc#M(l) written
+        +   by projwfc.x and sums their local DOS by group on the fly, so that
+        +   only one array per group is kept in memory. The files are loaded in
+        +   a thread pool.
+        +
+        +   directory (directory of the files, default the one of pdos.out)
+        +   prefix (prefix of the files, default any)
+        +   by ("species", "atom", "l", "species_l" or "total")
+        +   atoms (QE atom numbers (from 1) to include, default all,
+        +   see atoms_in_sphere())
+        +   l (angular momentum or list of them to include, default all)
+        +   max_workers (number of threads)
+        +
+        +   The angular momentum of each file is taken from the atomic states
+        +   read by self.read_atomic_states().
+        +
+        +   return(energy, labels, pdos)
+        +   energy (energy grid, eV)
+        +   labels (label of each group)
+        +   pdos (summed local DOS, (ngroups x nE x nldos), nldos = 2 for
+        +   spin polarized calculations, 1 otherwise)
+        ++----------------------------------------------------------------------
+        """
+        import glob
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        regex = counting(self._profiler, re)
+
+        if directory is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+        if prefix is None:
+            prefix = "*"
+        pattern_fname = regex.compile(
+            r"\.pdos_atm#(\d+)\(([^)]+)\)_wfc#(\d+)\(([^)]+)\)$"
+        )
+        l_of_label = {"s": 0, "p": 1, "d": 2, "f": 3}
+        # angular momentum of each (atom, wfc) from the atomic states
+        l_of_wfc = dict(
+            zip(
+                zip(
+                    self.atomic_states["atom_num"].tolist(),
+                    self.atomic_states["wfc"].tolist()
+                ),
+                self.atomic_states["l"].tolist()
+            )
+        )
+        if atoms is not None:
+            atoms = set(int(atom) for atom in atoms)
+        if l is not None:
+            l = set(np.atleast_1d(l).astype(int))
+
+        # discover the files and their groups
+        tasks = []
+        for f in sorted(glob.glob(os.path.join(directory, prefix + ".pdos_atm#*"))):
+            match = pattern_fname.search(f)
+            if match is None:
+                continue
+            atom_num = int(match.group(1))
+            species = match.group(2).strip()
+            wfc = int(match.group(3))
+            wfc_l = l_of_wfc.get(
+                (atom_num, wfc), l_of_label.get(match.group(4)[0])
+            )
+            if atoms is not None and atom_num not in atoms:
+                continue
+            if l is not None and wfc_l not in l:
+                continue
+            if by == "species":
+                key = species
+            elif by == "atom":
+                key = atom_num
+            elif by == "l":
+                key = wfc_l
+            elif by == "species_l":
+                key = "{}_l{}".format(species, wfc_l)
+            elif by == "total":
+                key = "total"
+            else:
+                raise ValueError("Unknown group {}".format(by))
+            tasks.append((f, key))
+        if not tasks:
+            raise IOError("No pdos_atm files found in {}".format(directory))
+
+        energy = None
+        sums = {}
+
+        def add(result):
+            nonlocal energy
+            key, E, ldos = result
+            if energy is None:
+                energy = E
+            elif E.shape != energy.shape or not np.allclose(E, energy):
+                raise ValueError("Energy grids of pdos files are different.")
+            if key in sums:
+                sums[key] += ldos
+            else:
+                sums[key] = ldos
+
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        # keep a bounded number of files in flight to limit the memory
+        max_in_flight = 2 * max_workers
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            for f, key in tasks:
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        add(future.result())
+                pending.add(executor.submit(_load_pdos_file, f, key))
+            for future in pending:
+                add(future.result())
+        if self._profiler.enabled:
+            # the files are converted by np.fromstring in the threads
+            size = sum(os.path.getsize(f) for f, _ in tasks)
+            self._profiler.count(bytes_read=size, bytes_converted=size)
+
+        labels = sorted(sums)
+        pdos = np.stack([sums[key] for key in labels])
+        return(energy, np.asarray(labels), pdos)
+
+
+def _load_pdos_file(path, key):
+    """
+    ++--------------------------------------------------------------------------
+    +   Load a file prefix.pdos_atm#N(El)_wfc#M(l) and return its energy grid
+    +   and local DOS columns (ldos or ldosup, ldosdw)
+    ++--------------------------------------------------------------------------
+    """
+    with open(path, "r") as f:
+        header = f.readline()
+        body = f.read()
+    nldos = max(header.count("ldos"), 1)
+    ncol = len(body[:body.find("\n")].split())
+    data = np.fromstring(body, sep=" ").reshape(-1, ncol)
+    return(key, data[:, 0], data[:, 1:1+nldos])
+
+
+def atoms_in_sphere(atomic_pos_cart, cell_parameters, center, radius):
+    """
+    ++--------------------------------------------------------------------------
+    +   Find the atoms within a radius of a center (e.g. a defect), with the
+    +   minimum image convention of the periodic cell
+    +
+    +   atomic_pos_cart (atomic positions in cartesian coordinates, angstrom)
+    +   cell_parameters (cell parameters in cartesian coordinates, angstrom)
+    +
+    +   return QE atom numbers (from 1) for read_pdos.read_pdos_files()
+    ++--------------------------------------------------------------------------
+    """
+    displ_cryst = np.matmul(
+        np.asarray(atomic_pos_cart) - np.asarray(center),
+        np.linalg.inv(cell_parameters)
+    )
+    displ_cryst -= np.round(displ_cryst)
+    dist = np.linalg.norm(np.matmul(displ_cryst, cell_parameters), axis=1)
+    return np.nonzero(dist < radius)[0] + 1
+
+
 #------------------------------------------------------------------------------#
 #------------------------------------------------------------------------------#
 #------------------------------------------------------------------------------#
@@ -1564,6 +2708,12 @@ if __name__ == "__main__":
         np.savetxt(output_file, inp, "%s")
         output_file.close()
 
+    if "work_function" in sys.argv:
+        # avg.out of average.x in the same directory
+        work_functions(
+            [os.path.join(cwd, "avg.out")], [os.path.join(cwd, sys.argv[1])]
+        )
+
     # if "pdos" in sys.argv:
     #     pdos = read_pdos(cwd)
     #     print(pdos.atoms)
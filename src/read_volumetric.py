@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from profiler import profiler, profiled
+from species import ELEMENTS, atomic_numbers, symbols
+
+
+Bohr2Ang = 0.529177210903 # Bohr radius in angstrom
+# bytes of grid values held in memory at once by the chunked operations
+CHUNK_BYTES = 64 * 2**20
+# values formatted at once by the text writers
+_TEXT_CHUNK = 2**20
+
+
+class read_volumetric(object):
+    """
+    ++--------------------------------------------------------------------------
+    +   Input: path to a Gaussian cube file (pp.x output_format=6) or an xsf
+    +   file with a DATAGRID_3D block (pp.x output_format=5)
+    +   cache (save the grid to path.npy after the first read and read it
+    +   from there next time, as long as the file is unchanged)
+    +   mmap (map path.npy instead of loading the grid in memory)
+    +   periodic (drop the periodic end points of the xsf general grid)
+    +   profile (True, "log" or None to follow QE_POST_PROFILE, see profiler.py)
+    ++--------------------------------------------------------------------------
+    +   1. Constructor
+    +   Attributes:
+    +   self.path (path to the file)
+    +   self.format ("cube" or "xsf")
+    +   self.cache_path (path to the binary copy of the grid, None if no cache)
+    +   self.profile_stats (time, lines, regex calls and bytes of each method)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   2. Method read_header(self)
+    +   Attributes:
+    +   self.nat (number of atoms)
+    +   self.atoms (atomic species associated with each atomic position)
+    +   self.atomic_pos_cart (atomic positions in cartesian coordinates, angstrom)
+    +   self.cell_parameters (cell spanned by the grid, angstrom)
+    +   self.origin (origin of the grid, angstrom)
+    +   self.shape (number of grid points along each cell vector)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   3. Method read_data(self)
+    +   Attributes:
+    +   self.data (n1 x n2 x n3, data[i, j, k] is the value at
+    +   origin + (i/n1, j/n2, k/n3) cell_parameters, a memmap if mmap)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   4. Method planar_average(self, axis=2)
+    +   average over the planes of the two other cell vectors
+    +
+    +   return(z, average) (z: distance from the first plane, angstrom)
+    ++--------------------------------------------------------------------------
+    +   5. Method macroscopic_average(self, window, axis=2)
+    +   planar average convoluted with one or more box windows (angstrom)
+    +
+    +   return(z, average)
+    ++--------------------------------------------------------------------------
+    +   6. Method integrate_spheres(self, centers, radii, unit="bohr")
+    +   integral of the grid in spheres around centers (angstrom), see the
+    +   function integrate_spheres
+    +
+    +   return(charges)
+    ++--------------------------------------------------------------------------
+    """
+    def __init__(self, path, cache=True, mmap=True, periodic=True, profile=None):
+        if not os.path.exists(path):
+            raise IOError("Fail to open {}".format(path))
+        self.path = path
+        self.format = "xsf" if path.endswith(".xsf") else "cube"
+        self.cache_path = path + ".npy" if cache else None
+        self._mmap = mmap
+        self._periodic = periodic
+
+        self._profiler = profiler(profile)
+        self.profile_stats = self._profiler.stats
+
+        # call the dynamic methods
+        self.read_header()
+        self.read_data()
+        if self._profiler.log:
+            self._profiler.report(path)
+
+    @profiled
+    def read_header(self):
+        with open(self.path, "rb") as f:
+            if self.format == "cube":
+                self._read_cube_header(f)
+            else:
+                self._read_xsf_header(f)
+            # the grid data start here
+            self._data_offset = f.tell()
+        self.nat = len(self.atoms)
+
+    def _read_cube_header(self, f):
+        # two lines of comments
+        f.readline()
+        f.readline()
+        line = f.readline().split()
+        nat = int(line[0])
+        self.origin = np.asarray(line[1:4], dtype=float) * Bohr2Ang
+        shape = []
+        voxels = np.zeros((3, 3))
+        for i in range(3):
+            line = f.readline().split()
+            shape.append(abs(int(line[0])))
+            # a negative number of points means the voxel is in angstrom
+            scale = 1.0 if int(line[0]) < 0 else Bohr2Ang
+            voxels[i] = np.asarray(line[1:4], dtype=float) * scale
+        self.shape = tuple(shape)
+        self.cell_parameters = voxels * np.asarray(shape)[:, None]
+        numbers = np.zeros(abs(nat), dtype=int)
+        self.atomic_pos_cart = np.zeros((abs(nat), 3))
+        for i in range(abs(nat)):
+            line = f.readline().split()
+            numbers[i] = int(line[0])
+            self.atomic_pos_cart[i] = np.asarray(line[2:5], dtype=float) * Bohr2Ang
+        self.atoms = symbols(numbers)
+        if nat < 0:
+            # orbital numbers of cube files of orbitals
+            f.readline()
+        self._grid_shape = self.shape
+
+    def _read_xsf_header(self, f):
+        self.atoms = np.zeros(0, dtype="U4")
+        self.atomic_pos_cart = np.zeros((0, 3))
+        for raw in iter(f.readline, b""):
+            line = raw.decode().strip()
+            if line.startswith("PRIMCOORD"):
+                nat = int(f.readline().split()[0])
+                rows = [f.readline().split() for i in range(nat)]
+                self.atoms = np.array(
+                    [
+                        ELEMENTS[int(row[0])] if row[0].isdigit() else row[0]
+                        for row in rows
+                    ], dtype="U4"
+                )
+                self.atomic_pos_cart = np.asarray(
+                    [row[1:4] for row in rows], dtype=float
+                )
+            elif (
+                line.startswith("BEGIN_DATAGRID_3D")
+                or line.startswith("DATAGRID_3D_")
+            ):
+                grid_shape = tuple(int(n) for n in f.readline().split()[:3])
+                self.origin = np.asarray(f.readline().split()[:3], dtype=float)
+                spanning = np.loadtxt([f.readline() for i in range(3)])
+                break
+        else:
+            raise ValueError("No DATAGRID_3D block in {}".format(self.path))
+        # general grid: the spanning vectors go from the first to the last
+        # point, which is the periodic image of the first one
+        self._grid_shape = grid_shape
+        if self._periodic:
+            self.shape = tuple(n - 1 for n in grid_shape)
+        else:
+            self.shape = grid_shape
+        self.cell_parameters = spanning
+
+    def _cache_is_valid(self):
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path + ".json", "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        stat = os.stat(self.path)
+        return (
+            meta.get("size") == stat.st_size
+            and meta.get("mtime_ns") == stat.st_mtime_ns
+            and tuple(meta.get("shape", ())) == self.shape
+        )
+
+    @profiled
+    def read_data(self):
+        if self._cache_is_valid():
+            self.data = np.load(
+                self.cache_path, mmap_mode="r" if self._mmap else None
+            )
+            return
+        if self.cache_path is not None:
+            # parse straight into the binary copy, a few planes at a time
+            data = np.lib.format.open_memmap(
+                self.cache_path + ".tmp", mode="w+", dtype=float,
+                shape=self.shape
+            )
+        else:
+            data = np.empty(self.shape)
+        with self._profiler.stage("read_file"):
+            with open(self.path, "rb") as f:
+                f.seek(self._data_offset)
+                if self.format == "cube":
+                    self._parse_cube(f, data)
+                else:
+                    self._parse_xsf(f, data)
+            size = os.path.getsize(self.path)
+            # the grid values after the header are converted by np.fromfile
+            self._profiler.count(
+                bytes_read=size, bytes_converted=size - self._data_offset
+            )
+        if self.cache_path is None:
+            self.data = data
+            return
+        data.flush()
+        del data
+        os.replace(self.cache_path + ".tmp", self.cache_path)
+        stat = os.stat(self.path)
+        with open(self.cache_path + ".json", "w") as f:
+            json.dump(
+                {
+                    "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                    "shape": list(self.shape)
+                }, f
+            )
+        self.data = np.load(
+            self.cache_path, mmap_mode="r" if self._mmap else None
+        )
+
+    def _read_values(self, f, count):
+        values = np.fromfile(f, dtype=float, count=count, sep=" ")
+        if values.size != count:
+            raise ValueError(
+                "{} ends before the last grid value".format(self.path)
+            )
+        return values
+
+    def _parse_cube(self, f, data):
+        # the last index runs fastest, read by planes of the first index
+        n1, n2, n3 = self.shape
+        step = _planes_per_chunk(n2*n3)
+        for i in range(0, n1, step):
+            m = min(step, n1 - i)
+            data[i:i+m] = self._read_values(f, m*n2*n3).reshape(m, n2, n3)
+
+    def _parse_xsf(self, f, data):
+        # the first index runs fastest, read by planes of the last index
+        g1, g2, g3 = self._grid_shape
+        n1, n2, n3 = self.shape
+        step = _planes_per_chunk(g1*g2)
+        for k in range(0, n3, step):
+            m = min(step, n3 - k)
+            block = self._read_values(f, m*g1*g2).reshape(m, g2, g1)
+            data[:, :, k:k+m] = block.transpose(2, 1, 0)[:n1, :n2]
+
+    @profiled
+    def planar_average(self, axis=2):
+        return(planar_average(self.data, self.cell_parameters, axis))
+
+    def macroscopic_average(self, window, axis=2):
+        z, average = self.planar_average(axis)
+        return(z, macroscopic_average(average, z[1] - z[0], window))
+
+    @profiled
+    def integrate_spheres(self, centers, radii, unit="bohr"):
+        return(
+            integrate_spheres(
+                self.data, self.cell_parameters, self.origin, centers, radii,
+                unit
+            )
+        )
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
+
+def _planes_per_chunk(plane_size, chunk_bytes=CHUNK_BYTES):
+    return max(1, chunk_bytes // (8 * plane_size))
+
+
+def _heights(cell_parameters):
+    """
+    heights of the cell perpendicular to the planes of the two other vectors
+    """
+    volume = abs(np.linalg.det(cell_parameters))
+    return volume / np.linalg.norm(
+        np.cross(np.roll(cell_parameters, -1, axis=0),
+        np.roll(cell_parameters, -2, axis=0)), axis=1
+    )
+
+
+def check_compatible(grids, tol=1e-4):
+    """
+    ++--------------------------------------------------------------------------
+    +   Raise ValueError unless the grids (read_volumetric objects) have the
+    +   same shape, cell and origin (within tol, angstrom)
+    ++--------------------------------------------------------------------------
+    """
+    ref = grids[0]
+    for grid in grids[1:]:
+        if grid.shape != ref.shape:
+            raise ValueError(
+                "{} has a {} grid but {} has a {} grid".format(
+                    grid.path, grid.shape, ref.path, ref.shape
+                )
+            )
+        if not np.allclose(grid.cell_parameters, ref.cell_parameters, atol=tol):
+            raise ValueError(
+                "The cells of {} and {} differ".format(grid.path, ref.path)
+            )
+        if not np.allclose(grid.origin, ref.origin, atol=tol):
+            raise ValueError(
+                "The origins of {} and {} differ".format(grid.path, ref.path)
+            )
+
+
+def _sphere_sums(chunk, i0, shape, cell_parameters, origin, centers, radii):
+    """
+    sums of the values of a chunk (planes i0, i0 + 1, ... of the first
+    index) within each sphere, the nearest periodic image of each center
+    """
+    n = np.asarray(shape)
+    heights = _heights(cell_parameters)
+    frac_centers = np.matmul(
+        np.asarray(centers, dtype=float) - origin,
+        np.linalg.inv(cell_parameters)
+    )
+    sums = np.zeros(len(frac_centers))
+    for s, (frac, radius) in enumerate(zip(frac_centers, radii)):
+        # grid points of the box around the sphere, not wrapped
+        index = []
+        for axis in range(3):
+            reach = int(np.ceil(radius / heights[axis] * n[axis]))
+            start = int(np.floor(frac[axis] * n[axis])) - reach
+            index.append(np.arange(start, start + 2*reach + 2))
+        local = index[0] % n[0] - i0
+        in_chunk = (local >= 0) & (local < chunk.shape[0])
+        if not np.any(in_chunk):
+            continue
+        index[0] = index[0][in_chunk]
+        displ = [index[axis] / n[axis] - frac[axis] for axis in range(3)]
+        cart = (
+            displ[0][:, None, None, None] * cell_parameters[0]
+            + displ[1][None, :, None, None] * cell_parameters[1]
+            + displ[2][None, None, :, None] * cell_parameters[2]
+        )
+        inside = np.sum(cart**2, axis=3) < radius**2
+        values = chunk[
+            np.ix_(local[in_chunk], index[1] % n[1], index[2] % n[2])
+        ]
+        sums[s] = np.sum(values[inside])
+    return sums
+
+
+def _check_radii(cell_parameters, radii):
+    if np.amax(radii) >= np.amin(_heights(cell_parameters)) / 2:
+        raise ValueError(
+            "The spheres must be smaller than half of the cell heights {}"
+            .format(_heights(cell_parameters))
+        )
+
+
+def _volume_element(shape, cell_parameters, unit):
+    dV = abs(np.linalg.det(cell_parameters)) / np.prod(shape)
+    if unit == "bohr":
+        dV /= Bohr2Ang**3
+    return dV
+
+
+def integrate_spheres(
+    data, cell_parameters, origin, centers, radii, unit="bohr",
+    chunk_bytes=CHUNK_BYTES
+):
+    """
+    ++--------------------------------------------------------------------------
+    +   Integral of a grid (e.g. a charge density) in spheres around centers
+    +   (n x 3, angstrom, e.g. qe_out.atomic_pos_cart) of radii (angstrom),
+    +   the grid being read by chunks of planes
+    +   unit: unit of length of the grid values, "bohr" for pp.x densities
+    +   (e/bohr^3) or "angstrom"
+    +   The radii must be smaller than half of the cell heights.
+    +
+    +   return(charges)
+    ++--------------------------------------------------------------------------
+    """
+    cell_parameters = np.asarray(cell_parameters, dtype=float)
+    centers = np.atleast_2d(centers)
+    radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+    _check_radii(cell_parameters, radii)
+    n1, n2, n3 = data.shape
+    step = _planes_per_chunk(n2*n3, chunk_bytes)
+    sums = np.zeros(len(centers))
+    for i in range(0, n1, step):
+        sums += _sphere_sums(
+            np.asarray(data[i:i+step]), i, data.shape, cell_parameters,
+            origin, centers, radii
+        )
+    return(sums * _volume_element(data.shape, cell_parameters, unit))
+
+
+def grid_difference(
+    grids, coefficients=None, output=None, centers=None, radii=None,
+    unit="bohr", chunk_bytes=CHUNK_BYTES, verbosity=True
+):
+    """
+    ++--------------------------------------------------------------------------
+    +   Linear combination sum_i c_i grid_i of compatible grids, e.g.
+    +   rho(defect) - rho(host) - rho(adatom), computed by chunks of planes
+    +   of the first index so that only a few chunks are in memory
+    +   grids (read_volumetric objects or paths)
+    +   coefficients (default: 1, -1, -1, ...)
+    +   output (.npy, .cube or .xsf; .cube and .xsf also get their .npy
+    +   cache; None for a temporary grid next to the first input)
+    +   centers, radii (spheres to integrate the result in, angstrom, see
+    +   integrate_spheres)
+    +
+    +   return(data, charges) (data: memmap of the result, charges: None
+    +   without spheres)
+    ++--------------------------------------------------------------------------
+    """
+    grids = [
+        grid if isinstance(grid, read_volumetric) else read_volumetric(grid)
+        for grid in grids
+    ]
+    check_compatible(grids)
+    if coefficients is None:
+        coefficients = [1.0] + [-1.0] * (len(grids) - 1)
+    ref = grids[0]
+    shape = ref.shape
+    if output is None:
+        npy_path = ref.path + ".diff.npy"
+    elif output.endswith(".npy"):
+        npy_path = output
+    else:
+        npy_path = output + ".npy"
+    result = np.lib.format.open_memmap(
+        npy_path, mode="w+", dtype=float, shape=shape
+    )
+
+    if centers is not None:
+        centers = np.atleast_2d(centers)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+        _check_radii(ref.cell_parameters, radii)
+        sums = np.zeros(len(centers))
+    n1, n2, n3 = shape
+    step = _planes_per_chunk(n2*n3, chunk_bytes)
+    for i in range(0, n1, step):
+        chunk = coefficients[0] * np.asarray(grids[0].data[i:i+step])
+        for c, grid in zip(coefficients[1:], grids[1:]):
+            chunk += c * np.asarray(grid.data[i:i+step])
+        result[i:i+step] = chunk
+        if centers is not None:
+            sums += _sphere_sums(
+                chunk, i, shape, ref.cell_parameters, ref.origin, centers,
+                radii
+            )
+    result.flush()
+    del result
+    data = np.load(npy_path, mmap_mode="r")
+
+    if output is not None and not output.endswith(".npy"):
+        write_grid(
+            output, data, ref.cell_parameters, ref.origin, ref.atoms,
+            ref.atomic_pos_cart, chunk_bytes
+        )
+        # the .npy is the cache of the written file
+        stat = os.stat(output)
+        with open(npy_path + ".json", "w") as f:
+            json.dump(
+                {
+                    "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                    "shape": list(shape)
+                }, f
+            )
+    charges = None
+    if centers is not None:
+        charges = sums * _volume_element(shape, ref.cell_parameters, unit)
+    if verbosity:
+        print(
+            "{} = {}".format(
+                " ".join(
+                    "{:+g} {}".format(c, grid.path)
+                    for c, grid in zip(coefficients, grids)
+                ), output if output is not None else npy_path
+            )
+        )
+        if charges is not None:
+            for center, radius, charge in zip(centers, radii, charges):
+                print(
+                    "center = ({:.4f}, {:.4f}, {:.4f}) A  r = {} A  "
+                    "charge = {:.6f}".format(*center, radius, charge)
+                )
+    return(data, charges)
+
+
+def write_grid(
+    path, data, cell_parameters, origin=(0, 0, 0), atoms=(),
+    atomic_pos_cart=(), chunk_bytes=CHUNK_BYTES
+):
+    """
+    ++--------------------------------------------------------------------------
+    +   Write a grid (n1 x n2 x n3, array or memmap) by chunks of planes to
+    +   path.npy, path.cube (bohr) or path.xsf (general periodic grid,
+    +   angstrom), with the atoms in the cube and xsf headers
+    ++--------------------------------------------------------------------------
+    """
+    cell_parameters = np.asarray(cell_parameters, dtype=float)
+    origin = np.asarray(origin, dtype=float)
+    atomic_pos_cart = np.reshape(np.asarray(atomic_pos_cart, dtype=float), (-1, 3))
+    n1, n2, n3 = data.shape
+    if path.endswith(".npy"):
+        out = np.lib.format.open_memmap(
+            path, mode="w+", dtype=float, shape=data.shape
+        )
+        step = _planes_per_chunk(n2*n3, chunk_bytes)
+        for i in range(0, n1, step):
+            out[i:i+step] = data[i:i+step]
+        out.flush()
+    elif path.endswith(".cube"):
+        with open(path, "w") as f:
+            f.write("written by read_volumetric.write_grid\n\n")
+            f.write(
+                "{:5d} {:12.6f} {:12.6f} {:12.6f}\n".format(
+                    len(atoms), *(origin / Bohr2Ang)
+                )
+            )
+            for n, voxel in zip(data.shape, cell_parameters):
+                f.write(
+                    "{:5d} {:12.6f} {:12.6f} {:12.6f}\n".format(
+                        n, *(voxel / n / Bohr2Ang)
+                    )
+                )
+            for z, pos in zip(atomic_numbers(atoms), atomic_pos_cart):
+                f.write(
+                    "{:5d} {:12.6f} {:12.6f} {:12.6f} {:12.6f}\n".format(
+                        z, float(z), *(pos / Bohr2Ang)
+                    )
+                )
+            # rows of n3 values along the last index, 6 values per line
+            row_format = ("%14.6e" * 6 + "\n") * (n3 // 6)
+            if n3 % 6:
+                row_format += "%14.6e" * (n3 % 6) + "\n"
+            step = max(1, min(
+                _planes_per_chunk(n2*n3, chunk_bytes), _TEXT_CHUNK // (n2*n3)
+            ))
+            for i in range(0, n1, step):
+                block = np.asarray(data[i:i+step])
+                f.write((row_format * (block.shape[0]*n2)) % tuple(block.ravel()))
+    elif path.endswith(".xsf"):
+        with open(path, "w") as f:
+            f.write("CRYSTAL\nPRIMVEC\n")
+            f.write(("%.10f %.10f %.10f\n" * 3) % tuple(cell_parameters.ravel()))
+            f.write("PRIMCOORD\n{} 1\n".format(len(atoms)))
+            for atom, pos in zip(atoms, atomic_pos_cart):
+                f.write("{} {:.10f} {:.10f} {:.10f}\n".format(atom, *pos))
+            f.write(
+                "BEGIN_BLOCK_DATAGRID_3D\n3D_PWSCF\nDATAGRID_3D_UNKNOWN\n"
+                "{} {} {}\n".format(n1 + 1, n2 + 1, n3 + 1)
+            )
+            f.write("%.10f %.10f %.10f\n" % tuple(origin))
+            f.write(("%.10f %.10f %.10f\n" * 3) % tuple(cell_parameters.ravel()))
+            # general grid, the first index runs fastest and the periodic end
+            # points are repeated, written by planes of the last index
+            plane = (n1 + 1) * (n2 + 1)
+            step = max(1, min(
+                _planes_per_chunk(plane, chunk_bytes), _TEXT_CHUNK // plane
+            ))
+            for k in range(0, n3 + 1, step):
+                planes = np.arange(k, min(k + step, n3 + 1)) % n3
+                block = np.pad(
+                    np.asarray(data[:, :, planes]), ((0, 1), (0, 1), (0, 0)),
+                    mode="wrap"
+                )
+                values = block.transpose(2, 1, 0).ravel()
+                text = ("%14.6e" * 6 + "\n") * (values.size // 6)
+                if values.size % 6:
+                    text += "%14.6e" * (values.size % 6) + "\n"
+                f.write(text % tuple(values))
+            f.write("END_DATAGRID_3D\nEND_BLOCK_DATAGRID_3D\n")
+    else:
+        raise ValueError("Unknown grid format of {}".format(path))
+
+
+def planar_average(data, cell_parameters, axis=2):
+    """
+    ++--------------------------------------------------------------------------
+    +   Average of a grid (n1 x n2 x n3) over the planes spanned by the two
+    +   cell vectors other than axis
+    +   z is the distance from the first plane, the spacing being the
+    +   height of the cell perpendicular to the planes over n_axis.
+    +
+    +   return(z, average)
+    ++--------------------------------------------------------------------------
+    """
+    others = tuple(i for i in range(3) if i != axis)
+    average = np.asarray(np.mean(data, axis=others))
+    cell_parameters = np.asarray(cell_parameters, dtype=float)
+    area = np.linalg.norm(
+        np.cross(cell_parameters[others[0]], cell_parameters[others[1]])
+    )
+    height = abs(np.linalg.det(cell_parameters)) / area
+    z = np.arange(data.shape[axis]) * height / data.shape[axis]
+    return(z, average)
+
+
+def macroscopic_average(average, spacing, window):
+    """
+    ++--------------------------------------------------------------------------
+    +   Macroscopic average of a periodic planar average on a uniform grid
+    +   of spacing (angstrom), convoluted with a box window of width window
+    +   (angstrom, e.g. the interlayer distance), or with several windows in
+    +   turn (e.g. the two periods of an interface)
+    +   The convolution is a product in reciprocal space: the Fourier
+    +   transform of a box of width L is sin(qL/2)/(qL/2).
+    +
+    +   return(macroscopic average)
+    ++--------------------------------------------------------------------------
+    """
+    average = np.asarray(average, dtype=float)
+    n = average.shape[-1]
+    freq = np.fft.rfftfreq(n, d=spacing)
+    transform = np.fft.rfft(average, axis=-1)
+    for width in np.atleast_1d(window):
+        # np.sinc(x) = sin(pi x)/(pi x)
+        transform = transform * np.sinc(freq * width)
+    return(np.fft.irfft(transform, n, axis=-1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Planar and macroscopic averages of a cube or xsf grid, "
+        "or the difference of several grids"
+    )
+    parser.add_argument(
+        "file", type=str, nargs="+",
+        help="cube or xsf file; several files give the difference "
+        "file1 - file2 - file3 ..."
+    )
+    parser.add_argument(
+        "--axis", type=int, default=2, help="cell vector to average along"
+    )
+    parser.add_argument(
+        "--window", type=float, nargs="+", default=None,
+        help="widths of the macroscopic average windows, angstrom"
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, default="avg.dat",
+        help="file of z, planar and macroscopic averages"
+    )
+    parser.add_argument(
+        "--diff", type=str, default="diff.cube",
+        help="difference grid, .cube, .xsf or .npy"
+    )
+    parser.add_argument(
+        "--qe-out", type=str, default=None,
+        help="pw.x output with the atomic positions of the spheres"
+    )
+    parser.add_argument(
+        "--atoms", type=int, nargs="+", default=None,
+        help="indices (from 0) of the atoms at the centers of the spheres"
+    )
+    parser.add_argument(
+        "--radius", type=float, default=1.0, help="radius of the spheres, angstrom"
+    )
+    args = parser.parse_args()
+    paths = [os.path.join(os.getcwd(), f) for f in args.file]
+    if len(paths) > 1:
+        centers = None
+        if args.atoms is not None:
+            if args.qe_out is None:
+                sys.exit("--atoms needs --qe-out")
+            from read_qeout import qe_out
+            qe = qe_out(os.path.join(os.getcwd(), args.qe_out), verbosity=False)
+            centers = qe.atomic_pos_cart[args.atoms]
+        data, charges = grid_difference(
+            paths, output=args.diff, centers=centers, radii=args.radius
+        )
+        vol = None
+        if not args.diff.endswith(".npy"):
+            vol = read_volumetric(os.path.join(os.getcwd(), args.diff))
+    else:
+        vol = read_volumetric(paths[0])
+    if vol is not None:
+        z, average = vol.planar_average(args.axis)
+        columns = [z, average]
+        if args.window is not None:
+            columns.append(
+                macroscopic_average(average, z[1] - z[0], args.window)
+            )
+        np.savetxt(args.output, np.column_stack(columns), "%.10e")
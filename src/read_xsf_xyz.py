@@ -3,15 +3,19 @@ import sys
 import numpy as np
 import os
 import re
+from profiler import profiler, profiled, counting
+from species import encode, decode
 
 class read_xsf_xyz(object):
     """
     ++--------------------------------------------------------------------------
     +   Input: path to xsf or xyz file
+    +   profile (True, "log" or None to follow QE_POST_PROFILE, see profiler.py)
     ++--------------------------------------------------------------------------
     +   1. Constructor
     +   Attributes:
     +   self.lines (lines in the file)
+    +   self.profile_stats (time, lines, regex calls and bytes of each method)
     +
     +   No return
     ++--------------------------------------------------------------------------
@@ -19,7 +23,9 @@ class read_xsf_xyz(object):
     +
     +   self.nat (number of atoms)
     +   self.cell_parameters (cell parameters in cartesian coordinates, angstrom)
-    +   self.atoms (atomic species associated with each atomic position)
+    +   self.species (table of the atomic species, see species.py)
+    +   self.species_codes (code of the species of each atom, uint8)
+    +   self.atoms (read-only, species of each atom decoded from the codes)
     +   self.atomic_pos_cryst (atomic positions in fractional crystal coordinates)
     +   self.atomic_pos_cart (atomic positions in cartesian coordinates, angstrom)
     +   
@@ -28,13 +34,15 @@ class read_xsf_xyz(object):
     +   3. Method read_xyz(self)
     +
     +   self.nat (number of atoms)
-    +   self.atoms (atomic species associated with each atomic position)
+    +   self.species (table of the atomic species, see species.py)
+    +   self.species_codes (code of the species of each atom, uint8)
+    +   self.atoms (read-only, species of each atom decoded from the codes)
     +   self.atomic_pos_cart (atomic positions in cartesian coordinates, angstrom)
     +   
     +   No return
     ++--------------------------------------------------------------------------
     """
-    def __init__(self, path):
+    def __init__(self, path, profile=None):
         is_xsf_file = False
         is_xyz_file = False
         if os.path.exists(path):
@@ -57,32 +65,48 @@ class read_xsf_xyz(object):
                     print("Read xyz file")
 
 
+        self._profiler = profiler(profile)
+        self.profile_stats = self._profiler.stats
         if is_xsf_file:
-            self.lines = xsf_file.readlines()
+            with self._profiler.stage("read_file"):
+                self.lines = xsf_file.readlines()
+                self._profiler.count(
+                    lines=len(self.lines),
+                    bytes_read=os.path.getsize(xsf_file.name)
+                )
             # call the dynamic methods
             self.read_xsf()
         elif is_xyz_file:
-            self.lines = xyz_file.readlines()
+            with self._profiler.stage("read_file"):
+                self.lines = xyz_file.readlines()
+                self._profiler.count(
+                    lines=len(self.lines),
+                    bytes_read=os.path.getsize(xyz_file.name)
+                )
             # call the dynamic methods
             self.read_xyz()
         else:
             raise IOError("Fail to open xsf or xyz file")
+        if self._profiler.log:
+            self._profiler.report(path)
 
+    @profiled
     def read_xsf(self):
+        regex = counting(self._profiler, re)
         self.cell_parameters = np.zeros((3, 3))
         self.nat = 0
 
         for i, line in enumerate(self.lines):
             if "PRIMVEC" in line:
                 for j in range(3):
-                    self.cell_parameters[j, :] = re.findall(
+                    self.cell_parameters[j, :] = regex.findall(
                         r"[+-]?\d+\.\d*", self.lines[i+1+j]
                     )
             if "PRIMCOORD" in line:
-                self.nat = int(re.findall(r"[+-]?\d+", self.lines[i+1])[0])
+                self.nat = int(regex.findall(r"[+-]?\d+", self.lines[i+1])[0])
         
         # initialize array for saving data
-        self.atoms = np.zeros(self.nat, dtype="U4")
+        atoms = [""] * self.nat
         self.atomic_pos_cryst = np.zeros((self.nat, 3))
         self.atomic_pos_cart = np.zeros((self.nat, 3))
 
@@ -92,7 +116,7 @@ class read_xsf_xyz(object):
         for i, line in enumerate(self.lines):
             if "PRIMCOORD" in line:
                 for j in range(self.nat):
-                    self.atoms[j] = self.lines[i+2+j].strip().split()[0]
+                    atoms[j] = self.lines[i+2+j].strip().split()[0]
                     self.atomic_pos_cart[j] = (
                         self.lines[i+2+j].strip().split()[1:4]
                     )
@@ -102,19 +126,33 @@ class read_xsf_xyz(object):
                             self.lines[i+2+j].strip().split()[4:]
                         )
         
+        self.species, self.species_codes = encode(atoms)
         inv_cell_parameters = np.linalg.inv(self.cell_parameters)
 
         self.atomic_pos_cryst = np.matmul(self.atomic_pos_cart, inv_cell_parameters)
 
+    @profiled
     def read_xyz(self):
-        self.nat = int(re.findall(r"[+-]?\d+", self.lines[0])[0])
+        regex = counting(self._profiler, re)
+        self.nat = int(regex.findall(r"[+-]?\d+", self.lines[0])[0])
     
-        self.atoms = np.zeros(self.nat, dtype="U4")
+        atoms = [""] * self.nat
         self.atomic_pos_cart = np.zeros((self.nat, 3))
 
         for i in range(self.nat):
-            self.atoms[i] = self.lines[i+2].strip().split()[0]
+            atoms[i] = self.lines[i+2].strip().split()[0]
             self.atomic_pos_cart[i] = (self.lines[i+2].strip().split()[1:4])
+        self.species, self.species_codes = encode(atoms)
+
+    @property
+    def atoms(self):
+        """
+        ++----------------------------------------------------------------------
+        +   Atomic species of each atom (U4), decoded from self.species_codes
+        +   when asked for
+        ++----------------------------------------------------------------------
+        """
+        return decode(self.species, self.species_codes)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+import io
+import os
+import sys
+import time
+import fnmatch
+import sqlite3
+import hashlib
+import argparse
+import contextlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from read_qeout import qe_out
+
+
+# columns of the index, (name, SQL type)
+COLUMNS = (
+    ("path", "TEXT PRIMARY KEY"),
+    ("directory", "TEXT"),
+    ("sha256", "TEXT"),
+    ("size", "INTEGER"),
+    ("mtime_ns", "INTEGER"),
+    ("calculation", "TEXT"),
+    ("converged", "INTEGER"),
+    ("final_energy", "REAL"),
+    ("nat", "INTEGER"),
+    ("xc_functional", "TEXT"),
+    ("ecutwfc", "REAL"),
+    ("nk", "INTEGER"),
+    ("gap", "REAL"),
+    ("wall_time", "REAL"),
+    ("max_force", "REAL"),
+    ("arrays", "TEXT"),
+    ("error", "TEXT"),
+)
+_NAMES = tuple(name for name, _ in COLUMNS)
+# columns with an index for fast queries
+_INDEXED = ("xc_functional", "calculation", "final_energy", "max_force")
+
+
+class results_index(object):
+    """
+    ++--------------------------------------------------------------------------
+    +   Input:
+    +   path (SQLite database, created if it does not exist)
+    +   cache_dir (directory of the array caches, path + ".arrays" by default)
+    ++--------------------------------------------------------------------------
+    +   1. Constructor
+    +   Attributes:
+    +   self.path, self.cache_dir
+    +   self.connection (sqlite3 connection)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   2. Method update(self, root=".", patterns=("*.out",), processes=None,
+    +   verbosity=True)
+    +   index the pw.x outputs under root whose names match patterns; only new
+    +   and changed files are parsed, and the files which no longer exist are
+    +   removed from the index
+    +
+    +   return(parsed, removed) (paths)
+    ++--------------------------------------------------------------------------
+    +   3. Method query(self, where=None, params=(), order_by="path", **equal)
+    +   calculations matching an SQL condition on the columns (see COLUMNS)
+    +   and equal values, e.g.
+    +   query("max_force < ? AND path LIKE ?", (1e-3, "%/vac_C/%"),
+    +   xc_functional="HSE", calculation="relax")
+    +
+    +   return rows (list of dictionaries)
+    ++--------------------------------------------------------------------------
+    +   4. Method arrays(self, path)
+    +   cached arrays of a calculation: atoms, atomic_pos_cart,
+    +   cell_parameters, etot (eV) and max_force (Ry/au, of each step)
+    +
+    +   return dictionary of arrays
+    ++--------------------------------------------------------------------------
+    +   5. Method close(self)
+    ++--------------------------------------------------------------------------
+    """
+    def __init__(self, path="results.sqlite", cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir if cache_dir is not None else path + ".arrays"
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS calculations ({})".format(
+                    ", ".join(
+                        "{} {}".format(name, kind) for name, kind in COLUMNS
+                    )
+                )
+            )
+            for name in _INDEXED:
+                self.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_{0} ON calculations ({0})"
+                    .format(name)
+                )
+
+    def update(
+        self, root=".", patterns=("*.out",), processes=None, verbosity=True
+    ):
+        """
+        ++----------------------------------------------------------------------
+        +   A file is parsed again only if its size or modification time
+        +   changed and its sha256 differs from the indexed one. The outputs
+        +   are parsed in a process pool (processes=1 parses in this process).
+        +   The file names must end with .out as qe_out requires.
+        ++----------------------------------------------------------------------
+        """
+        start = time.perf_counter()
+        root = os.path.abspath(root)
+        found = [
+            os.path.join(directory, f)
+            for directory, _, files in os.walk(root)
+            for f in sorted(files)
+            if any(fnmatch.fnmatch(f, pattern) for pattern in patterns)
+        ]
+        indexed = {
+            path: (size, mtime_ns, sha256)
+            for path, size, mtime_ns, sha256 in self.connection.execute(
+                "SELECT path, size, mtime_ns, sha256 FROM calculations "
+                "WHERE substr(path, 1, ?) = ?",
+                (len(root) + 1, root + os.sep)
+            )
+        }
+
+        jobs = []
+        touched = []
+        for path in found:
+            stat = os.stat(path)
+            stamp = (stat.st_size, stat.st_mtime_ns)
+            if path in indexed and indexed[path][:2] == stamp:
+                continue
+            if path not in indexed and not _is_pw_output(path):
+                continue
+            sha256 = _file_sha256(path)
+            if path in indexed and indexed[path][2] == sha256:
+                # same contents, e.g. copied or touched
+                touched.append(stamp + (path,))
+            else:
+                jobs.append((path, sha256, stamp))
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if processes == 1 or len(jobs) < 2:
+            rows = [_index_output(job, self.cache_dir) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                rows = list(
+                    executor.map(
+                        _index_output, jobs, [self.cache_dir] * len(jobs)
+                    )
+                )
+
+        removed = sorted(set(indexed) - set(found))
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE calculations SET size = ?, mtime_ns = ? WHERE path = ?",
+                touched
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO calculations ({}) VALUES ({})".format(
+                    ", ".join(_NAMES), ", ".join("?" * len(_NAMES))
+                ),
+                [tuple(row[name] for name in _NAMES) for row in rows]
+            )
+            self.connection.executemany(
+                "DELETE FROM calculations WHERE path = ?",
+                [(path,) for path in removed]
+            )
+        # arrays of the replaced and removed calculations
+        referenced = {
+            arrays for arrays, in self.connection.execute(
+                "SELECT arrays FROM calculations WHERE arrays IS NOT NULL"
+            )
+        }
+        for f in os.listdir(self.cache_dir):
+            if f.endswith(".npz") and f not in referenced:
+                os.remove(os.path.join(self.cache_dir, f))
+        parsed = [row["path"] for row in rows]
+        if verbosity:
+            print(
+                "{} files found, {} parsed ({} failed), {} removed in {:.2f} s"
+                .format(
+                    len(found), len(parsed),
+                    sum(row["error"] is not None for row in rows), len(removed),
+                    time.perf_counter() - start
+                )
+            )
+        return(parsed, removed)
+
+    def query(self, where=None, params=(), order_by="path", **equal):
+        conditions = []
+        values = []
+        for name, value in equal.items():
+            if name not in _NAMES:
+                raise ValueError("Unknown column {}".format(name))
+            conditions.append("{} = ?".format(name))
+            values.append(value)
+        if where is not None:
+            conditions.append("({})".format(where))
+            values.extend(params)
+        sql = "SELECT {} FROM calculations".format(", ".join(_NAMES))
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if order_by is not None:
+            sql += " ORDER BY " + order_by
+        return [
+            dict(zip(_NAMES, row))
+            for row in self.connection.execute(sql, values)
+        ]
+
+    def arrays(self, path):
+        row = self.connection.execute(
+            "SELECT arrays FROM calculations WHERE path = ?",
+            (os.path.abspath(path),)
+        ).fetchone()
+        if row is None or row[0] is None:
+            raise KeyError("{} has no cached arrays".format(path))
+        with np.load(os.path.join(self.cache_dir, row[0])) as data:
+            return {name: data[name] for name in data.files}
+
+    def close(self):
+        self.connection.close()
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
+
+def _file_sha256(path, block_size=2**20):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _is_pw_output(path, head=4096):
+    """
+    ++--------------------------------------------------------------------------
+    +   Is path an output of pw.x? (and not e.g. of projwfc.x or bands.x)
+    ++--------------------------------------------------------------------------
+    """
+    with open(path, "rb") as f:
+        return b"Program PWSCF" in f.read(head)
+
+
+def _calculation(lines):
+    """
+    ++--------------------------------------------------------------------------
+    +   Kind of calculation, "vc-relax", "relax", "nscf" or "scf"
+    ++--------------------------------------------------------------------------
+    """
+    calculation = "scf"
+    for line in lines:
+        if "new unit-cell volume" in line:
+            return "vc-relax"
+        if "BFGS Geometry Optimization" in line:
+            calculation = "relax"
+        elif "Band Structure Calculation" in line:
+            calculation = "nscf"
+    return calculation
+
+
+def _index_output(job, cache_dir):
+    """
+    ++--------------------------------------------------------------------------
+    +   Parse one pw.x output and write its arrays to cache_dir/sha256.npz
+    +   job (path, sha256, (size, mtime_ns))
+    +
+    +   return row (dictionary of the columns; a failed parse gives the error
+    +   and no scalars, so that the file is not parsed again until it changes)
+    ++--------------------------------------------------------------------------
+    """
+    path, sha256, (size, mtime_ns) = job
+    row = dict.fromkeys(_NAMES)
+    row.update(
+        path=path, directory=os.path.dirname(path), sha256=sha256, size=size,
+        mtime_ns=mtime_ns
+    )
+    try:
+        # qe_out prints and exits on unfinished calculations
+        with contextlib.redirect_stdout(io.StringIO()):
+            qe = qe_out(path, verbosity=False)
+            qe.read_forces_history()
+            qe.read_miscellus()
+    except (Exception, SystemExit) as error:
+        row["error"] = "{}: {}".format(type(error).__name__, error)
+        return row
+    row.update(
+        calculation=_calculation(qe.lines),
+        converged=int(any("End of self-consistent" in l for l in qe.lines)),
+        final_energy=float(qe.final_energy),
+        nat=int(qe.nat),
+        xc_functional=qe.xc_functional,
+        ecutwfc=float(qe.ecutwfc),
+        nk=int(qe.nk),
+        wall_time=float(qe.wall_time),
+    )
+    if getattr(qe, "indirect_gap", None) is not None:
+        row["gap"] = float(qe.indirect_gap)
+    if qe.max_force.size > 0 and not np.isnan(qe.max_force[-1]):
+        row["max_force"] = float(qe.max_force[-1])
+    row["arrays"] = sha256 + ".npz"
+    np.savez(
+        os.path.join(cache_dir, row["arrays"]),
+        atoms=qe.atoms, atomic_pos_cart=qe.atomic_pos_cart,
+        cell_parameters=qe.cell_parameters, etot=qe.etot,
+        max_force=qe.max_force
+    )
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Index the pw.x outputs of a project in an SQLite database"
+    )
+    parser.add_argument(
+        "--db", type=str, default="results.sqlite", help="SQLite database"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parser_update = subparsers.add_parser(
+        "update", help="index new and changed outputs"
+    )
+    parser_update.add_argument("root", type=str, nargs="?", default=".")
+    parser_update.add_argument(
+        "--patterns", type=str, nargs="+", default=["*.out"],
+        help="file names of the outputs"
+    )
+    parser_update.add_argument(
+        "-j", "--processes", type=int, default=None,
+        help="number of processes parsing the outputs"
+    )
+    parser_query = subparsers.add_parser("query", help="print calculations")
+    parser_query.add_argument(
+        "where", type=str, nargs="?", default=None,
+        help="SQL condition, e.g. \"xc_functional = 'HSE' AND max_force < 1e-3\""
+    )
+    parser_query.add_argument(
+        "--columns", type=str, nargs="+",
+        default=["path", "calculation", "xc_functional", "final_energy",
+        "max_force"]
+    )
+    args = parser.parse_args()
+    index = results_index(args.db)
+    if args.command == "update":
+        index.update(args.root, args.patterns, args.processes)
+    else:
+        rows = index.query(args.where)
+        print("  ".join(args.columns))
+        for row in rows:
+            print("  ".join(str(row[name]) for name in args.columns))
+        print("{} calculations".format(len(rows)), file=sys.stderr)
+    index.close()
@@ -26,7 +26,7 @@ if __name__ == "__main__":
 
     #### rotate cluster to align [111] to [001]
     R.rotation_matrix_rodrigues(inp["rot1_vec1"], inp["rot1_vec2"])
-    inv_rotation_mat = np.linalg.inv(R.rot_mat_rodrigues)
+    inv_rotation_mat = np.transpose(R.rot_mat_rodrigues)
     # rotate the atomic positions of a molecule in cartesian coordinate
     atomic_pos_cart = np.zeros((qe.nat, 3))
     temp_atomic_pos_cart = np.matmul(qe.atomic_pos_cart, inv_rotation_mat)
@@ -1,20 +1,239 @@
 #!/usr/bin/env python3
 import numpy as np
 import os
+import io
+import sys
+import time
 import yaml
+import argparse
+import functools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 from read_qein import qe_in
 from read_qeout import qe_out
 from read_xsf_xyz import read_xsf_xyz
-from rotation_matrix import rotation_matrix
+from rotation_matrix import align_matrices, rotate
 from write_files import write_files
 from constraint_atoms import cstr_atoms
 
 
+def trim(ca, center, radius, H_bond_length, common_bond_length=1.6):
+    """
+    =---------------------------------------------------------------------------
+    +   Cluster of the atoms in the sphere, passivated by H, see 
+    +   cstr_atoms.trim_cell
+    +
+    +   return(atoms, atomic_pos_cart)
+    =---------------------------------------------------------------------------
+    """
+    ca.trim_cell(
+        center=center,
+        radius=radius,
+        H_bond_length=H_bond_length,
+        common_bond_length=common_bond_length
+    )
+    return(ca.trim_cell_atoms, ca.trim_cell_atomic_pos_cart)
+
+
+def align(atoms, atomic_pos_cart, vec1, vec2):
+    """
+    =---------------------------------------------------------------------------
+    +   Rotate the atomic positions so that vec1 is aligned to vec2
+    +   The rotation matrix R rotates column vectors, so the rows of atomic
+    +   positions are rotated by R^T (R^-1 = R^T). Parallel and antiparallel
+    +   vectors are handled, see rotation_matrix.align_matrices.
+    +
+    +   return(atoms, atomic_pos_cart)
+    =---------------------------------------------------------------------------
+    """
+    rot_mat = align_matrices(vec1, vec2)
+    return(atoms, rotate(atomic_pos_cart, rot_mat)[0])
+
+
+def align_bond(atoms, atomic_pos_cart, index_atom1, index_atom2, vec1, vec2):
+    """
+    =---------------------------------------------------------------------------
+    +   Rotate the atomic positions so that the vector from atom2 to atom1,
+    +   projected by multiplying with vec1 (e.g. [1, 1, 0] for the xy plane),
+    +   is aligned to vec2
+    +
+    +   return(atoms, atomic_pos_cart)
+    =---------------------------------------------------------------------------
+    """
+    bond = atomic_pos_cart[index_atom1] - atomic_pos_cart[index_atom2]
+    return(align(atoms, atomic_pos_cart, bond * np.asarray(vec1), vec2))
+
+
+def write(atoms, atomic_pos_cart, filename="gen_cluster"):
+    """
+    =---------------------------------------------------------------------------
+    +   Write filename.xyz
+    +
+    +   return(atoms, atomic_pos_cart)
+    =---------------------------------------------------------------------------
+    """
+    wf = write_files(filename)
+    wf.write_xyz(atoms=atoms, atomic_pos_cart=atomic_pos_cart)
+    return(atoms, atomic_pos_cart)
+
+
+def pipeline(atoms, atomic_pos_cart, *stages):
+    """
+    =---------------------------------------------------------------------------
+    +   Pass the atoms and atomic positions through the stages in order, 
+    +   each stage being stage(atoms, atomic_pos_cart) -> (atoms, 
+    +   atomic_pos_cart), e.g. functools.partial(align, vec1=v1, vec2=v2)
+    +
+    +   return(atoms, atomic_pos_cart)
+    =---------------------------------------------------------------------------
+    """
+    for stage in stages:
+        atoms, atomic_pos_cart = stage(atoms, atomic_pos_cart)
+    return(atoms, atomic_pos_cart)
+
+
+def gen_cluster(ca, inp, filename="gen_cluster"):
+    """
+    =---------------------------------------------------------------------------
+    +   Trim the cell of ca (cstr_atoms) into a cluster and rotate it twice 
+    +   as described by inp (the dictionary of inp_cluster_rotation.yaml)
+    +   Step 1. align rot1_vec1 to rot1_vec2
+    +   Step 2. align the bond between index_atom1 and index_atom2, 
+    +   projected by rot2_vec1, to rot2_vec2
+    +   Only the final cluster is written, to filename.xyz (nothing is 
+    +   written if filename is None).
+    +
+    +   return(atoms, atomic_pos_cart)
+    =---------------------------------------------------------------------------
+    """
+    if "CH_bond_length" in inp:
+        HBL = inp["CH_bond_length"] # legacy for NV center
+    elif "H_bond_length" in inp:
+        HBL = inp["H_bond_length"]
+    else:
+        raise ValueError("Please input H_bond_length.")
+    atoms, atomic_pos_cart = trim(
+        ca,
+        center=inp["center"],
+        radius=inp["radius"],
+        H_bond_length=HBL,
+        common_bond_length=inp.get("common_bond_length", 1.6)
+    )
+    stages = [
+        functools.partial(
+            align, vec1=inp["rot1_vec1"], vec2=inp["rot1_vec2"]
+        ),
+        functools.partial(
+            align_bond,
+            index_atom1=inp["index_atom1"],
+            index_atom2=inp["index_atom2"],
+            vec1=inp["rot2_vec1"],
+            vec2=inp["rot2_vec2"]
+        ),
+    ]
+    if filename is not None:
+        stages.append(functools.partial(write, filename=filename))
+    return(pipeline(atoms, atomic_pos_cart, *stages))
+
+
+def rotate_file(path, inp, outdir=None, suffix="_rotated"):
+    """
+    =---------------------------------------------------------------------------
+    +   Read a cluster from path (xyz), align it as in gen_cluster (the two
+    +   rotations of inp) and write outdir/<name><suffix>.xyz
+    +
+    +   return(path, output path, seconds)
+    =---------------------------------------------------------------------------
+    """
+    start = time.perf_counter()
+    if outdir is None:
+        outdir = os.path.dirname(os.path.abspath(path))
+    name = os.path.splitext(os.path.basename(path))[0] + suffix
+    outfile = os.path.join(outdir, name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        xyz = read_xsf_xyz(path)
+        pipeline(
+            xyz.atoms, xyz.atomic_pos_cart,
+            functools.partial(
+                align, vec1=inp["rot1_vec1"], vec2=inp["rot1_vec2"]
+            ),
+            functools.partial(
+                align_bond,
+                index_atom1=inp["index_atom1"],
+                index_atom2=inp["index_atom2"],
+                vec1=inp["rot2_vec1"],
+                vec2=inp["rot2_vec2"]
+            ),
+            functools.partial(write, filename=outfile),
+        )
+    return(path, outfile + ".xyz", time.perf_counter() - start)
+
+
+def rotate_files(
+    directory, inp, outdir=None, suffix="_rotated", processes=None,
+    verbosity=True
+):
+    """
+    =---------------------------------------------------------------------------
+    +   rotate_file for every xyz file of directory (except the outputs,
+    +   ending with suffix) in a process pool of processes workers (all CPUs
+    +   if None)
+    +   The inputs are sorted by name and each output is named after its
+    +   input, so no output is overwritten by another.
+    +
+    +   return [(path, output path, seconds), ...]
+    =---------------------------------------------------------------------------
+    """
+    paths = sorted(
+        os.path.join(directory, f) for f in os.listdir(directory)
+        if f.endswith(".xyz") and not f.endswith(suffix + ".xyz")
+    )
+    if outdir is not None:
+        os.makedirs(outdir, exist_ok=True)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(rotate_file, path, inp, outdir, suffix)
+            for path in paths
+        ]
+        records = [future.result() for future in futures]
+    if verbosity:
+        for path, outfile, seconds in records:
+            print("{:8.4f} s  {} -> {}".format(seconds, path, outfile))
+        print(
+            "Rotated {} files in {:.4f} s".format(
+                len(records), time.perf_counter() - start
+            )
+        )
+    return(records)
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Trim and rotate a cluster as in inp_cluster_rotation.yaml"
+    )
+    parser.add_argument(
+        "--batch", type=str, default=None,
+        help="rotate every xyz file of this directory instead"
+    )
+    parser.add_argument(
+        "-o", "--outdir", type=str, default=None,
+        help="directory of the rotated files (default: next to the inputs)"
+    )
+    parser.add_argument(
+        "-j", "--processes", type=int, default=None,
+        help="number of worker processes (default: all CPUs)"
+    )
+    args = parser.parse_args()
     cwd = os.getcwd()
     inp_yaml = open(os.path.join(cwd, "inp_cluster_rotation.yaml"), "r")
     inp = yaml.load(inp_yaml, Loader=yaml.FullLoader)
+
+    if args.batch is not None:
+        rotate_files(
+            args.batch, inp, outdir=args.outdir, processes=args.processes
+        )
+        sys.exit()
     
     if ".in" in inp["inp_f"]:
         print("found input")
@@ -30,51 +249,4 @@ if __name__ == "__main__":
         cell_parameters=qe.cell_parameters,
         atomic_pos_cryst=qe.atomic_pos_cryst
     )
-
-    if "CH_bond_length" in inp:
-        HBL = inp["CH_bond_length"] # legacy for NV center
-    elif "H_bond_length" in inp:
-        HBL = inp["H_bond_length"]
-    else:
-        raise ValueError("Please input H_bond_length.")
-    ca.trim_cell(
-        center = inp["center"],
-        radius=inp["radius"],
-        H_bond_length=HBL,
-        common_bond_length=inp["common_bond_length"]
-    )
-
-    wf = write_files("gen_cluster")
-    wf.write_xyz(atoms=ca.trim_cell_atoms, atomic_pos_cart=ca.trim_cell_atomic_pos_cart)
-
-
-    
-    R = rotation_matrix()
-
-    for f in os.listdir(cwd):
-        if f.endswith(".xyz"):
-            #### rotate cluster to align [111] to [001]
-            xyz = read_xsf_xyz(os.path.join(cwd, f))
-            print("Read file: ", os.path.join(cwd, f))
-            if inp["rot1_vec1"] == inp["rot1_vec2"]:
-                atomic_pos_cart = xyz.atomic_pos_cart
-            else:
-                R.rotation_matrix_rodrigues(inp["rot1_vec1"], inp["rot1_vec2"])
-                inv_rotation_mat = np.linalg.inv(R.rot_mat_rodrigues)
-                # rotate the atomic positions of a molecule in cartesian coordinate
-                atomic_pos_cart = np.matmul(xyz.atomic_pos_cart, inv_rotation_mat)
-            wf.write_xyz(atoms=xyz.atoms, atomic_pos_cart=atomic_pos_cart)
-
-            #### After the first rotation
-            os.system("mv gen_cluster.xyz 1st_rotation.xyz")
-            xyz = read_xsf_xyz(os.path.join(cwd, "1st_rotation.xyz"))
-
-            R.rotation_matrix_rodrigues(
-                vec1=(xyz.atomic_pos_cart[inp["index_atom1"]]-xyz.atomic_pos_cart[inp["index_atom2"]]) * inp["rot2_vec1"], 
-                vec2=inp["rot2_vec2"]
-            )
-
-            inv_rotation_mat = np.linalg.inv(R.rot_mat_rodrigues)
-            atomic_pos_cart = np.matmul(xyz.atomic_pos_cart, inv_rotation_mat)
-            wf.write_xyz(atoms=xyz.atoms, atomic_pos_cart=atomic_pos_cart)
-            os.system("rm 1st_rotation.xyz")
+    gen_cluster(ca, inp, filename="gen_cluster")
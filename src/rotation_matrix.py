@@ -3,51 +3,20 @@ import numpy as np
 
 
 class rotation_matrix(object):
-    def __init__(self) -> None:
-        print("Start rotation:")
+    def __init__(self, verbosity=True) -> None:
+        self.verbosity = verbosity
+        if self.verbosity:
+            print("Start rotation:")
         pass
     def rotation_matrix_euler(self, alpha: float, beta: float, gamma: float) -> None:
         """
         input rotation angles in degree (alpha in z, beta in y, gamma in x)
         """
-        print("1st rotation about x-axis by {}°".format(gamma))
-        print("2nd rotation about y-axis by {}°".format(beta))
-        print("3rd rotation about z-axis by {}°".format(alpha))
-        # rotation in x
-        gamma = gamma / 180.0 * np.pi # convert to radian from degree
-
-        rotation_x = np.matrix(
-            [
-                [1, 0, 0], 
-                [0, np.cos(gamma), -np.sin(gamma)],
-                [0, np.sin(gamma), np.cos(gamma)]
-            ]
-        )
-
-        # rotation in y
-        beta = beta / 180.0 * np.pi # convert to radian from degree
-
-        rotation_y = np.matrix(
-            [
-                [np.cos(beta), 0, np.sin(beta)], 
-                [0, 1, 0],
-                [-np.sin(beta), 0, np.cos(beta)]
-            ]
-        )
-
-        # rotation in z
-        alpha = alpha / 180.0 * np.pi # convert to radian from degree
-
-        rotation_z = np.matrix(
-            [
-                [np.cos(alpha), -np.sin(alpha), 0], 
-                [np.sin(alpha), np.cos(alpha), 0],
-                [0, 0, 1]
-            ]
-        )
-
-        rot = np.matmul(rotation_y, rotation_x)
-        self.rot_mat_euler = np.matmul(rotation_z, rot)
+        if self.verbosity:
+            print("1st rotation about x-axis by {}°".format(gamma))
+            print("2nd rotation about y-axis by {}°".format(beta))
+            print("3rd rotation about z-axis by {}°".format(alpha))
+        self.rot_mat_euler = euler_matrices(alpha, beta, gamma)[0]
 
 
 
@@ -58,26 +27,153 @@ class rotation_matrix(object):
         +   https://math.stackexchange.com/questions/180418/calculate-rotation-matrix-to-align-vector-a-to-vector-b-in-3d?rq=1
         =---------------------------------------------------------------------------
         """
-        print("Rotation by Rodrigues Fomular from {} to {}".format(vec1, vec2))
-        # normalize the vector (vec1) to rotate and the objective direction (vec2)
-        vec1 = np.asarray(vec1)
-        vec2 = np.asarray(vec2)
-        vec1 = vec1/np.linalg.norm(vec1)
-        vec2 = vec2/np.linalg.norm(vec2)
-        # find the axis of rotation by the cross product of vec1 and vec2
-        v = np.cross(vec1, vec2)
-        c = np.dot(vec1, vec2) # cos(theta)
-        s = np.linalg.norm(v) # sin(theta)
-        skew_symm_mat_of_v = np.array(
-            [
-                [0, -v[2], v[1]],
-                [v[2], 0, -v[0]],
-                [-v[1], v[0], 0]
-            ]
-        )
-        self.rot_mat_rodrigues = (
-            np.identity(3) 
-            + skew_symm_mat_of_v 
-            + np.matmul(skew_symm_mat_of_v, skew_symm_mat_of_v) * (1-c)/s**2
-        )
+        if self.verbosity:
+            print("Rotation by Rodrigues Fomular from {} to {}".format(vec1, vec2))
+        self.rot_mat_rodrigues = align_matrices(vec1, vec2)[0]
 
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
+
+"""
+++------------------------------------------------------------------------------
++   Stacks of rotation matrices (n x 3 x 3), all of them at once
++
++   Each matrix R rotates column vectors, v' = Rv, so rows of atomic
++   positions A are rotated by A' = AR^T (see rotate). R^-1 = R^T.
++   The inputs are broadcast together, a single rotation gives n = 1.
+++------------------------------------------------------------------------------
+"""
+
+
+def euler_matrices(alpha=0, beta=0, gamma=0):
+    """
+    =---------------------------------------------------------------------------
+    +   R = R_z(alpha)R_y(beta)R_x(gamma), angles in degree, i.e. first
+    +   rotate about x by gamma, then about y by beta, finally about z by
+    +   alpha
+    =---------------------------------------------------------------------------
+    """
+    alpha, beta, gamma = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(a, dtype=float)) / 180.0 * np.pi
+        for a in (alpha, beta, gamma))
+    )
+    ca, sa = np.cos(alpha), np.sin(alpha)
+    cb, sb = np.cos(beta), np.sin(beta)
+    cg, sg = np.cos(gamma), np.sin(gamma)
+    rot = np.empty(alpha.shape + (3, 3))
+    rot[..., 0, 0] = ca*cb
+    rot[..., 0, 1] = ca*sb*sg - sa*cg
+    rot[..., 0, 2] = ca*sb*cg + sa*sg
+    rot[..., 1, 0] = sa*cb
+    rot[..., 1, 1] = sa*sb*sg + ca*cg
+    rot[..., 1, 2] = sa*sb*cg - ca*sg
+    rot[..., 2, 0] = -sb
+    rot[..., 2, 1] = cb*sg
+    rot[..., 2, 2] = cb*cg
+    return(rot)
+
+
+def axis_angle_matrices(axis, angle):
+    """
+    =---------------------------------------------------------------------------
+    +   Rotations about axis (n x 3, normalized here) by angle (n, degree),
+    +   R = I + sin(angle)[u]_x + (1 - cos(angle))[u]_x^2
+    =---------------------------------------------------------------------------
+    """
+    axis = np.asarray(axis, dtype=float)
+    axis = axis / np.linalg.norm(axis, axis=-1, keepdims=True)
+    angle = np.asarray(angle, dtype=float) / 180.0 * np.pi
+    axis, angle = np.broadcast_arrays(
+        np.atleast_2d(axis), np.atleast_1d(angle)[..., None]
+    )
+    skew = _skew(axis)
+    s = np.sin(angle[..., 0])[..., None, None]
+    c = np.cos(angle[..., 0])[..., None, None]
+    return(np.eye(3) + s*skew + (1 - c)*np.matmul(skew, skew))
+
+
+def quaternion_matrices(quaternion):
+    """
+    =---------------------------------------------------------------------------
+    +   Rotations of quaternions (n x 4, [w, x, y, z], normalized here)
+    =---------------------------------------------------------------------------
+    """
+    q = np.atleast_2d(np.asarray(quaternion, dtype=float))
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    rot = np.empty(q.shape[:-1] + (3, 3))
+    rot[..., 0, 0] = 1 - 2*(y*y + z*z)
+    rot[..., 0, 1] = 2*(x*y - z*w)
+    rot[..., 0, 2] = 2*(x*z + y*w)
+    rot[..., 1, 0] = 2*(x*y + z*w)
+    rot[..., 1, 1] = 1 - 2*(x*x + z*z)
+    rot[..., 1, 2] = 2*(y*z - x*w)
+    rot[..., 2, 0] = 2*(x*z - y*w)
+    rot[..., 2, 1] = 2*(y*z + x*w)
+    rot[..., 2, 2] = 1 - 2*(x*x + y*y)
+    return(rot)
+
+
+def align_matrices(vec1, vec2, tol=1e-10):
+    """
+    =---------------------------------------------------------------------------
+    +   Rotations aligning vec1 to vec2 (n x 3 each), Rodrigues' formula
+    +   R = I + [v]_x + [v]_x^2/(1 + c), v = vec1 x vec2, c = vec1.vec2
+    +   (the same as (1 - c)/s^2 without dividing by s = 0)
+    +   parallel vectors: R = I
+    +   antiparallel vectors: rotation by 180° about an axis u perpendicular
+    +   to vec1, R = 2uu^T - I
+    =---------------------------------------------------------------------------
+    """
+    vec1, vec2 = np.broadcast_arrays(
+        np.atleast_2d(np.asarray(vec1, dtype=float)),
+        np.atleast_2d(np.asarray(vec2, dtype=float))
+    )
+    vec1 = vec1 / np.linalg.norm(vec1, axis=-1, keepdims=True)
+    vec2 = vec2 / np.linalg.norm(vec2, axis=-1, keepdims=True)
+    v = np.cross(vec1, vec2)
+    c = np.sum(vec1 * vec2, axis=-1)
+    antiparallel = (1 + c) < tol
+    skew = _skew(v)
+    scale = 1 / np.where(antiparallel, 1.0, 1 + c)
+    rot = np.eye(3) + skew + np.matmul(skew, skew) * scale[..., None, None]
+    if np.any(antiparallel):
+        u1 = vec1[antiparallel]
+        # cross with the axis least parallel to vec1
+        ref = np.eye(3)[np.argmin(np.abs(u1), axis=-1)]
+        u = np.cross(u1, ref)
+        u /= np.linalg.norm(u, axis=-1, keepdims=True)
+        rot[antiparallel] = 2 * u[..., :, None] * u[..., None, :] - np.eye(3)
+    return(rot)
+
+
+def rotate(atomic_pos_cart, rot_mats):
+    """
+    =---------------------------------------------------------------------------
+    +   Rotate atomic positions (nat x 3 or n x nat x 3) by each rotation of a
+    +   stack (n x 3 x 3) in one einsum, A' = AR^T
+    +
+    +   return(atomic_pos_cart) (n x nat x 3)
+    =---------------------------------------------------------------------------
+    """
+    return(np.einsum("...ij,...aj->...ai", rot_mats, atomic_pos_cart))
+
+
+def _skew(v):
+    """
+    skew-symmetric matrices [v]_x of vectors (... x 3)
+    """
+    skew = np.zeros(v.shape[:-1] + (3, 3))
+    skew[..., 0, 1] = -v[..., 2]
+    skew[..., 0, 2] = v[..., 1]
+    skew[..., 1, 0] = v[..., 2]
+    skew[..., 1, 2] = -v[..., 0]
+    skew[..., 2, 0] = -v[..., 1]
+    skew[..., 2, 1] = v[..., 0]
+    return(skew)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import numpy as np
+
+
+# chemical symbols by atomic number, index 0 is a dummy atom
+ELEMENTS = (
+    "X H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn Fe "
+    "Co Ni Cu Zn Ga Ge As Se Br Kr Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag Cd In Sn "
+    "Sb Te I Xe Cs Ba La Ce Pr Nd Pm Sm Eu Gd Tb Dy Ho Er Tm Yb Lu Hf Ta W "
+    "Re Os Ir Pt Au Hg Tl Pb Bi Po At Rn Fr Ra Ac Th Pa U Np Pu Am Cm Bk Cf "
+    "Es Fm Md No Lr Rf Db Sg Bh Hs Mt Ds Rg Cn Nh Fl Mc Lv Ts Og"
+).split()
+_ATOMIC_NUMBER = {symbol: z for z, symbol in enumerate(ELEMENTS)}
+
+
+"""
+++------------------------------------------------------------------------------
++   Atomic species as small integer codes
++
++   A structure keeps one code per atom (uint8) and a table of its species
++   (U4), species[codes[i]] being the species of atom i. The species are
++   numbered in the order in which they first appear. Masks and comparisons
++   of species are comparisons of codes, and the strings are only made
++   again (decode) to write files or to return them.
+++------------------------------------------------------------------------------
+"""
+
+
+def encode(atoms, species=None):
+    """
+    ++--------------------------------------------------------------------------
+    +   atoms (atomic species, strings, any shape)
+    +   species (table to extend, e.g. to share the codes with another
+    +   structure; the new species are appended)
+    +
+    +   return(species, codes)
+    +   species (table of the species, U4)
+    +   codes (code of each atom, uint8, the shape of atoms)
+    ++--------------------------------------------------------------------------
+    """
+    atoms = np.asarray(atoms, dtype="U4")
+    unique, first, inverse = np.unique(
+        atoms, return_index=True, return_inverse=True
+    )
+    table = [] if species is None else list(species)
+    for symbol in unique[np.argsort(first)]:
+        if symbol not in table:
+            table.append(symbol)
+    if len(table) > 256:
+        raise ValueError("More than 256 atomic species")
+    lookup = {symbol: i for i, symbol in enumerate(table)}
+    unique_codes = np.array([lookup[s] for s in unique], dtype=np.uint8)
+    codes = unique_codes[inverse.reshape(-1)].reshape(atoms.shape)
+    return(np.array(table, dtype="U4"), codes)
+
+
+def decode(species, codes):
+    """
+    ++--------------------------------------------------------------------------
+    +   Atomic species (U4) of codes
+    ++--------------------------------------------------------------------------
+    """
+    return np.asarray(species, dtype="U4")[codes]
+
+
+def code(species, symbol):
+    """
+    ++--------------------------------------------------------------------------
+    +   Code of symbol in the table species, e.g. for the mask
+    +   codes == code(species, "Mo")
+    ++--------------------------------------------------------------------------
+    """
+    matches = np.nonzero(np.asarray(species) == symbol)[0]
+    if len(matches) == 0:
+        raise ValueError("{} is not in the species {}".format(symbol, species))
+    return np.uint8(matches[0])
+
+
+def atomic_numbers(atoms):
+    """
+    ++--------------------------------------------------------------------------
+    +   Atomic number of each atom, the digits and the case of labels like
+    +   "Fe1" or "FE" are ignored
+    ++--------------------------------------------------------------------------
+    """
+    species, codes = encode(atoms)
+    numbers = np.array(
+        [
+            _ATOMIC_NUMBER["".join(c for c in s if c.isalpha()).capitalize()]
+            for s in species
+        ], dtype=int
+    )
+    return numbers[codes]
+
+
+def symbols(numbers):
+    """
+    ++--------------------------------------------------------------------------
+    +   Chemical symbols (U4) of atomic numbers
+    ++--------------------------------------------------------------------------
+    """
+    return np.asarray(ELEMENTS, dtype="U4")[np.asarray(numbers, dtype=int)]
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class surface_curvature(object):
+    """
+    =---------------------------------------------------------------------------
+    +   1. Constructor
+    +   Input:
+    +   atomic_pos_cart (atomic positions of a 2D sheet, angstrom, the sheet
+    +   is in the xy plane)
+    +   cell_parameters (cell parameters, angstrom, the first two vectors
+    +   are periodic; None for a flake)
+    +   k (number of neighbors of each atom, itself included, in the fits)
+    +   verbosity (print the curvatures?)
+    +
+    +   Attributes:
+    +   self.neighbors (indices of the k neighbors of each atom, nat x k)
+    +   self.neighbor_xyz (positions of the neighbors relative to each atom,
+    +   nat x k x 3)
+    +   self.coefficients, self.height, self.normal, self.mean_curvature,
+    +   self.gaussian_curvature, self.principal_curvatures (see fit)
+    =---------------------------------------------------------------------------
+    +   2. Method neighbor_list(self)
+    +   k nearest neighbors in the xy plane with the periodic images
+    +
+    +   Attributes: self.neighbors, self.neighbor_xyz
+    +
+    +   No return
+    =---------------------------------------------------------------------------
+    +   3. Method fit(self)
+    +   Least-squares fit of the height field around each atom by a quadric
+    +   z = ax^2 + bxy + cy^2 + dx + ey + f, all atoms at once
+    +
+    +   Attributes:
+    +   self.coefficients (a, b, c, d, e, f of each atom, nat x 6)
+    +   self.height (fitted z of each atom, angstrom)
+    +   self.normal (unit normal of the surface, nat x 3)
+    +   self.mean_curvature (H, 1/angstrom)
+    +   self.gaussian_curvature (K, 1/angstrom^2)
+    +   self.principal_curvatures (k1 >= k2, nat x 2, 1/angstrom)
+    +
+    +   No return
+    =---------------------------------------------------------------------------
+    """
+    def __init__(
+        self, atomic_pos_cart, cell_parameters=None, k=12, verbosity=True
+    ):
+        self.atomic_pos_cart = np.asarray(atomic_pos_cart, dtype=float)
+        self.cell_parameters = cell_parameters
+        self.nat = self.atomic_pos_cart.shape[0]
+        if k < 6:
+            sys.exit("At least 6 neighbors are needed to fit a quadric")
+        self.k = min(k, self.nat)
+
+        # call dynamic methods
+        self.neighbor_list()
+        self.fit()
+        if verbosity:
+            print(
+                "The largest mean curvature = {:.4g} A^-1\n"
+                "The largest gaussian curvature = {:.4g} A^-2\n".format(
+                    np.amax(np.abs(self.mean_curvature)),
+                    np.amax(np.abs(self.gaussian_curvature))
+                )
+            )
+
+    def neighbor_list(self):
+        """
+        =-----------------------------------------------------------------------
+        +   Only the images within a margin of the cell are added to the tree,
+        +   the margin being a few times the radius which holds k atoms on
+        +   average.
+        =-----------------------------------------------------------------------
+        """
+        xyz = self.atomic_pos_cart
+        images = xyz
+        if self.cell_parameters is not None:
+            cell_2d = np.asarray(self.cell_parameters, dtype=float)[:2, :2]
+            area = abs(np.linalg.det(cell_2d))
+            margin = 3.0 * np.sqrt(self.k * area / self.nat / np.pi)
+            # fractional margin along a and b: margin over the height of the
+            # cell perpendicular to each vector
+            lengths = area / np.linalg.norm(cell_2d[::-1], axis=1)
+            frac_margin = np.minimum(margin / lengths, 1.0)
+            frac = np.linalg.solve(cell_2d.T, xyz[:, :2].T).T % 1.0
+            shifts = np.array(
+                [[i, j] for i in (-1, 0, 1) for j in (-1, 0, 1) if i or j]
+            )
+            # image (i, j) of an atom is inside the margin if its fractional
+            # coordinates are within [-margin, 1 + margin]
+            shifted = frac[None] + shifts[:, None]
+            inside = np.all(
+                (shifted > -frac_margin) & (shifted < 1 + frac_margin), axis=2
+            )
+            image_shift, image_atom = np.nonzero(inside)
+            image_xyz = xyz[image_atom].copy()
+            image_xyz[:, :2] += shifts[image_shift] @ cell_2d
+            images = np.concatenate((xyz, image_xyz))
+            image_index = np.concatenate((np.arange(self.nat), image_atom))
+        else:
+            image_index = np.arange(self.nat)
+        tree = cKDTree(images[:, :2])
+        neighbors = tree.query(xyz[:, :2], k=self.k)[1]
+        self.neighbors = image_index[neighbors]
+        self.neighbor_xyz = images[neighbors] - xyz[:, None, :]
+
+    def fit(self):
+        x = self.neighbor_xyz[:, :, 0]
+        y = self.neighbor_xyz[:, :, 1]
+        z = self.neighbor_xyz[:, :, 2]
+        design = np.stack((x*x, x*y, y*y, x, y, np.ones_like(x)), axis=2)
+        # normal equations of all atoms, (nat x 6 x 6) and (nat x 6)
+        lhs = np.einsum("nki,nkj->nij", design, design)
+        rhs = np.einsum("nki,nk->ni", design, z)
+        self.coefficients = np.linalg.solve(lhs, rhs[..., None])[..., 0]
+        a, b, c, d, e, f = self.coefficients.T
+        self.height = self.atomic_pos_cart[:, 2] + f
+
+        # derivatives of the height at the atom
+        z_x, z_y = d, e
+        z_xx, z_xy, z_yy = 2*a, b, 2*c
+        g = 1 + z_x**2 + z_y**2
+        self.normal = np.stack((-z_x, -z_y, np.ones_like(g)), axis=1)
+        self.normal /= np.sqrt(g)[:, None]
+        self.gaussian_curvature = (z_xx*z_yy - z_xy**2) / g**2
+        self.mean_curvature = (
+            (1 + z_x**2)*z_yy - 2*z_x*z_y*z_xy + (1 + z_y**2)*z_xx
+        ) / (2 * g**1.5)
+        discriminant = np.sqrt(
+            np.maximum(self.mean_curvature**2 - self.gaussian_curvature, 0)
+        )
+        self.principal_curvatures = np.stack(
+            (
+                self.mean_curvature + discriminant,
+                self.mean_curvature - discriminant
+            ), axis=1
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mean and gaussian curvature of each atom of a 2D sheet"
+    )
+    parser.add_argument("file", type=str, help="xsf or xyz file")
+    parser.add_argument(
+        "-k", type=int, default=12, help="number of neighbors in the fits"
+    )
+    parser.add_argument(
+        "--species", type=str, default=None,
+        help="only the atoms of this species, e.g. the metal layer"
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, default="curvature.dat",
+        help="file of x, y, z, H, K of each atom"
+    )
+    args = parser.parse_args()
+    from read_xsf_xyz import read_xsf_xyz
+    from species import code
+    struct = read_xsf_xyz(os.path.join(os.getcwd(), args.file))
+    mask = np.ones(struct.nat, dtype=bool)
+    if args.species is not None:
+        mask = struct.species_codes == code(struct.species, args.species)
+    cell_parameters = None
+    if args.file.endswith("xsf"):
+        cell_parameters = struct.cell_parameters
+    sc = surface_curvature(
+        struct.atomic_pos_cart[mask], cell_parameters, k=args.k
+    )
+    np.savetxt(
+        args.output,
+        np.column_stack(
+            (
+                struct.atomic_pos_cart[mask], sc.mean_curvature,
+                sc.gaussian_curvature
+            )
+        ),
+        "%.8f", header="x y z H K"
+    )
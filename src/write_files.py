@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import numpy as np
 import os
+from species import decode
 
 class write_files(object):
     def __init__(self, filename) -> None:
@@ -8,7 +9,7 @@ class write_files(object):
         self.filename = filename
         pass
 
-    def write_xsf(self, cryst_axes, atoms, atomic_pos_cart):
+    def write_xsf(self, cryst_axes, atoms, atomic_pos_cart, species=None):
         """
         =---------------------------------------------------------------------------
         +   This function writes the atoms and atomic positions for visualizing
@@ -18,8 +19,12 @@ class write_files(object):
         +   cryst_axes (crystal axes in cartesian coordinates, angstrom)
         +   atoms (atomic species associated with each atomic position)
         +   atomic_pos (atomic positions)
+        +   species (table of the atomic species if atoms are species codes,
+        +   see species.py)
         =---------------------------------------------------------------------------
         """
+        if species is not None:
+            atoms = decode(species, atoms)
         # write a file that can be open by vesta
         nat = len(atoms)
         file_to_write = open(os.path.join(self.cwd, "{}.xsf".format(self.filename)), "w")
@@ -39,7 +44,7 @@ class write_files(object):
         #np.savetxt(file_to_write, cryst_axes, "%.10f")
         file_to_write.close()
 
-    def write_xyz(self, atoms, atomic_pos_cart):
+    def write_xyz(self, atoms, atomic_pos_cart, species=None):
         """
         =---------------------------------------------------------------------------
         +   This function writes the atoms and atomic positions for visualizing
@@ -48,8 +53,12 @@ class write_files(object):
         +   type(input): <class 'numpy.ndarray'>
         +   atoms (atomic species associated with each atomic position)
         +   atomic_pos_cart (atomic positions)
+        +   species (table of the atomic species if atoms are species codes,
+        +   see species.py)
         =---------------------------------------------------------------------------
         """
+        if species is not None:
+            atoms = decode(species, atoms)
         nat = len(atoms)
         print("Write to file:", os.path.join(self.cwd, "{}.xyz".format(self.filename)))
         file_to_write = open(os.path.join(self.cwd, "{}.xyz".format(self.filename)), "w")
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import hashlib
+import argparse
+import itertools
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from read_qein import qe_in
+from deform_cell import strain_tensors
+
+
+# namelists in the order required by pw.x
+NAMELISTS = ("control", "system", "electrons", "ions", "cell")
+# keys which define the cell of ibrav != 0, replaced by CELL_PARAMETERS
+_CELL_KEYS = (
+    "celldm(1)", "celldm(2)", "celldm(3)", "celldm(4)", "celldm(5)",
+    "celldm(6)", "a", "b", "c", "cosab", "cosac", "cosbc"
+)
+
+
+class write_qein(object):
+    """
+    ++--------------------------------------------------------------------------
+    +   Input: template (path to pw.x input or qe_in object)
+    ++--------------------------------------------------------------------------
+    +   1. Constructor
+    +   Attributes:
+    +   self.path (path to the template, None if a qe_in object is given)
+    +   self.template (qe_in object of the template)
+    +
+    +   No return
+    ++--------------------------------------------------------------------------
+    +   2. Method input_text(self, cell_parameters=None, atomic_pos_cryst=None,
+    +   atoms=None, if_pos=None, kpts=None, namelists=None)
+    +   complete pw.x input of the template with the given structure, k mesh
+    +   and namelist values, e.g. namelists={"system": {"ecutwfc": 60}}
+    +
+    +   return text
+    ++--------------------------------------------------------------------------
+    +   3. Method write_input(self, path, **kwargs)
+    +   write input_text(**kwargs) to path
+    +
+    +   return sha256 of the text
+    ++--------------------------------------------------------------------------
+    +   4. Method write_grid(self, directory=".", strain=None, if_pos=None,
+    +   kpts=None, ecutwfc=None, namelists=None, prefix="pw",
+    +   unique_prefix=False, max_workers=None, verbosity=True)
+    +   write one input per point of the grid (the product of all parameters)
+    +   and directory/manifest.json with the parameters of each input
+    +
+    +   return manifest (list of dictionaries, one per input)
+    ++--------------------------------------------------------------------------
+    """
+    def __init__(self, template):
+        if isinstance(template, qe_in):
+            self.path = None
+            self.template = template
+        else:
+            self.path = template
+            self.template = qe_in(template)
+
+    def input_text(
+        self, cell_parameters=None, atomic_pos_cryst=None, atoms=None,
+        if_pos=None, kpts=None, namelists=None
+    ):
+        """
+        ++----------------------------------------------------------------------
+        +   This method renders a complete pw.x input
+        +   cell_parameters (cell parameters, angstrom, template by default)
+        +   atomic_pos_cryst (atomic positions in crystal coordinates)
+        +   atoms (atomic species associated with each atomic position)
+        +   if_pos (0 for the fixed components, (nat x 3), or True for the
+        +   fixed atoms, (nat))
+        +   kpts (automatic k mesh, 3 numbers or 6 with the shift)
+        +   namelists (dictionary of dictionaries of values to set)
+        +
+        +   The cell is always written as CELL_PARAMETERS angstrom with
+        +   ibrav = 0 and the atomic positions in crystal coordinates.
+        ++----------------------------------------------------------------------
+        """
+        qe = self.template
+        if cell_parameters is None:
+            cell_parameters = qe.cell_parameters
+        if atomic_pos_cryst is None:
+            atomic_pos_cryst = qe.atomic_pos_cryst
+        if atoms is None:
+            atoms = qe.atoms
+        if if_pos is None:
+            if_pos = qe.if_pos
+        if_pos = np.asarray(if_pos)
+        if if_pos.ndim == 1:
+            # True for the fixed atoms
+            if_pos = np.repeat(np.where(if_pos, 0, 1)[:, None], 3, axis=1)
+
+        # namelists of the template with the new values
+        values = {name: dict(nml) for name, nml in qe.namelists.items()}
+        for name, nml in (namelists or {}).items():
+            values.setdefault(name.lower(), {}).update(
+                {key.lower(): value for key, value in nml.items()}
+            )
+        system = values.setdefault("system", {})
+        for key in _CELL_KEYS:
+            system.pop(key, None)
+        system["ibrav"] = 0
+        system["nat"] = len(atoms)
+
+        text = []
+        order = [n for n in NAMELISTS if n in values] + [
+            n for n in values if n not in NAMELISTS
+        ]
+        for name in order:
+            text.append("&{}\n".format(name.upper()))
+            for key, value in values[name].items():
+                text.append("  {} = {}\n".format(key, _format_value(value)))
+            text.append("/\n")
+
+        cards = qe.cards
+        text.append("ATOMIC_SPECIES\n")
+        text.extend(line + "\n" for line in cards["ATOMIC_SPECIES"]["lines"])
+        text.append("CELL_PARAMETERS angstrom\n")
+        text.append(_format_table("  %.10f  %.10f  %.10f\n", cell_parameters))
+        text.append("ATOMIC_POSITIONS crystal\n")
+        if np.any(if_pos == 0):
+            text.append(
+                _format_table(
+                    "%-4s  %.10f  %.10f  %.10f  %d %d %d\n",
+                    atoms, atomic_pos_cryst, if_pos
+                )
+            )
+        else:
+            text.append(
+                _format_table("%-4s  %.10f  %.10f  %.10f\n", atoms, atomic_pos_cryst)
+            )
+        if kpts is not None:
+            kpts = list(kpts) + [0] * (6 - len(kpts))
+            text.append("K_POINTS automatic\n")
+            text.append("%d %d %d  %d %d %d\n" % tuple(kpts))
+        elif "K_POINTS" in cards:
+            text.append(_format_card("K_POINTS", cards["K_POINTS"]))
+        for name, card in cards.items():
+            if name not in (
+                "ATOMIC_SPECIES", "CELL_PARAMETERS", "ATOMIC_POSITIONS",
+                "K_POINTS"
+            ):
+                text.append(_format_card(name, card))
+        return "".join(text)
+
+    def write_input(self, path, **kwargs):
+        text = self.input_text(**kwargs)
+        with open(path, "w") as f:
+            f.write(text)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def write_grid(
+        self, directory=".", strain=None, if_pos=None, kpts=None, ecutwfc=None,
+        namelists=None, prefix="pw", unique_prefix=False, max_workers=None,
+        verbosity=True
+    ):
+        """
+        ++----------------------------------------------------------------------
+        +   This method writes the inputs of all combinations of
+        +   strain (list of strains, each a number (isotropic), 3 numbers
+        +   (along x, y, z), 6 numbers (Voigt notation) or a 3 x 3 strain
+        +   tensor, see deform_cell.strain_tensors)
+        +   if_pos (list of constraints, see input_text)
+        +   kpts (list of automatic k meshes)
+        +   ecutwfc (list of kinetic-energy cutoffs, Ry)
+        +   namelists (dictionary of lists of values, e.g.
+        +   {"system.ecutrho": [240, 320]})
+        +
+        +   The strained cells are C(1 + e)^T with the atomic positions in
+        +   crystal coordinates of the template. The inputs are named
+        +   prefix_0000.in, prefix_0001.in, ... in the order of the grid, so
+        +   that the same grid always gives the same files. If unique_prefix,
+        +   the prefix in &CONTROL of each input is followed by its index.
+        ++----------------------------------------------------------------------
+        """
+        os.makedirs(directory, exist_ok=True)
+        namelists = dict(namelists or {})
+        if ecutwfc is not None:
+            namelists["system.ecutwfc"] = ecutwfc
+        keys = sorted(namelists)
+
+        # all strained cells at once
+        if strain is None:
+            strain_mats = np.zeros((1, 3, 3))
+            strain = [None]
+        else:
+            strain_mats = strain_tensors(strain)
+        deform_mats = np.eye(3) + strain_mats
+        cells = np.einsum(
+            "ij,nkj->nik", self.template.cell_parameters, deform_mats
+        )
+
+        axes = [
+            range(len(strain)),
+            range(len(if_pos)) if if_pos is not None else [None],
+            kpts if kpts is not None else [None],
+        ] + [namelists[key] for key in keys]
+
+        jobs = []
+        manifest = []
+        for index, point in enumerate(itertools.product(*axes)):
+            i_strain, i_if_pos, kmesh = point[:3]
+            nml = {}
+            for key, value in zip(keys, point[3:]):
+                name, _, var = key.rpartition(".")
+                nml.setdefault(name or "system", {})[var] = value
+            fname = "{}_{:04d}.in".format(prefix, index)
+            if unique_prefix:
+                template_prefix = self.template.namelists.get(
+                    "control", {}
+                ).get("prefix", "pwscf")
+                nml.setdefault("control", {})["prefix"] = "{}_{:04d}".format(
+                    template_prefix, index
+                )
+            jobs.append(
+                (
+                    os.path.join(directory, fname),
+                    {
+                        "cell_parameters": cells[i_strain],
+                        "if_pos": (
+                            None if i_if_pos is None else if_pos[i_if_pos]
+                        ),
+                        "kpts": kmesh,
+                        "namelists": nml,
+                    }
+                )
+            )
+            manifest.append(
+                {
+                    "index": index,
+                    "file": fname,
+                    "strain": strain_mats[i_strain].tolist(),
+                    "if_pos": i_if_pos,
+                    "kpts": None if kmesh is None else list(kmesh),
+                    "namelists": {
+                        key: _json_value(value)
+                        for key, value in zip(keys, point[3:])
+                    },
+                }
+            )
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            hashes = list(
+                executor.map(lambda job: self.write_input(job[0], **job[1]), jobs)
+            )
+        for entry, sha256 in zip(manifest, hashes):
+            entry["sha256"] = sha256
+
+        with open(os.path.join(directory, "manifest.json"), "w") as f:
+            json.dump(
+                {"template": self.path, "inputs": manifest}, f, indent=1,
+                sort_keys=True
+            )
+        if verbosity:
+            print(
+                "{} inputs are written in {}".format(len(manifest), directory)
+            )
+        return manifest
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+
+
+def _format_value(value):
+    """
+    ++--------------------------------------------------------------------------
+    +   Format a value of a namelist as Fortran reads it
+    ++--------------------------------------------------------------------------
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return ".true." if value else ".false."
+    if isinstance(value, str):
+        return "'{}'".format(value)
+    if isinstance(value, (float, np.floating)):
+        return repr(float(value))
+    return str(value)
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _format_table(row_format, *columns):
+    """
+    ++--------------------------------------------------------------------------
+    +   Format the rows of columns (1D or 2D arrays with the same number of
+    +   rows) with one % operation for the whole table
+    ++--------------------------------------------------------------------------
+    """
+    columns = [np.asarray(column) for column in columns]
+    nrows = columns[0].shape[0]
+    widths = [1 if column.ndim == 1 else column.shape[1] for column in columns]
+    table = np.empty((nrows, sum(widths)), dtype=object)
+    start = 0
+    for column, width in zip(columns, widths):
+        table[:, start:start+width] = column.reshape(nrows, width).tolist()
+        start += width
+    return (row_format * nrows) % tuple(table.ravel().tolist())
+
+
+def _format_card(name, card):
+    text = name
+    if card["option"]:
+        text += " {}".format(card["option"])
+    return text + "\n" + "".join(line + "\n" for line in card["lines"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write pw.x inputs of a grid of strains, k meshes and cutoffs"
+    )
+    parser.add_argument("template", type=str, help="template pw.x input")
+    parser.add_argument(
+        "-d", "--directory", type=str, default="inputs", help="output directory"
+    )
+    parser.add_argument(
+        "--strain", type=float, nargs="+", default=None,
+        help="isotropic in-plane strains (x and y)"
+    )
+    parser.add_argument(
+        "--kpts", type=int, nargs="+", default=None,
+        help="k meshes n (n x n x 1)"
+    )
+    parser.add_argument(
+        "--ecutwfc", type=float, nargs="+", default=None,
+        help="kinetic-energy cutoffs, Ry"
+    )
+    parser.add_argument("--prefix", type=str, default="pw")
+    args = parser.parse_args()
+    writer = write_qein(args.template)
+    writer.write_grid(
+        directory=args.directory,
+        strain=None if args.strain is None else [[s, s, 0] for s in args.strain],
+        kpts=None if args.kpts is None else [[k, k, 1] for k in args.kpts],
+        ecutwfc=args.ecutwfc,
+        prefix=args.prefix,
+    )